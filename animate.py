@@ -1,4 +1,8 @@
+from matplotlib.colors import to_rgba
 import navigation as nav
+import numpy as np
+
+BLUE, GREEN, RED = to_rgba('blue'), to_rgba('green'), to_rgba('red')
 
 
 class Animator:
@@ -16,9 +20,17 @@ class Animator:
         self.lights_object = lights_object
         self.number_of_lights = len(self.lights_object.state)
         self.number_of_faces = sum(self.lights_object.state['degree'])
+        self.make_artists()
+
+    def make_artists(self):
+        """
+        creates one Line2D artist per car, per light and per light face
+        """
+        ax = self.ax
         self.cars = sum([ax.plot([], [], color='blue', marker='o', ms=1) for n in range(self.N)], [])
         self.lights = sum([ax.plot([], [], color='red', marker='+', ms=2) for l in range(self.number_of_lights)], [])
         self.faces = sum([ax.plot([], [], color='red', marker='^', ms=2) for f in range(self.number_of_faces)], [])
+        return
 
     def reset(self, num=None):
         """
@@ -109,3 +121,138 @@ class Animator:
             raise Exception('Please make a folder called "frames" in this project directory')
 
         return None
+
+
+class ScatterAnimator(Animator):
+    """
+    Draws the cars, lights and light faces as three scatter collections instead of one artist per object.
+    Each frame updates the cars with one set_offsets and the faces with one set_facecolors, and only the three
+    collections are redrawn over a cached background of the map.
+    """
+    def __init__(self, fig, ax, cars_object, lights_object, num,
+                 frame_rate=1000, dt=1 / 1000, n=1, focus=None, write_frames=False, blit=True):
+        """
+        :param blit: bool: if True, animate blits its own frames over the cached background (as when driven by Env);
+                           set False when a FuncAnimation drives the animator and does the blitting
+        """
+        self.blit = blit
+        self.background = None
+        self.annotation = None
+        super().__init__(fig, ax, cars_object, lights_object, num,
+                         frame_rate=frame_rate, dt=dt, n=n, focus=focus, write_frames=write_frames)
+
+    def make_artists(self):
+        """
+        creates the three scatter collections; the lights and faces never move, so their offsets are set once
+        """
+        self.cars = self.ax.scatter([], [], s=1, color='blue', marker='o', zorder=3, animated=self.blit)
+        self.lights = self.ax.scatter([], [], s=4, color='red', marker='+', zorder=3, animated=self.blit)
+        self.faces = self.ax.scatter([], [], s=4, color='red', marker='^', linewidths=0, zorder=3,
+                                     animated=self.blit)
+        self.car_colors = np.zeros((0, 4))
+        self.light_positions = self.lights_object.positions()
+        self.face_positions = self.lights_object.face_positions()
+        return
+
+    def artists(self):
+        """
+        :return artists: list: the car, light and face collections
+        """
+        return [self.cars, self.lights, self.faces]
+
+    def color_cars(self, n):
+        """
+        colors n cars blue, and the focus car (if any) green
+
+        :param n: int: number of cars
+        """
+        self.car_colors = np.tile(BLUE, (n, 1))
+        if self.focus:
+            self.car_colors[self.cars_object.state.index.get_loc(self.focus)] = GREEN
+        self.cars.set_facecolors(self.car_colors)
+        return
+
+    def reset(self, num=None):
+        """
+        Set initial blank data, draw the map and cache it as the background of every frame
+
+        :num:    tuple: int, int
+        :return: cars + lights + faces:
+        """
+        self.cars.set_offsets(np.zeros((0, 2)))
+        self.lights.set_offsets(self.light_positions)
+        self.faces.set_offsets(self.face_positions)
+        self.faces.set_facecolors(np.where(self.lights_object.face_go_values()[:, None], GREEN, RED))
+
+        if self.focus:
+            # narrow the plot axes to the route of the car with ID self.focus
+            route = self.cars_object.state.loc[self.focus]['route']
+            new_axis = nav.determine_limits(self.cars_object.graph, route)
+            self.ax.set_xlim(new_axis[0], new_axis[1])
+            self.ax.set_ylim(new_axis[2], new_axis[3])
+        self.color_cars(len(self.cars_object.positions()))
+
+        axis = self.ax.axis()
+
+        self.num = num if num else self.num
+        text = 'Episode {} of {}'.format(self.num[0], self.num[1])
+        if self.annotation is None:
+            self.annotation = self.ax.annotate(text, xy=(axis[0] + 10, axis[2] + 10))
+        else:
+            self.annotation.set_text(text)
+            self.annotation.xy = (axis[0] + 10, axis[2] + 10)
+
+        self.fig.canvas.draw()
+        if self.blit:
+            self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        return self.artists()
+
+    def animate(self, i):
+        """
+        perform one animation step
+
+        :param   i:   int: animation step
+        :return:
+        """
+        self.lights_object.update(self.dt)
+        self.cars_object.update(self.dt, self.lights_object.state)
+
+        positions = self.cars_object.positions()
+        if len(positions) != len(self.car_colors):
+            self.color_cars(len(positions))
+        self.cars.set_offsets(positions)
+        self.faces.set_facecolors(np.where(self.lights_object.face_go_values()[:, None], GREEN, RED))
+
+        if i % self.frame_rate == 0 and self.write_frames:
+            self.save_figure(i)
+
+        if self.blit:
+            self.blit_frame()
+        return self.artists()
+
+    def blit_frame(self):
+        """
+        restores the cached background and redraws only the collections over it
+        """
+        canvas = self.fig.canvas
+        if self.background is None:
+            self.reset()
+        canvas.restore_region(self.background)
+        for artist in self.artists():
+            self.ax.draw_artist(artist)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
+        return
+
+    def save_figure(self, i):
+        """
+        saves figure as png, including the collections which are otherwise left out of full draws when blitting
+
+        :return None:
+        """
+        for artist in self.artists():
+            artist.set_animated(False)
+        super().save_figure(i)
+        for artist in self.artists():
+            artist.set_animated(self.blit)
+        return None
@@ -2,7 +2,7 @@
 Usage:
 
 python artist.py --location "Harlem, NY" --cars 10 --duration 60 --fps 30 --interactive \
- --light_prescaling 1 --mp4 --serialize
+ --light_prescaling 1 --mp4 --serialize --renderer scatter --basemap --workers 8 --lights_engine event --jit
 
 --location: Must be a geocode-able location, like "Washington, DC, USA" or "Campo Limpo, São Paulo, Brazil"
 --cars: Number of cars to simulate
@@ -16,12 +16,27 @@ python artist.py --location "Harlem, NY" --cars 10 --duration 60 --fps 30 --inte
                         100 -> 1/100 qualifying intersections will not have a light (good for rural areas)
 --mp4: False by default. Will generate HTML movies and output each frame to the timestamped frame directory. If True,
                             will generate an MP4 movie instead.
---serialize: False by default. If True, will serialize the car and light objects dataframes to disk after each frame.
-                                This is useful for collecting data for analysis, but will slow down the simulation.
+--serialize: False by default. If True, will append every frame of the car and light states to a columnar trajectory
+                                in data_store/ (written in buffered row groups, see trajectory.py).
+                                This is useful for collecting data for analysis.
+--renderer: 'lines' by default, which draws every car, light and light face as its own artist. 'scatter' draws them
+                            as three scatter collections updated with one array operation each per frame (much faster
+                            for many cars). 'raster' records the simulation, then draws each frame into a NumPy pixel
+                            buffer over the cached road image and pipes it to FFmpeg (MP4 only, fastest).
+--basemap: False by default. If True, the road network is drawn from an image rendered once per graph and cached next
+                            to the graphml file, instead of being plotted edge by edge.
+--workers: If given, the simulation is recorded first and the MP4 movie is then rendered by this many processes
+                            (streamed to FFmpeg), instead of simulating and rendering frame by frame in one process.
+--lights_engine: 'frame' by default, which tests every light for a switch each frame. 'event' keeps an integer clock
+                            and a queue of the next switch of every light.
+--jit: False by default. If True, the cars are updated by the 'array' engine with the Numba kernels of kernels.py
+                            (install Numba with `pipenv install --categories jit`; without it, the engine keeps to
+                            NumPy).
 """
 
 import argparse
-from animate import Animator
+from animate import Animator, ScatterAnimator
+from basemap import basemap_figure
 from datetime import datetime as dt
 from cars import Cars, TrafficLights
 import convergent_learner as cl
@@ -29,6 +44,7 @@ from matplotlib import animation
 import osmnx as ox
 import simulation as sim
 from osm_request import OGraph
+from render import rasterize_movie, record, render_movie
 from tqdm import tqdm
 import sys
 
@@ -46,7 +62,12 @@ parser.add_argument('-f', '--frames_per_second', type=int, help='The number of f
 parser.add_argument('-i', '--interactive', action='store_true', help='Run the simulation in interactive mode.')
 parser.add_argument('-p', '--light_prescaling', type=int, help='The number of lights to prescale.')
 parser.add_argument('-m', '--mp4', action='store_true', help='Generate an MP4 movie instead of an HTML movie.')
-parser.add_argument('-s', '--serialize', action='store_true', help='Serialize the simulation in parquet dataframes.')
+parser.add_argument('-s', '--serialize', action='store_true', help='Serialize the simulation to a parquet trajectory.')
+parser.add_argument('-r', '--renderer', type=str, choices=['lines', 'scatter', 'raster'], help='How to draw each frame.')
+parser.add_argument('-b', '--basemap', action='store_true', help='Draw the roads from a cached image.')
+parser.add_argument('-w', '--workers', type=int, help='Record, then render an MP4 movie with this many processes.')
+parser.add_argument('-e', '--lights_engine', type=str, choices=['frame', 'event'], help='How to switch lights.')
+parser.add_argument('-j', '--jit', action='store_true', help='Update the cars with the Numba kernels.')
 
 
 def main(
@@ -57,7 +78,12 @@ def main(
         interactive,
         light_prescaling,
         mp4,
-        serialize
+        serialize,
+        renderer='lines',
+        basemap=False,
+        workers=None,
+        lights_engine='frame',
+        jit=False
 ):
     """
     :param location: str
@@ -68,6 +94,11 @@ def main(
     :param light_prescaling: int
     :param mp4: bool
     :param serialize: bool
+    :param renderer: str: 'lines', 'scatter' or 'raster'
+    :param basemap: bool
+    :param workers: int
+    :param lights_engine: str: 'frame' or 'event'
+    :param jit: bool
     """
     query, N = location, cars
 
@@ -81,20 +112,45 @@ def main(
 
     # get OGraph object)
     print('Getting OSM graph..')
-    graph = OGraph(query, save=True)
+    graph = OGraph(query, save=True, headless=basemap or bool(workers) or renderer == 'raster')
+    if basemap:
+        # the cached road image replaces the figure plotted by OGraph
+        graph.fig, graph.ax = basemap_figure(graph)
 
     print('Initializing simulation..')
     # get the simulation methods
     # initialize the car and light state objects
     # cars = Cars(sim.init_culdesac_start_location(N, graph), graph)  # TODO: parametrize
-    cars = Cars(sim.init_random_node_start_location(N, graph), graph, serialize=serialize)
-    lights = TrafficLights(sim.init_traffic_lights(graph, prescale=light_prescaling), graph=graph)
+    cars = Cars(sim.init_random_node_start_location(N, graph), graph, serialize=serialize,
+                engine='array' if jit else 'frame', jit=jit)
+    lights = TrafficLights(sim.init_traffic_lights(graph, prescale=light_prescaling), graph=graph, engine=lights_engine)
 
     # calculate the number of frames to simulate
     n_frames = duration * frames_per_second
 
+    if workers or renderer == 'raster':
+        # record the whole simulation, then render its frames
+        print(f"{dt.now().strftime('%H:%M:%S')} Now recording simulation... ")
+        recording = record(cars, lights, n_frames, dt=1 / 1000)
+        movie = f'traffic_{dt.today().strftime("%Y_%m_%d")}.mp4'
+        if renderer == 'raster':
+            print(f"{dt.now().strftime('%H:%M:%S')} Now rasterizing {len(recording)} frames... ")
+            rasterize_movie(recording, graph, movie, fps=frames_per_second)
+        else:
+            print(f"{dt.now().strftime('%H:%M:%S')} Now rendering {len(recording)} frames with {workers} processes... ")
+            render_movie(recording, graph, movie, fps=frames_per_second, processes=workers)
+        cars.close()
+        if serialize:
+            print('Trajectory writer: {}'.format(cars.writer.stats()))
+        return
+
     # initialize the Animator
-    animator = Animator(fig=graph.fig, ax=graph.ax, cars_object=cars, lights_object=lights, num=(1, 1), n=N)
+    if renderer == 'scatter':
+        # the FuncAnimation does the blitting
+        animator = ScatterAnimator(fig=graph.fig, ax=graph.ax, cars_object=cars, lights_object=lights, num=(1, 1), n=N,
+                                   blit=False)
+    else:
+        animator = Animator(fig=graph.fig, ax=graph.ax, cars_object=cars, lights_object=lights, num=(1, 1), n=N)
     init = animator.reset
     animate = animator.animate
 
@@ -114,6 +170,9 @@ def main(
         mywriter = animation.FFMpegWriter(fps=frames_per_second)
         ani.save(f'traffic_{dt.today().strftime("%Y_%m_%d")}.mp4', writer=mywriter)
 
+    cars.close()
+    if serialize:
+        print('Trajectory writer: {}'.format(cars.writer.stats()))
     return
 
 
@@ -128,7 +187,12 @@ if __name__ == '__main__':
         'interactive': False,
         'light_prescaling': 15,
         'mp4': False,
-        'serialize': False
+        'serialize': False,
+        'renderer': 'lines',
+        'basemap': False,
+        'workers': None,
+        'lights_engine': 'frame',
+        'jit': False
     }
     provided_args = {
         key: args.__getattribute__(key) if args.__getattribute__(key) is not None else default_args[key]
@@ -0,0 +1,96 @@
+"""
+A rasterized image of the road network, used as the static background of Animator frames.
+
+Drawing every edge of a large graph is a large fixed cost of each full canvas draw. The road layer is instead rendered
+once per graph, DPI and extent to a PNG kept next to the .graphml file (graphml_files/<graph>.basemap/), and every
+later run, and every frame, only draws that one image.
+"""
+import hashlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import matplotlib.image as mpimg
+import numpy as np
+import os
+
+
+def basemap_path(graph, axis, dpi, width):
+    """
+    :param graph: object: OGraph object from osm_request
+    :param  axis:  tuple: (xmin, xmax, ymin, ymax) extent of the image
+    :param   dpi:    int: dots per inch
+    :param width: double: width of the image in inches
+    :return path:    str: location of the cached image
+    """
+    key = hashlib.sha1('{} {} {} {}'.format(graph.compiled.fingerprint(), np.round(axis, 3).tolist(), dpi, width)
+                       .encode()).hexdigest()[:16]
+    directory = os.path.join(graph.store, graph.graph_name.replace('.graphml', '.basemap'))
+    return os.path.join(directory, 'dpi{}_{}.png'.format(dpi, key))
+
+
+def render_basemap(graph, axis, dpi, width, edge_color='#999999', edge_linewidth=0.5, bgcolor='#FFFFFF'):
+    """
+    draws every edge polyline of the compiled graph into an offscreen figure, styled as in OGraph.plot_axis
+
+    :param graph: object: OGraph object from osm_request
+    :param  axis:  tuple: (xmin, xmax, ymin, ymax)
+    :param   dpi:    int
+    :param width: double: inches
+    :return image:  array: (height, width, 4) RGBA pixels
+    """
+    compiled = graph.compiled
+    height = width * (axis[3] - axis[2]) / (axis[1] - axis[0])
+    fig = Figure(figsize=(width, height), dpi=dpi, facecolor=bgcolor)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    ax.add_collection(LineCollection(np.split(compiled.geometry, compiled.geometry_offsets[1:-1]),
+                                     colors=edge_color, linewidths=edge_linewidth))
+    ax.set_xlim(axis[0], axis[1])
+    ax.set_ylim(axis[2], axis[3])
+    canvas.draw()
+    image = np.asarray(canvas.buffer_rgba()).copy()
+    return image
+
+
+def load_basemap(graph, axis=None, dpi=100, width=8):
+    """
+    the cached road-network image, rendered and stored first if there is none for this graph, DPI and extent
+
+    :param graph: object: OGraph object from osm_request
+    :param  axis:  tuple: (xmin, xmax, ymin, ymax); the extent of the whole graph (graph.axis) by default
+    :param   dpi:    int
+    :param width: double: inches
+    :return image:  array: (height, width, 4) RGBA pixels (uint8)
+    """
+    axis = graph.axis if axis is None else axis
+    path = basemap_path(graph, axis, dpi, width)
+    if os.path.exists(path):
+        # PNGs are read back as floats in [0, 1]
+        return np.round(mpimg.imread(path) * 255).astype(np.uint8)
+
+    image = render_basemap(graph, axis, dpi, width)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mpimg.imsave(path, image)
+    return image
+
+
+def basemap_figure(graph, dpi=100, width=8):
+    """
+    a figure and axis showing the cached road network, in place of the ones plotted by OGraph (graph.fig, graph.ax)
+
+    :param graph: object: OGraph object from osm_request
+    :param   dpi:    int
+    :param width: double: inches
+    :return fig, ax: Matplotlib figure and axis
+    """
+    import matplotlib.pyplot as plt
+    axis = graph.axis
+    image = load_basemap(graph, axis, dpi, width)
+    fig = plt.figure(figsize=(width, width * image.shape[0] / image.shape[1]), dpi=dpi)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    ax.imshow(image, extent=axis, origin='upper', interpolation='nearest', zorder=0)
+    ax.set_xlim(axis[0], axis[1])
+    ax.set_ylim(axis[2], axis[3])
+    return fig, ax
@@ -0,0 +1,75 @@
+"""
+Persistent spatial binning of moving objects on the map.
+
+Bins are the 200-unit squares of models.determine_bins. Each object keeps its bin and the edges of that bin between
+updates, so an update only re-bins the objects which moved past an edge, and the members of every bin are kept in
+sets so that neighbour queries never rescan all the objects.
+"""
+from collections import defaultdict
+import numpy as np
+
+
+class SpatialBins:
+    def __init__(self, axis, x, y, size=200):
+        """
+        :param axis:  tuple: (xmin, xmax, ymin, ymax) map bounds, i.e. OGraph.axis
+        :param    x:  array: initial x positions
+        :param    y:  array: initial y positions
+        :param size: double: width of a bin
+        """
+        self.xedges = np.arange(axis[0], axis[1], size)
+        self.yedges = np.arange(axis[2], axis[3], size)
+        n = len(x)
+        self.xbin, self.ybin = np.zeros(n, dtype=int), np.zeros(n, dtype=int)
+        self.xlo, self.xhi = np.zeros(n), np.zeros(n)
+        self.ylo, self.yhi = np.zeros(n), np.zeros(n)
+        self.members = defaultdict(set)
+        self.assign(np.arange(n), np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+    @staticmethod
+    def bounds(edges, bins):
+        """ The lower and upper edges of the bins returned by np.digitize(..., edges) """
+        padded = np.concatenate(([-np.inf], edges, [np.inf]))
+        return padded[bins], padded[bins + 1]
+
+    def assign(self, objects, x, y):
+        """
+        (re-)bins the given objects and moves them between bin member sets
+
+        :param objects: array of int: object positions
+        :param       x: array: x positions of all objects
+        :param       y: array: y positions of all objects
+        """
+        for i in objects.tolist():
+            self.members[(self.xbin[i], self.ybin[i])].discard(i)
+
+        xbin, ybin = np.digitize(x[objects], self.xedges), np.digitize(y[objects], self.yedges)
+        self.xbin[objects], self.ybin[objects] = xbin, ybin
+        self.xlo[objects], self.xhi[objects] = self.bounds(self.xedges, xbin)
+        self.ylo[objects], self.yhi[objects] = self.bounds(self.yedges, ybin)
+
+        for i, key in zip(objects.tolist(), zip(xbin.tolist(), ybin.tolist())):
+            self.members[key].add(i)
+        return
+
+    def update(self, x, y):
+        """
+        re-bins only the objects whose position moved past an edge of their bin
+
+        :param       x: array: x positions
+        :param       y: array: y positions
+        :return moved: array of int: positions of the objects which changed bin
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        moved = np.flatnonzero((x < self.xlo) | (x >= self.xhi) | (y < self.ylo) | (y >= self.yhi))
+        if moved.size:
+            self.assign(moved, x, y)
+        return moved
+
+    def neighbours(self, xbin, ybin):
+        """
+        :param    xbin: int
+        :param    ybin: int
+        :return objects: set: positions of the objects in the bin
+        """
+        return self.members.get((xbin, ybin), set())
@@ -13,14 +13,21 @@ for i in range(100):
     car_states.append(state)
 
 """
+from binning import SpatialBins
+from domains import Domains
+from fleet import Fleet
+import heapq
+import kernels
+import math
 import simulation as sim
-import models
 import navigation as nav
 import numpy as np
+from trajectory import AsyncTrajectoryWriter
 
 
 class Cars:
-    def __init__(self, init_state, graph, serialize=False):
+    def __init__(self, init_state, graph, serialize=False, engine='frame', kinematics='point', max_level=0,
+                 jit=False, workers=0):
         """
         car objects are used for accessing and updating each car's parameters
 
@@ -28,33 +35,118 @@ class Cars:
         __________
         :param: init_state: dataframe:    each Series row is a car
         :param:      graph: object: OGraph object from osm_request
-        :param:  serialize:   bool: write the state DataFrame to a local data store each update (very slow when True)
+        :param:  serialize:   bool: append every update to a trajectory in the local data store, written by a
+                                    background thread (see trajectory.AsyncTrajectoryWriter)
+        :param:     engine:    str: 'frame' updates the state DataFrame row by row,
+                                    'array' updates a struct-of-arrays Fleet with whole-array operations
+        :param: kinematics:    str: 'point' moves cars by velocity * dt and detects node crossings by proximity,
+                                    'arc' moves cars by distance along their paths, rolling over any number of path
+                                    points exactly and integrating their speed within the step (see
+                                    simulation.integrate_fleet), so that dt can be large ('array' engine only)
+        :param:  max_level:    int: multi-rate integration ('arc' kinematics only): each update, every car is given
+                                    its own sub-step dt / 2 ** level, with level up to max_level, from its distance to
+                                    the nearest car, light or bend ahead (see update_multirate). 0 integrates every car
+                                    in one step of dt
+        :param:        jit:   bool: update speeds and positions with the Numba kernels of kernels ('array' engine),
+                                    falling back to NumPy if Numba is not installed
+        :param:    workers:    int: split the map into this many tiles, each simulated by its own worker process
+                                    ('arc' kinematics only, see domains). 0 simulates every car in this process.
+                                    The workers are not forked, so the main script needs an
+                                    if __name__ == '__main__' guard
         """
+        if engine not in ('frame', 'array'):
+            raise ValueError(f"Unknown engine {engine}. Choose 'frame' or 'array'.")
+        if kinematics not in ('point', 'arc'):
+            raise ValueError(f"Unknown kinematics {kinematics}. Choose 'point' or 'arc'.")
+        if kinematics == 'arc' and engine != 'array':
+            raise ValueError("Arc-length kinematics need the 'array' engine.")
+        if max_level and kinematics != 'arc':
+            raise ValueError("Multi-rate integration needs arc-length kinematics.")
+        if jit and engine != 'array':
+            raise ValueError("The Numba kernels need the 'array' engine.")
+        if workers and (kinematics != 'arc' or max_level):
+            raise ValueError("Worker processes need arc-length kinematics, without multi-rate integration.")
+        self.engine = engine
+        self.kinematics = kinematics
+        self.max_level = max_level
+        self.jit = jit and kernels.available
+        self.workers = workers
+        self.domains = None
+        self.fleet = None
+        self.bins = None
+        self.graph = graph
+        self.axis = self.graph.axis
+        self.serialize = serialize
+        self.serialize_path = 'data_store'
+        self.writer = AsyncTrajectoryWriter(self.serialize_path) if serialize else None
+        self.steps = 0
         self.init_state = init_state
         self.state = self.init_state.copy()
         self.time_elapsed = 0
         self.lights = 0
-        self.graph = graph
-        self.serialize = serialize
-        self.serialize_path = 'data_store'
-        self.axis = self.graph.axis
         self.stop_distance = 5
 
+    @property
+    def state(self):
+        """
+        the cars DataFrame; with the 'array' engine it is only built from the Fleet arrays when requested
+
+        :return state: dataframe
+        """
+        if self.fleet is not None:
+            return self.fleet.frame()
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if self.engine == 'array':
+            self.fleet = Fleet(state, self.graph)
+            if self.workers:
+                self.close_domains()
+                self.domains = Domains(self.fleet, self.axis, self.workers, jit=self.jit)
+        else:
+            self._state = state
+        self.bins = SpatialBins(self.axis, state['x'].to_numpy(), state['y'].to_numpy())
+        if self.writer is not None:
+            # paths are written once, not with every step
+            self.writer.write_paths(self.steps, state)
+
+    def positions(self):
+        """
+        :return positions: array: (n, 2) x, y of every car, in state row order
+        """
+        if self.fleet is not None:
+            return np.column_stack((self.fleet.x, self.fleet.y))
+        return self._state[['x', 'y']].to_numpy(dtype=float)
+
     def write_state(self):
         """
+        hands a snapshot of the current step to the trajectory writer thread, which buffers the rows and writes them in
+        row groups
 
         :return:
         """
-        # write to local data store
-        write_state = self.state.copy()
-        # pre-process
-        time_elapsed = str(round(self.time_elapsed, 4)).replace(".", "").zfill(4)
+        self.writer.append(self.steps, self.time_elapsed, self.fleet if self.fleet is not None else self._state,
+                           self.lights)
+        return
 
-        write_state.to_parquet(
-            f'{self.serialize_path}/dt={time_elapsed}/cars_state_at_{time_elapsed}.parquet.gz',
-            engine='fastparquet',
-            overwrite=True
-        )
+    def close(self):
+        """
+        writes out the buffered trajectory steps and finalizes the trajectory files (when serializing),
+        and stops the worker processes (with workers)
+
+        :return:
+        """
+        self.close_domains()
+        if self.writer is not None:
+            self.writer.close()
+        return
+
+    def close_domains(self):
+        """ Stops the worker processes of the current Fleet, if any """
+        if self.domains is not None:
+            self.domains.close()
+            self.domains = None
         return
 
     # TODO: profile
@@ -69,13 +161,20 @@ class Cars:
 
         Returns
         _______
-        :return self.state: dataframe
+        :return self.state: dataframe, or the Fleet object with the 'array' engine
         """
         self.lights = lights
         self.time_elapsed += dt
-        # determine binning and assign bins to cars
-        # TODO: don't re-sort every time-step. Only place cars in a new bin if their bin is about to change
-        self.state['xbin'], self.state['ybin'] = models.determine_bins(self.axis, self.state)
+        self.steps += 1
+
+        if self.fleet is not None:
+            return self.update_fleet(dt)
+
+        # only cars which moved past the edge of their bin are placed in a new bin
+        moved = self.bins.update(self.state['x'].to_numpy(), self.state['y'].to_numpy())
+        if moved.size:
+            index = self.state.index[moved]
+            self.state.loc[index, 'xbin'], self.state.loc[index, 'ybin'] = self.bins.xbin[moved], self.bins.ybin[moved]
 
         node_distances, car_distances, light_distances = self.find_obstacles()
 
@@ -94,32 +193,177 @@ class Cars:
 
         return self.state
 
+    def update_fleet(self, dt):
+        """
+        one step of the 'array' engine: every car is updated at once with whole-array operations
+
+        :param      dt: double
+        :return fleet: object: Fleet object
+        """
+        fleet = self.fleet
+        self.bins.update(fleet.x, fleet.y)
+        fleet.xbin, fleet.ybin = self.bins.xbin, self.bins.ybin
+
+        if self.domains is not None:
+            self.domains.update(dt, self.lights)
+        elif self.max_level:
+            self.update_multirate(dt)
+        elif self.kinematics == 'arc':
+            view = nav.fleet_view(fleet, exact=True)
+            # a car must know every obstacle it could come in sight of within the step
+            look_ahead = sim.look_ahead + sim.speed_limit * dt
+            fleet.distance_to_node, fleet.distance_to_car, fleet.distance_to_red_light = \
+                nav.fleet_obstacles(fleet, view, self.lights, look_ahead=look_ahead)
+            leaders, _ = fleet.occupancy.leaders(look_ahead)
+            sim.integrate_fleet(fleet, dt, leaders, jit=self.jit)
+        else:
+            view = nav.fleet_view(fleet)
+            fleet.distance_to_node, fleet.distance_to_car, fleet.distance_to_red_light = \
+                nav.fleet_obstacles(fleet, view, self.lights, past_node=False)
+            sim.update_fleet(fleet, view, dt, jit=self.jit)
+            fleet.x += fleet.vx * dt
+            fleet.y += fleet.vy * dt
+        if self.domains is None:
+            # with workers, each tile indexes the leaders of its own cars
+            fleet.track_edges()
+        fleet.invalidate()
+
+        if self.serialize:
+            self.write_state()
+
+        return fleet
+
+    def update_multirate(self, dt):
+        """
+        multi-rate integration of one step of the 'array' engine with arc-length kinematics
+
+        Every car is given a level from its distance to the nearest car, light (whatever its colour, as it may switch
+        at the next update) or bend ahead, and moves in 2 ** level sub-steps of dt / 2 ** level: free-flowing cars in
+        one stride, congested ones in fine sub-steps. Only the cars due at a sub-step are updated in it, each level
+        group with simulation.integrate_fleet over its own sub-step, so that a car on its own follows the same
+        trajectory as without multi-rate integration, and every car has covered exactly dt at the end of the update.
+
+        Obstacles are found once per update. Within the update, the gap to each car's leader follows the distance
+        both cars have travelled since, and the distance to a red light follows the distance the car has travelled.
+
+        :param dt: double
+        """
+        fleet = self.fleet
+        # a car must know every obstacle it could come in sight of within the update
+        look_ahead = sim.look_ahead + sim.speed_limit * dt
+        view = nav.fleet_view(fleet, exact=True)
+        fleet.distance_to_node, fleet.distance_to_car, fleet.distance_to_red_light = \
+            nav.fleet_obstacles(fleet, view, self.lights, look_ahead=look_ahead)
+        leader, _ = fleet.occupancy.leaders(look_ahead)
+
+        levels = sim.step_levels(nav.fleet_events(fleet, self.lights, look_ahead=look_ahead), dt, self.max_level)
+        n_steps = 1 << int(levels.max()) if fleet.n else 1
+        # the number of finest sub-steps in one sub-step of each car
+        strides = n_steps >> levels
+
+        start, car_gaps, light_gaps = fleet.s.copy(), fleet.distance_to_car.copy(), fleet.distance_to_red_light.copy()
+        for k in range(n_steps):
+            due = k % strides == 0
+            for level in np.unique(levels[due]):
+                cars = np.flatnonzero(due & (levels == level))
+                travelled = fleet.s - start
+                ahead = np.where(leader[cars] >= 0, travelled[leader[cars]], 0) - travelled[cars]
+                # obstacles are kept positive, as 0 means there is none
+                fleet.distance_to_car[cars] = np.where(car_gaps[cars] > 0,
+                                                       np.maximum(car_gaps[cars] + ahead, 1.0e-9), 0)
+                fleet.distance_to_red_light[cars] = np.where(light_gaps[cars] > 0,
+                                                             np.maximum(light_gaps[cars] - travelled[cars], 1.0e-9), 0)
+                sim.integrate_fleet(fleet, dt / (1 << int(level)), leader[cars], cars, jit=self.jit)
+        return
+
     # TODO: optimize this function
     def find_obstacles(self):
         node_distances, car_distances, light_distances = [], [], []
         for car in self.state.iterrows():
             frontview = nav.FrontView(car[1], self.graph, stop_distance=self.stop_distance)
             node_distances.append(frontview.distance_to_node())
-            car_distances.append(frontview.distance_to_car(self.state))
+            car_distances.append(frontview.distance_to_car(self.state, self.bins))
             light_distances.append(frontview.distance_to_light(self.lights))
 
         return node_distances, car_distances, light_distances
 
 
 class TrafficLights:
-    def __init__(self, light_state, graph):
+    def __init__(self, light_state, graph, engine='frame', tick=1.0e-6):
         """
         traffic light objects are used for finding, updating, and timing traffic light nodes
 
         :param: light_state: list: each entry in the list is a light dictionary
         :param: graph: objectL OGraph object from osm_request
+        :param: engine: str: 'frame' tests every light for a switch each update,
+                             'event' keeps an integer clock and a queue of the next switch of every light
+        :param: tick: double: duration (in seconds) of one tick of the 'event' engine clock
         """
+        if engine not in ('frame', 'event'):
+            raise ValueError(f"Unknown engine {engine}. Choose 'frame' or 'event'.")
+        self.engine = engine
         self.init_state = light_state
         self.state = self.init_state.copy()
         self.time_elapsed = 0
         self.xbins = np.arange(graph.axis[0], graph.axis[1], 200)
         self.ybins = np.arange(graph.axis[2], graph.axis[3], 200)
 
+        self.tick = tick
+        self.clock = 0
+        # the fraction of a tick elapsed since the clock last advanced, so that steps which are not a whole number of
+        # ticks do not drift
+        self.remainder = 0.0
+        if self.engine == 'event':
+            self.schedule_switches()
+
+    def schedule_switches(self):
+        """
+        packs every face's go-value into one boolean array and queues the first switch of every light
+
+        The 'go-values' cells of the state DataFrame become views into the packed array,
+        so a switch flips the faces of one light in place without rewriting the column.
+        """
+        degree = self.state['degree'].to_numpy(dtype=int)
+        self.face_offsets = np.concatenate(([0], np.cumsum(degree)))
+        self.go = np.concatenate([np.asarray(values, dtype=bool) for values in self.state['go-values']]) \
+            if len(degree) else np.zeros(0, dtype=bool)
+
+        views = np.empty(len(degree), dtype=object)
+        for i in range(len(degree)):
+            views[i] = self.go[self.face_offsets[i]:self.face_offsets[i + 1]]
+        self.state['go-values'] = views
+
+        # switch periods in integer ticks; a light with a switch-time of 0 never switches
+        self.periods = np.round(self.state['switch-time'].to_numpy(dtype=float) / self.tick).astype(np.int64)
+        self.switches = [(period, i) for i, period in enumerate(self.periods.tolist()) if period > 0]
+        heapq.heapify(self.switches)
+        return
+
+    def positions(self):
+        """
+        :return positions: array: (n, 2) x, y of every light
+        """
+        return self.state[['x', 'y']].to_numpy(dtype=float)
+
+    def face_positions(self):
+        """
+        :return positions: array: (sum of degrees, 2) x, y of every light face, light by light
+        """
+        if not len(self.state):
+            return np.zeros((0, 2))
+        return np.column_stack((np.concatenate(self.state['out-xpositions'].to_numpy()),
+                                np.concatenate(self.state['out-ypositions'].to_numpy()))).astype(float)
+
+    def face_go_values(self):
+        """
+        :return go: array of bool: the go-value of every light face, in the order of face_positions
+        """
+        if self.engine == 'event':
+            return self.go
+        if not len(self.state):
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(self.state['go-values'].to_numpy()).astype(bool)
+
     def update(self, dt):
         """
         update the state of the traffic lights
@@ -127,7 +371,29 @@ class TrafficLights:
         :param: dt:
         :return:
         """
+        if self.engine == 'event':
+            return self.update_events(dt)
+
         self.time_elapsed += dt
         time_to_switch = np.isclose(0, self.time_elapsed % self.state['switch-time'], rtol=1.0e-4)
         self.state['go-values'] = ~self.state['go-values'] * time_to_switch + self.state['go-values'] * ~time_to_switch
         return self.state
+
+    def update_events(self, dt):
+        """
+        advances the integer clock by dt and switches only the lights whose next switch falls within the step
+
+        :param: dt: double
+        :return: self.state: dataframe
+        """
+        ticks = self.remainder + dt / self.tick
+        # a count of ticks within rounding error of a whole number is that number
+        whole = round(ticks) if math.isclose(ticks, round(ticks), rel_tol=0, abs_tol=1.0e-6) else math.floor(ticks)
+        self.clock += whole
+        self.remainder = ticks - whole
+        self.time_elapsed = (self.clock + self.remainder) * self.tick
+        while self.switches and self.switches[0][0] <= self.clock:
+            tick, i = heapq.heappop(self.switches)
+            self.go[self.face_offsets[i]:self.face_offsets[i + 1]] ^= True
+            heapq.heappush(self.switches, (tick + self.periods[i], i))
+        return self.state
@@ -0,0 +1,193 @@
+"""
+A compiled, array-backed representation of a projected OSMnx graph.
+
+OGraph builds one CompiledGraph after projection so that the per-car, per-step hot paths in navigation can work
+on integer node indices and vector math instead of networkx dict-of-dict lookups:
+
+    node_ids:          (N,)    node IDs, in index order
+    node_index:        dict    node ID -> index
+    positions:         (N, 2)  projected x, y of each node
+    indptr, indices:   CSR adjacency; the successors of node i are indices[indptr[i]:indptr[i + 1]] (sorted)
+    edge_length:       (E,)    length of each directed edge, aligned with indices
+    geometry_offsets:  (E + 1,) the polyline of edge e is geometry[geometry_offsets[e]:geometry_offsets[e + 1]]
+    geometry:          (M, 2)  flat buffer of every edge polyline
+
+Parallel edges are collapsed to the shortest one. The polyline of a route is a gather of its edges' slices of
+geometry (see route_polyline), so paths are built without walking the networkx edge data.
+
+The arrays can be saved to a directory of .npy files and loaded back memory-mapped (see save and load), so that
+several processes share one read-only copy of them.
+"""
+import hashlib
+import numpy as np
+import os
+
+ARRAYS = ('node_ids', 'positions', 'indices', 'indptr', 'edge_keys', 'edge_length', 'geometry_offsets', 'geometry')
+
+
+class CompiledGraph:
+    def __init__(self, G):
+        """
+        compiles the arrays from a networkx graph
+
+        :param G: networkx MultiDiGraph: projected graph (i.e. OGraph.G)
+        """
+        self.node_ids = np.array(list(G.nodes()))
+        self.node_index = {node: i for i, node in enumerate(self.node_ids.tolist())}
+        self.positions = np.array([(data['x'], data['y']) for _, data in G.nodes(data=True)],
+                                  dtype=float).reshape(-1, 2)
+
+        # if there are parallel edges, select the shortest in length
+        shortest = {}
+        for u, v, data in G.edges(data=True):
+            key = (self.node_index[u], self.node_index[v])
+            if key not in shortest or data['length'] < shortest[key]['length']:
+                shortest[key] = data
+
+        pairs = sorted(shortest)
+        sources = np.array([u for u, _ in pairs], dtype=np.int64)
+        self.indices = np.array([v for _, v in pairs], dtype=np.int64)
+        self.indptr = np.searchsorted(sources, np.arange(len(self.node_ids) + 1)).astype(np.int64)
+        # the successors of every node are sorted, so (source, target) keys are sorted across the whole graph
+        self.edge_keys = sources * len(self.node_ids) + self.indices
+        self.edge_length = np.array([shortest[pair]['length'] for pair in pairs], dtype=float)
+
+        lines = []
+        for (u, v) in pairs:
+            data = shortest[(u, v)]
+            if 'geometry' in data:
+                xs, ys = data['geometry'].xy
+                lines.append(np.column_stack((xs, ys)))
+            else:
+                # the edge is a straight line from node to node
+                lines.append(self.positions[[u, v]])
+        counts = np.array([len(line) for line in lines], dtype=np.int64)
+        self.geometry_offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.geometry = np.concatenate(lines) if lines else np.empty((0, 2))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        loads the arrays written by save
+
+        :param directory:  str: directory of .npy files
+        :param mmap_mode:  str: numpy memory-map mode, or None to read the arrays into memory
+        :return compiled: CompiledGraph
+        """
+        compiled = cls.__new__(cls)
+        for name in ARRAYS:
+            setattr(compiled, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode))
+        compiled.node_index = {node: i for i, node in enumerate(compiled.node_ids.tolist())}
+        return compiled
+
+    def save(self, directory):
+        """
+        writes every array to its own .npy file
+
+        :param directory: str: created if it does not exist
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name), allow_pickle=False)
+        return
+
+    def fingerprint(self):
+        """
+        :return fingerprint: str: a digest of the nodes, positions, adjacency and edge lengths of the graph
+        """
+        digest = hashlib.sha1()
+        for array in (self.node_ids, self.positions, self.indptr, self.indices, self.edge_length):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def index_of(self, node):
+        """
+        :param  node: graphml node ID
+        :return    i: int: node index
+        """
+        return self.node_index[node]
+
+    def indices_of(self, nodes):
+        """
+        :param  nodes: iterable of graphml node IDs
+        :return     i: array of int: node indices
+        """
+        return np.array([self.node_index[node] for node in nodes], dtype=np.int64)
+
+    def position(self, node):
+        """
+        :param     node: graphml node ID
+        :return position: array: [x, y]
+        """
+        return self.positions[self.node_index[node]].copy()
+
+    def positions_of(self, nodes):
+        """
+        :param     nodes: iterable of graphml node IDs
+        :return positions: array: (n, 2)
+        """
+        return self.positions[self.indices_of(nodes)]
+
+    def successors(self, i):
+        """
+        :param      i: int: node index
+        :return nodes: array of int: indices of the nodes one edge away from node i
+        """
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def edge_ids(self, u, v):
+        """
+        vectorized lookup of the edge between node indices u and v
+
+        :param      u: array of int: source node indices
+        :param      v: array of int: target node indices
+        :return edges: array of int: edge indices (-1 where there is no such edge)
+        """
+        keys = np.asarray(u, dtype=np.int64) * len(self.node_ids) + np.asarray(v, dtype=np.int64)
+        edges = np.searchsorted(self.edge_keys, keys)
+        found = edges < len(self.edge_keys)
+        found[found] = self.edge_keys[edges[found]] == keys[found]
+        return np.where(found, edges, -1)
+
+    def route_edges(self, route):
+        """
+        :param   route: list of node IDs
+        :return edges: array of int: edge indices along the route
+        """
+        route = self.indices_of(route)
+        edges = self.edge_ids(route[:-1], route[1:])
+        if (edges < 0).any():
+            raise KeyError('The route contains a pair of nodes which are not connected by an edge.')
+        return edges
+
+    def route_length(self, route):
+        """
+        :param   route: list of node IDs
+        :return length: double: sum of the edge lengths along the route
+        """
+        if len(route) < 2:
+            return 0.0
+        return float(self.edge_length[self.route_edges(route)].sum())
+
+    def edge_polyline(self, edge):
+        """
+        :param     edge: int: edge index
+        :return polyline: array: (m, 2) points from the source node to the target node
+        """
+        return self.geometry[self.geometry_offsets[edge]:self.geometry_offsets[edge + 1]]
+
+    def route_polyline(self, route):
+        """
+        concatenates the polylines of every edge along a route (twin points, where edges meet, are kept)
+
+        :param    route: list of node IDs
+        :return polyline: array: (m, 2) points from the origin to the destination of the route
+        """
+        if len(route) < 2:
+            return np.empty((0, 2))
+        edges = self.route_edges(route)
+        starts = self.geometry_offsets[edges]
+        counts = self.geometry_offsets[edges + 1] - starts
+        # ragged gather: the k-th point of edge j is at starts[j] + k
+        shift = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        return self.geometry[shift + np.arange(counts.sum())]
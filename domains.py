@@ -0,0 +1,318 @@
+"""
+Spatial domain decomposition of the 'array' engine of Cars across worker processes.
+
+The map extent (graph.axis) is split into a grid of tiles, one per worker. Each worker process is sent a copy of the
+Fleet once, when it starts, so paths, edges and route lights are never sent again, and it integrates only the cars it
+owns: those in its tile. Every step, the parent process sends each worker
+
+    handoffs: the cars which moved into its tile during the last step, with their state
+    halo:     the cars of other tiles within look-ahead distance of its tile, with their state at the start of the step
+
+and each worker finds the leaders of its cars in an occupancy index of its own and halo cars. As the road distance to
+a leader is never shorter than the straight line to it, the halo holds every leader a car can see, so a step gives the
+same result as in a single process. The workers send back the state of their cars after the step, with the cars near
+the border of their tile, and the cars which left their tile are handed off to the owner of the tile they moved into.
+A car within look-ahead distance of another tile is within that distance of the border of its own tile, so the halos
+are picked from the border cars only.
+
+Workers are started with 'forkserver' (or 'spawn' where it is missing, as on Windows), never 'fork': a forked worker
+would inherit the locks of the threads of the parent, such as the trajectory writer of Cars. Each worker is sent a
+pickled Tile, and, as with any program which starts processes this way, the main script must guard its entry point
+with if __name__ == '__main__'.
+
+Car state is the arc-length state of a Fleet (see Fleet.move_along), so this needs arc-length kinematics.
+
+Example usage:
+
+if __name__ == '__main__':
+    cars = Cars(init_state, graph, engine='array', kinematics='arc', workers=8)
+    for i in range(100):
+        cars.update(dt, lights.update(dt))
+    cars.close()
+"""
+import copy
+import multiprocessing
+import numpy as np
+from occupancy import EdgeOccupancy
+import simulation as sim
+
+# the state of a car which is handed off, or sent as halo: arrays of Fleet, and the path cursor
+STATE = ('s', 'x', 'y', 'vx', 'vy', 'route_time')
+# the per-car results of a step
+RESULTS = STATE + ('distance_to_node', 'distance_to_car', 'distance_to_red_light')
+# how worker processes are started
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def tile_shape(workers, axis):
+    """
+    the grid of tiles for a number of workers whose tiles are closest to square
+
+    :param workers:    int
+    :param    axis:  tuple: (xmin, xmax, ymin, ymax)
+    :return ncols, nrows: int
+    """
+    width, height = axis[1] - axis[0], axis[3] - axis[2]
+    shapes = [(ncols, workers // ncols) for ncols in range(1, workers + 1) if workers % ncols == 0]
+    return min(shapes, key=lambda shape: abs(np.log((width / shape[0]) / (height / shape[1]))))
+
+
+def tile_bounds(axis, shape):
+    """
+    :param   axis: tuple: (xmin, xmax, ymin, ymax)
+    :param  shape: tuple: ncols, nrows
+    :return bounds: array: (ncols * nrows, 4) xmin, xmax, ymin, ymax of every tile, row by row
+    """
+    ncols, nrows = shape
+    xs, ys = np.linspace(axis[0], axis[1], ncols + 1), np.linspace(axis[2], axis[3], nrows + 1)
+    col, row = np.tile(np.arange(ncols), nrows), np.repeat(np.arange(nrows), ncols)
+    return np.column_stack((xs[col], xs[col + 1], ys[row], ys[row + 1]))
+
+
+def tile_of(x, y, axis, shape):
+    """
+    the tile holding every position (positions outside the axis belong to the nearest border tile)
+
+    :param   x, y: arrays
+    :param   axis: tuple: (xmin, xmax, ymin, ymax)
+    :param  shape: tuple: ncols, nrows
+    :return tiles: array of int
+    """
+    ncols, nrows = shape
+    col = np.clip(np.floor((x - axis[0]) / (axis[1] - axis[0]) * ncols), 0, ncols - 1).astype(np.int64)
+    row = np.clip(np.floor((y - axis[2]) / (axis[3] - axis[2]) * nrows), 0, nrows - 1).astype(np.int64)
+    return row * ncols + col
+
+
+def border_margins(x, y, bounds):
+    """
+    the distance from every position to the nearest border of its tile, negative outside the tile
+
+    :param   x, y: arrays
+    :param bounds: array: (4,) or (len(x), 4) xmin, xmax, ymin, ymax of the tile of every position
+    :return margins: array
+    """
+    xmin, xmax, ymin, ymax = np.asarray(bounds).T
+    return np.minimum(np.minimum(x - xmin, xmax - x), np.minimum(y - ymin, ymax - y))
+
+
+class Tile:
+    def __init__(self, fleet, index, axis, shape, jit=False):
+        """
+        the cars of one tile, as simulated by its worker process
+
+        :param fleet: object: Fleet object from fleet (the worker's own copy)
+        :param index:    int: tile index
+        :param  axis:  tuple: (xmin, xmax, ymin, ymax) of the whole map
+        :param shape:  tuple: ncols, nrows of the grid
+        :param   jit:   bool: as in Cars
+        """
+        self.fleet = fleet
+        self.index = index
+        self.axis = axis
+        self.shape = shape
+        self.bounds = tile_bounds(axis, shape)[index]
+        self.jit = jit
+        self.owned = np.zeros(fleet.n, dtype=bool)
+
+    def __getstate__(self):
+        """ The Tile is pickled for its worker without the graph, and the DataFrames, of its Fleet """
+        state = self.__dict__.copy()
+        state['fleet'] = copy.copy(self.fleet)
+        state['fleet'].graph, state['fleet'].init_state, state['fleet']._frame = None, None, None
+        return state
+
+    def load(self, cars, state):
+        """
+        :param  cars: array of int: car positions
+        :param state:        tuple: arrays in STATE order, then the path cursor of the cars
+        """
+        for name, values in zip(STATE, state):
+            getattr(self.fleet, name)[cars] = values
+        self.fleet.paths.cursor[cars] = state[-1]
+        return
+
+    def step(self, dt, go, handoffs, halo, state):
+        """
+        integrates the cars of the tile by one step
+
+        :param       dt: double
+        :param       go: array of bool: go-value of every light face
+        :param handoffs: array of int: cars which moved into the tile
+        :param     halo: array of int: cars of other tiles near the tile
+        :param    state:        tuple: state of the handoffs, then of the halo (see load)
+        :return   cars, results, leaving, border: the cars of the tile, their results in RESULTS order then their
+                                                  path cursors, a mask of the cars which left the tile, and a mask of
+                                                  the cars within look-ahead distance of its border or outside it
+        """
+        fleet = self.fleet
+        self.load(np.concatenate((handoffs, halo)), state)
+        self.owned[handoffs] = True
+        cars = np.flatnonzero(self.owned)
+        look_ahead = sim.look_ahead + sim.speed_limit * dt
+
+        # leaders among the cars of the tile and the halo
+        near = np.union1d(cars, halo)
+        occupancy = EdgeOccupancy(len(near))
+        occupancy.update(*fleet.paths.edge_positions(fleet.x[near], fleet.y[near], near))
+        leaders, gaps = occupancy.leaders(look_ahead)
+        own = np.searchsorted(near, cars)
+        leaders, gaps = np.where(leaders[own] >= 0, near[leaders[own]], -1), gaps[own]
+        fleet.distance_to_car[cars] = np.where(np.isinf(gaps), 0, gaps)
+
+        if fleet.route_lights is not None:
+            fleet.distance_to_red_light[cars] = fleet.route_lights.red_light_distances(
+                fleet.paths, fleet.x[cars], fleet.y[cars], go, look_ahead, cars)
+
+        sim.integrate_fleet(fleet, dt, leaders, cars, jit=self.jit)
+
+        leaving = tile_of(fleet.x[cars], fleet.y[cars], self.axis, self.shape) != self.index
+        self.owned[cars[leaving]] = False
+        border = border_margins(fleet.x[cars], fleet.y[cars], self.bounds) <= look_ahead
+        results = tuple(getattr(fleet, name)[cars] for name in RESULTS) + (fleet.paths.cursor[cars],)
+        return cars, results, leaving, border
+
+
+def serve(connection, tile):
+    """
+    the loop of a worker process: steps its tile for every message until it receives None
+
+    :param connection: object: end of a multiprocessing Pipe
+    :param       tile: object: Tile object
+    """
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        try:
+            connection.send(tile.step(*message))
+        except Exception as error:
+            connection.send(error)
+    connection.close()
+    return
+
+
+class Domains:
+    def __init__(self, fleet, axis, workers, jit=False):
+        """
+        splits the cars of a Fleet between worker processes by tile; the workers are started on the first update
+
+        :param   fleet: object: Fleet object from fleet, kept up to date with the results of the workers
+        :param    axis:  tuple: (xmin, xmax, ymin, ymax) of the map, as graph.axis
+        :param workers:    int: number of tiles and worker processes
+        :param     jit:   bool: as in Cars
+        """
+        self.fleet = fleet
+        self.axis = tuple(axis)
+        self.shape = tile_shape(workers, self.axis)
+        self.bounds = tile_bounds(self.axis, self.shape)
+        self.jit = jit
+        self.connections, self.processes = None, []
+
+        # every car starts out handed off to the tile it is in
+        self.owner = tile_of(fleet.x, fleet.y, self.axis, self.shape)
+        self.handoffs = [np.flatnonzero(self.owner == tile) for tile in range(len(self.bounds))]
+        # the cars near the border of their tile, as reported by the workers, and the width they were picked with
+        self.border, self.border_width = None, 0.0
+
+    def start(self, lights):
+        """
+        indexes the lights along every route, then starts one worker per tile with a copy of the Fleet
+
+        :param lights: dataframe: traffic lights state
+        """
+        if len(lights):
+            self.fleet.attach_lights(lights)
+        context = multiprocessing.get_context(START_METHOD)
+        if START_METHOD == 'forkserver':
+            # the fork server imports this module once, rather than every worker
+            context.set_forkserver_preload([__name__])
+        self.connections = []
+        for tile in range(len(self.bounds)):
+            parent, child = context.Pipe()
+            # the Tile and its Fleet are pickled for the worker
+            process = context.Process(target=serve, name=f'tile-{tile}', daemon=True,
+                                      args=(child, Tile(self.fleet, tile, self.axis, self.shape, self.jit)))
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        return
+
+    def state(self, cars):
+        """
+        :param   cars: array of int
+        :return state: tuple: arrays in STATE order, then the path cursor of the cars
+        """
+        return tuple(getattr(self.fleet, name)[cars] for name in STATE) + (self.fleet.paths.cursor[cars],)
+
+    def borders(self, width):
+        """
+        :param width: double
+        :return cars: array of int: the cars within width of the border of their tile, or outside it, among all cars
+        """
+        margins = border_margins(self.fleet.x, self.fleet.y, self.bounds[self.owner])
+        return np.flatnonzero(margins <= width)
+
+    def halo(self, tile, width):
+        """
+        :param  tile:    int: tile index
+        :param width: double: distance from the tile within which the cars of other tiles are sent
+        :return cars: array of int
+        """
+        xmin, xmax, ymin, ymax = self.bounds[tile]
+        cars = self.border
+        x, y = self.fleet.x[cars], self.fleet.y[cars]
+        near = (x >= xmin - width) & (x <= xmax + width) & (y >= ymin - width) & (y <= ymax + width)
+        return cars[near & (self.owner[cars] != tile)]
+
+    def update(self, dt, lights):
+        """
+        steps every tile in parallel, then gathers the results into the Fleet and hands off the cars which changed
+        tile
+
+        :param     dt: double
+        :param lights: dataframe: traffic lights state
+        """
+        if self.connections is None:
+            self.start(lights)
+        go = np.concatenate(lights['go-values'].to_numpy()).astype(bool) if len(lights) else np.zeros(0, dtype=bool)
+        width = sim.look_ahead + sim.speed_limit * dt
+        if self.border is None or width > self.border_width:
+            # on the first step, or if dt grew, the border cars are picked among all cars
+            self.border, self.border_width = self.borders(width), width
+
+        # every worker gets its message before any result is read, so the tiles are stepped at the same time
+        for tile, connection in enumerate(self.connections):
+            handoffs, halo = self.handoffs[tile], self.halo(tile, width)
+            connection.send((dt, go, handoffs, halo, self.state(np.concatenate((handoffs, halo)))))
+
+        handoffs, border = [[] for _ in self.connections], []
+        for connection in self.connections:
+            result = connection.recv()
+            if isinstance(result, Exception):
+                raise RuntimeError('A tile worker failed.') from result
+            cars, results, leaving, near = result
+            border.append(cars[near])
+            for name, values in zip(RESULTS, results):
+                getattr(self.fleet, name)[cars] = values
+            self.fleet.paths.cursor[cars] = results[-1]
+
+            moved = cars[leaving]
+            self.owner[moved] = tile_of(self.fleet.x[moved], self.fleet.y[moved], self.axis, self.shape)
+            for tile in np.unique(self.owner[moved]):
+                handoffs[tile].append(moved[self.owner[moved] == tile])
+        self.handoffs = [np.concatenate(cars).astype(np.int64) if cars else np.zeros(0, dtype=np.int64)
+                         for cars in handoffs]
+        self.border, self.border_width = np.sort(np.concatenate(border)).astype(np.int64), width
+        return
+
+    def close(self):
+        """ Stops the worker processes """
+        for connection in self.connections or []:
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections, self.processes = None, []
+        return
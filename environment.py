@@ -1,4 +1,3 @@
-from animate import Animator
 from cars import Cars, TrafficLights
 import navigation as nav
 import numpy as np
@@ -9,7 +8,8 @@ import simulation as sim
 
 
 class Env:
-    def __init__(self, n, graph, agent, dt, animate=False):
+    def __init__(self, n, graph, agent, dt, animate=False, kinematics='point', max_level=0, workers=0,
+                 lights_engine='frame', jit=False):
         """
         initializes an environment for a car in the system
 
@@ -17,6 +17,15 @@ class Env:
         :param     graph:  OGraph object from
         :param     agent:       int: the ID of the car (agent)
         :param   animate:      bool: if the environment is to be animated while learning
+        :param kinematics:      str: 'point', or 'arc' for arc-length kinematics (with the 'array' engine of Cars),
+                                     which allow a much larger dt
+        :param  max_level:      int: finest sub-step level of multi-rate integration, with 'arc' kinematics
+                                     (0 integrates every car in one step of dt)
+        :param    workers:      int: number of map tiles simulated by their own worker processes, with 'arc' kinematics
+                                     (0 simulates every car in this process)
+        :param lights_engine:   str: engine of TrafficLights, 'frame' or 'event' (an integer clock and a switch queue)
+        :param        jit:     bool: update the cars with the Numba kernels of kernels, with the 'array' engine of
+                                     Cars (NumPy if Numba is not installed)
         """
         self.N = n
         self.num = None
@@ -26,15 +35,24 @@ class Env:
         self.dt = dt
         self.animate = animate
         self.animator = None
-        self.axis = self.ax.axis()
+        self.kinematics = kinematics
+        self.max_level = max_level
+        self.workers = workers
+        self.lights_engine = lights_engine
+        self.jit = jit
+        self.engine = 'array' if kinematics == 'arc' or jit else 'frame'
+        self.axis = self.graph.axis
         self.route_times = []
         self.car_init_method = sim.init_random_node_start_location
         # self.car_init_method = sim.init_culdesac_start_location
         self.light_init_method = sim.init_traffic_lights
         # self.car_init_method = convergent_learner.init_custom_agent
         # self.light_init_method = convergent_learner.init_custom_lights
-        self.cars_object = Cars(self.car_init_method(self.N, self.graph), self.graph)
-        self.lights_object = TrafficLights(self.light_init_method(self.graph, prescale=40), self.graph)
+        self.cars_object = Cars(self.car_init_method(self.N, self.graph), self.graph, engine=self.engine,
+                                kinematics=self.kinematics, max_level=self.max_level,
+                                workers=self.workers, jit=self.jit)
+        self.lights_object = TrafficLights(self.light_init_method(self.graph, prescale=40), self.graph,
+                                            engine=self.lights_engine)
         self.high = 10
         self.low = 2
         self.shortest_route_thresh = 5
@@ -48,13 +66,16 @@ class Env:
         """
         # initialize cars every reset
         init_cars = self.car_init_method(n=self.N, graph=self.graph)
-        self.cars_object = Cars(init_state=init_cars, graph=self.graph)
+        self.cars_object.close()
+        self.cars_object = Cars(init_state=init_cars, graph=self.graph, engine=self.engine, kinematics=self.kinematics,
+                                max_level=self.max_level, workers=self.workers, jit=self.jit)
         stateview = self.refresh_stateview()
         state = stateview.determine_state()[0]
         state = state.index(True)
 
         if self.animate:
-            # init animator
+            # init animator (Matplotlib is only imported when animating)
+            from animate import Animator
             self.num = num
             self.animator = Animator(fig=self.fig, ax=self.ax, cars_object=self.cars_object,
                                      lights_object=self.lights_object, num=self.num, focus=self.agent)
@@ -82,10 +103,14 @@ class Env:
         init_car_state = self.car_init_method(
             graph=self.graph, n=self.N, car_id=self.agent, alternate_route=alternate_route
         )
-        self.cars_object = Cars(init_state=init_car_state, graph=self.graph)
+        self.cars_object.close()
+        self.cars_object = Cars(init_state=init_car_state, graph=self.graph, engine=self.engine,
+                                kinematics=self.kinematics, max_level=self.max_level,
+                                workers=self.workers, jit=self.jit)
 
         if self.animate:
             # init animator
+            from animate import Animator
             self.animator = Animator(fig=self.fig, ax=self.ax, cars_object=self.cars_object,
                                      lights_object=self.lights_object, num=self.num)
 
@@ -151,6 +176,20 @@ class Env:
 
         return new_state, reward, done, debug_report
 
+    def end_of_route(self):
+        """
+        determines if the agent has reached the end of its route, as FrontView.end_of_route does; with the 'array'
+        engine it is read from the Fleet arrays, so that no DataFrame view of the cars is built every step
+
+        :return bool: True if the agent is within stop distance of its destination
+        """
+        fleet = self.cars_object.fleet
+        if fleet is None:
+            return nav.FrontView(self.cars_object.state.loc[self.agent], self.graph).end_of_route()
+        car = fleet.index.get_loc(self.agent)
+        position = np.array([fleet.x[car], fleet.y[car]])
+        return bool(np.isclose(0, fleet.destination[car] - position, atol=self.cars_object.stop_distance).all())
+
     def simulation_step(self, i):
         """
         make one step in the simulation and determine if the car has arrived at the destination
@@ -158,9 +197,7 @@ class Env:
         :param         i: simulation step
         :return  arrived: bool
         """
-        frontview = nav.FrontView(self.cars_object.state.loc[self.agent], self.graph)
-        end_of_route = frontview.end_of_route()
-        if not end_of_route:
+        if not self.end_of_route():
             if self.animate:
                 self.animator.animate(i)
             else:
@@ -0,0 +1,158 @@
+"""
+Struct-of-arrays storage of car state for the vectorized ('array') engine of Cars.
+
+Every per-car quantity which changes during a step (position, velocity, route progress, obstacle distances, bins)
+lives in a contiguous NumPy array indexed by the car's row position. A pandas DataFrame in the same layout as the
+'frame' engine is only built on request, through Fleet.frame().
+"""
+import navigation as nav
+import numpy as np
+from occupancy import EdgeOccupancy
+import pandas as pd
+from path_store import PathStore
+from route_lights import RouteLights
+
+
+class Fleet:
+    def __init__(self, init_state, graph):
+        """
+        unpacks an initial cars DataFrame into flat arrays
+
+        :param init_state: dataframe: each Series row is a car (as produced by the simulation init functions)
+        :param      graph:    object: OGraph object from osm_request
+        """
+        self.init_state = init_state
+        self.graph = graph
+        self.n = len(init_state)
+        self.index = init_state.index
+
+        # kinematics
+        self.x = init_state['x'].to_numpy(dtype=float).copy()
+        self.y = init_state['y'].to_numpy(dtype=float).copy()
+        self.vx = init_state['vx'].to_numpy(dtype=float).copy()
+        self.vy = init_state['vy'].to_numpy(dtype=float).copy()
+        self.route_time = init_state['route-time'].to_numpy(dtype=float).copy()
+        # distance travelled along the path, for arc-length kinematics (see move_along)
+        self.s = np.zeros(self.n)
+
+        # obstacle distances (0 means there is no obstacle, as in the 'frame' engine)
+        self.distance_to_node = np.zeros(self.n)
+        self.distance_to_car = np.zeros(self.n)
+        self.distance_to_red_light = np.zeros(self.n)
+
+        # bins
+        self.xbin = np.zeros(self.n, dtype=int)
+        self.ybin = np.zeros(self.n, dtype=int)
+
+        # route progress: every path lives in one shared buffer with a per-car cursor
+        self.paths = PathStore(init_state['xpath'], init_state['ypath'])
+        self.paths.assign_edges(init_state['route'], graph.compiled)
+
+        # cars sorted by directed edge and offset along it, for car-following
+        self.occupancy = EdgeOccupancy(self.n)
+
+        # lights along each route, indexed once the lights are known (see attach_lights)
+        self.route_lights = None
+
+        self.destination = np.array([nav.get_position_of_node(graph, node) for node in init_state['destination']],
+                                    dtype=float).reshape(self.n, 2)
+        self._frame = None
+        self.track_edges()
+
+    @property
+    def cursor(self):
+        """ The position, within its own path, of the point each car is piloting to """
+        return self.paths.cursor
+
+    def remaining(self, cars=None):
+        """
+        the number of path points left in each car's route
+
+        :param        cars: array of int: positions of the cars to consider (every car by default)
+        :return remaining: array of int
+        """
+        return self.paths.remaining(cars)
+
+    def upcoming(self, k=0, cars=None):
+        """
+        gathers the k-th upcoming path point of every car
+
+        :param        k: int: 0 is the point the car is currently piloting to
+        :param     cars: array of int: positions of the cars to consider (every car by default)
+        :return x, y, valid: arrays: coordinates (nan where the path is shorter than k + 1) and a validity mask
+        """
+        return self.paths.upcoming(k, cars)
+
+    def advance(self, mask, cars=None):
+        """
+        moves the cursor of the masked cars to the next point of their paths
+
+        :param mask: array of bool
+        :param cars: array of int: positions of the cars the mask refers to (every car by default)
+        """
+        self.paths.advance(mask, cars)
+        return
+
+    def move_along(self, distances, cars=None):
+        """
+        moves every car forward along its path by a distance, rolling over any number of path points exactly:
+        positions and cursors follow from the arc length travelled
+
+        :param distances: array: distance travelled by each car in this step
+        :param      cars: array of int: positions of the cars which move (every car by default)
+        """
+        cars = slice(None) if cars is None else cars
+        self.s[cars] += distances
+        x, y, self.paths.cursor[cars] = self.paths.locate(self.s[cars], cars)
+        # a car without a path stays where it is
+        self.x[cars], self.y[cars] = np.where(np.isnan(x), self.x[cars], x), np.where(np.isnan(y), self.y[cars], y)
+        return
+
+    def attach_lights(self, lights):
+        """
+        indexes the lights along every route, unless the same lights are already indexed
+
+        :param lights: dataframe: traffic lights state
+        """
+        if self.route_lights is None or not np.array_equal(self.route_lights.nodes, lights['node'].to_numpy()):
+            self.route_lights = RouteLights(self.paths, lights, self.graph.compiled)
+        return
+
+    def track_edges(self):
+        """ Re-locates every car on its directed edge and updates the occupancy index """
+        self.occupancy.update(*self.paths.edge_positions(self.x, self.y))
+        return
+
+    def invalidate(self):
+        """ Drops the cached DataFrame view after the arrays change """
+        self._frame = None
+        return
+
+    def frame(self):
+        """
+        builds (and caches until the next step) a DataFrame view of the fleet in the layout of the 'frame' engine
+
+        :return state: dataframe
+        """
+        if self._frame is not None:
+            return self._frame
+
+        state = self.init_state.copy()
+        xpaths, ypaths = [], []
+        for i in range(self.n):
+            remaining = self.paths.remaining_path(i)
+            xpaths.append(remaining[:, 0].tolist())
+            ypaths.append(remaining[:, 1].tolist())
+
+        state['x'], state['y'] = self.x, self.y
+        state['vx'], state['vy'] = self.vx, self.vy
+        state['route-time'] = self.route_time
+        state['xpath'] = pd.Series(xpaths, index=self.index, dtype='object')
+        state['ypath'] = pd.Series(ypaths, index=self.index, dtype='object')
+        state['distance-to-node'] = self.distance_to_node
+        state['distance-to-car'] = self.distance_to_car
+        state['distance-to-red-light'] = self.distance_to_red_light
+        state['xbin'], state['ybin'] = self.xbin, self.ybin
+
+        self._frame = state
+        return state
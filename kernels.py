@@ -0,0 +1,136 @@
+"""
+Optional Numba-compiled kernels for the per-car speed and position update of the 'array' engine of Cars.
+
+Each kernel is a single loop over the cars which fuses the vectorized functions of simulation (update_speed_factors,
+road_curvature_factors, obstacle_factors, models.weigh_factors and should_accelerate, then travel_distances) into
+one pass with scalar branches, instead of a dozen temporary arrays per step.
+
+Numba is optional. When it is not installed, available is False and simulation keeps to its NumPy functions; the
+kernels below are then plain Python functions, only fit for checking against them.
+
+The kernels agree with the NumPy path to within TOLERANCE (relative): both evaluate the same expressions in the same
+order, and only the last bit of a log, cos or sin may differ.
+"""
+import math
+import numpy as np
+
+try:
+    from numba import njit
+    available = True
+except ImportError:
+    available = False
+
+    def njit(*args, **kwargs):
+        """ Without Numba, the kernels are left uncompiled """
+        return lambda function: function
+
+TOLERANCE = 1.0e-9
+
+
+@njit(cache=True)
+def obstacle_factor(d, stop_distance, free_distance):
+    """
+    scalar obstacle factor, as in simulation.obstacle_factors
+
+    :param             d: double: distance to the obstacle
+    :return       factor: double
+    """
+    if d <= stop_distance:
+        return 0.0
+    if d <= free_distance:
+        return math.log(d / stop_distance) / math.log(free_distance / stop_distance)
+    return 1.0
+
+
+@njit(cache=True)
+def curvature_factor(theta, d, stop_distance, free_distance):
+    """
+    scalar road curvature factor, as in simulation.road_curvature_factors
+
+    :param  theta: double: angle of road curvature ahead (pi / 2 for the last node of a path)
+    :param      d: double: distance to the next node
+    :return factor: double
+    """
+    # same tolerance as np.isclose(theta, 0, rtol=1.0e-1)
+    if stop_distance < d <= free_distance and not abs(theta) <= 1.0e-8:
+        scale = stop_distance * 2 * theta / math.pi
+        return math.log(d / scale) / math.log(free_distance / scale)
+    return 1.0
+
+
+@njit(cache=True)
+def fleet_velocities(x, y, next_x, next_y, distance_to_node, distance_to_car, distance_to_red_light, angles,
+                     remaining, speed_limit, stop_distance, free_distance, default_acceleration):
+    """
+    the velocity of every car, as computed by simulation.update_fleet
+
+    Parameters
+    __________
+    :param                 x, y: arrays: car positions
+    :param       next_x, next_y: arrays: position of the node each car pilots to (see navigation.fleet_view)
+    :param     distance_to_node: array
+    :param      distance_to_car: array: 0 where there is no car obstacle
+    :param distance_to_red_light: array: 0 where there is no red light
+    :param               angles: array: next angle of road curvature for each car
+    :param            remaining: array of int: path points left in each car's route
+    :param  speed_limit, stop_distance, free_distance, default_acceleration: double: constants of simulation
+
+    Returns
+    _______
+    :return vx, vy: arrays (0 for the cars at the end of their routes)
+    """
+    n = len(x)
+    vx, vy = np.zeros(n), np.zeros(n)
+    for i in range(n):
+        if remaining[i] <= 0:
+            continue
+        d_node, d_car, d_light = distance_to_node[i], distance_to_car[i], distance_to_red_light[i]
+
+        theta = math.pi / 2 if remaining[i] == 1 else angles[i]
+        curvature = curvature_factor(theta, d_node, stop_distance, free_distance)
+        if d_car != 0 and d_light != 0:
+            factor = obstacle_factor(d_car if d_car <= d_light else d_light, stop_distance, free_distance)
+        elif d_car != 0:
+            factor = obstacle_factor(d_car, stop_distance, free_distance)
+            if d_car > d_node:
+                factor = factor * math.cos(d_car / free_distance) + curvature * math.sin(d_node / free_distance)
+        elif d_light != 0:
+            factor = obstacle_factor(d_light, stop_distance, free_distance)
+        else:
+            factor = curvature
+        factor = abs(factor)
+
+        dx, dy = next_x[i] - x[i], next_y[i] - y[i]
+        norm = math.hypot(dx, dy)
+        if norm > 0:
+            vx[i], vy[i] = dx / norm * speed_limit * factor, dy / norm * speed_limit * factor
+
+        # if the car has stalled and should accelerate, then give it a push (tolerances of np.isclose(0, v, atol=0.1))
+        stalled = abs(vx[i]) <= 0.1 + 1.0e-5 * abs(vx[i]) and abs(vy[i]) <= 0.1 + 1.0e-5 * abs(vy[i])
+        if stalled and d_light == 0 and (d_car == 0 or d_car > stop_distance):
+            vx[i] += default_acceleration
+            vy[i] += default_acceleration
+    return vx, vy
+
+
+@njit(cache=True)
+def travel_distances(vx, vy, dt, distance_to_car, distance_to_red_light, stop_distance):
+    """
+    the distance each car travels along its path in a step, as in simulation.travel_distances
+
+    :param                vx, vy: arrays: car velocities
+    :param                    dt: array: time step of each car
+    :param       distance_to_car: array: 0 where there is no car obstacle
+    :param distance_to_red_light: array: 0 where there is no red light
+    :param         stop_distance: double
+    :return            distances: array
+    """
+    n = len(vx)
+    distances = np.empty(n)
+    for i in range(n):
+        distance = math.hypot(vx[i], vy[i]) * dt[i]
+        for obstacle in (distance_to_car[i], distance_to_red_light[i]):
+            if obstacle > 0:
+                distance = min(distance, max(obstacle - stop_distance, 0.0))
+        distances[i] = distance
+    return distances
@@ -1,7 +1,6 @@
 import argparse
 from environment import Env
 from keras import Sequential, layers
-import matplotlib.pyplot as plt
 import numpy as np
 from osm_request import OGraph
 
@@ -14,6 +13,11 @@ parser.add_argument('-dt', type=float, default=1/1000)
 parser.add_argument('-x', '--agent', type=int, default=17)
 parser.add_argument('-e', '--episodes', type=int, default=40)
 parser.add_argument('-a', '--animate', action='store_true')
+parser.add_argument('-k', '--kinematics', type=str, choices=['point', 'arc'], default='point')
+parser.add_argument('-m', '--max-level', type=int, default=0)
+parser.add_argument('-w', '--workers', type=int, default=0)
+parser.add_argument('--lights-engine', type=str, choices=['frame', 'event'], default='frame')
+parser.add_argument('-j', '--jit', action='store_true')
 
 
 def main(
@@ -22,7 +26,12 @@ def main(
         dt=1/1000,
         agent=17,
         num_episodes=40,
-        animate=False
+        animate=False,
+        kinematics='point',
+        max_level=0,
+        workers=0,
+        lights_engine='frame',
+        jit=False
 ):
     """
 
@@ -32,13 +41,20 @@ def main(
     :param agent: int: the number of the car that will be the learning agent (must be less than cars)
     :param num_episodes: int: the number of episodes to run
     :param animate: bool: whether to animate the simulation
+    :param kinematics: str: 'point', or 'arc' to move cars by arc length along their paths (allows dt of 0.1 s and more)
+    :param max_level: int: with 'arc' kinematics, cars near a car, light or bend move in up to 2 ** max_level sub-steps
+    :param workers: int: with 'arc' kinematics, split the map into tiles simulated by this many worker processes
+    :param lights_engine: str: 'frame', or 'event' to switch the lights from a queue on an integer clock
+    :param jit: bool: update the cars with the Numba kernels of kernels, if Numba is installed (pipenv category 'jit')
     :return:
     """
 
-    graph = OGraph(location, save=True)
+    # without animation there is no figure to build, so the graph is loaded headless
+    graph = OGraph(location, save=True, headless=not animate)
 
     # initialize the environment for the learning agent
-    env = Env(n=cars, graph=graph, agent=agent, dt=dt, animate=animate)
+    env = Env(n=cars, graph=graph, agent=agent, dt=dt, animate=animate, kinematics=kinematics,
+              max_level=max_level, workers=workers, lights_engine=lights_engine, jit=jit)
 
     # initialize the Keras training model
     model = Sequential()
@@ -89,6 +105,7 @@ def main(
 
     file.close()
 
+    import matplotlib.pyplot as plt
     plt.plot(np.arange(num_episodes), r_sum_list)
     plt.xlabel('Game number')
     plt.ylabel('Average reward per game')
@@ -108,5 +125,10 @@ if __name__ == '__main__':
         dt=args.dt,
         agent=args.agent,
         num_episodes=args.episodes,
-        animate=args.animate
+        animate=args.animate,
+        kinematics=args.kinematics,
+        max_level=args.max_level,
+        workers=args.workers,
+        lights_engine=args.lights_engine,
+        jit=args.jit
     )
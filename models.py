@@ -61,7 +61,7 @@ def weigh_factors(car_factor, curvature_factor, distance_to_car, distance_to_nod
     # superimpose the two distances on a unit circle such that the closest one has the most weight
     distance_diff = abs(distance_to_node - distance_to_car)
 
-    factor = car_factor * math.cos(distance_to_car / free_distance) + curvature_factor * math.sin(distance_to_node / free_distance)
+    factor = car_factor * np.cos(distance_to_car / free_distance) + curvature_factor * np.sin(distance_to_node / free_distance)
 
     return factor
 
@@ -76,6 +76,12 @@ def unit_vector(vector):
     return vector / np.linalg.norm(vector)
 
 
+def unit_vectors(vectors):
+    """ Returns the unit vectors of the rows of an (n, 2) array; zero-length rows stay zero """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors, dtype=float), where=norms > 0)
+
+
 def angle_between(v1, v2):
     """ Returns the angle in radians between vectors 'v1' and 'v2'"""
     v1_u = unit_vector(v1)
@@ -87,6 +93,41 @@ def angle_between(v1, v2):
     return angle
 
 
+def angles_between(v1, v2):
+    """
+    vectorized angle_between for rows of two (n, 2) arrays of vectors; zero-length vectors yield an angle of 0
+
+    :param      v1: array: (n, 2)
+    :param      v2: array: (n, 2)
+    :return angles: array: (n,) angles in radians normalized to pi/2 as in angle_between
+    """
+    norms = np.linalg.norm(v1, axis=1) * np.linalg.norm(v2, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine = np.einsum('ij,ij->i', v1, v2) / norms
+    angles = np.where(norms > 0, np.arccos(np.clip(np.nan_to_num(cosine), -1.0, 1.0)), 0.0)
+    return np.where(angles > math.pi / 2, angles - math.pi / 2, angles)
+
+
+def exponential_integral(y):
+    """
+    the exponential integral Ei of positive arguments, from its power series Ei(y) = gamma + ln y + sum y^n / (n n!)
+
+    :param  y: array: positive arguments (Ei(0) is -inf)
+    :return ei: array
+    """
+    y = np.asarray(y, dtype=float)
+    total, term, n = np.zeros_like(y), np.ones_like(y), 1
+    while True:
+        term = term * y / n
+        total += term / n
+        # every term is positive, so the sum has converged once the terms are below its resolution
+        if np.all(term / n <= 1.0e-17 * total):
+            break
+        n += 1
+    with np.errstate(divide='ignore'):
+        return np.euler_gamma + np.log(y) + total
+
+
 def determine_anti_parallel_vectors(v1, v2):
     """ Returns True if two vectors are close to parallel """
     v1, v2 = unit_vector(v1), unit_vector(v2)
@@ -97,6 +138,54 @@ def determine_anti_parallel_vectors(v1, v2):
         return False
 
 
+def anti_parallel_mask(v1, v2):
+    """
+    vectorized determine_anti_parallel_vectors for rows of two (n, 2) arrays of vectors
+
+    :param    v1: array: (n, 2)
+    :param    v2: array: (n, 2)
+    :return mask: array: (n,) of bool
+    """
+    norms = np.linalg.norm(v1, axis=1) * np.linalg.norm(v2, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine = np.einsum('ij,ij->i', v1, v2) / norms
+    angles = np.arccos(np.clip(cosine, -1.0, 1.0))
+    return (norms > 0) & np.isclose(math.pi, angles, atol=0.1)
+
+
+def segment_projection(px, py, ax, ay, bx, by):
+    """
+    projects points p onto the segments running from a to b; every argument may be a scalar or an array,
+    so one call handles a single car or the whole fleet
+
+    :param  px, py: double or array: points to project (e.g. obstacle positions)
+    :param  ax, ay: double or array: segment starts (e.g. car positions)
+    :param  bx, by: double or array: segment ends (e.g. upcoming node positions)
+    :return along, lateral, length: double or array:
+        distance from a to the projection of p along the segment, distance from p to the line through the segment,
+        and the length of the segment
+    """
+    dx, dy = bx - ax, by - ay
+    length = np.hypot(dx, dy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        along = np.where(length > 0, ((px - ax) * dx + (py - ay) * dy) / length, 0.0)
+        lateral = np.where(length > 0, np.abs((px - ax) * dy - (py - ay) * dx) / length, np.hypot(px - ax, py - ay))
+    return along, lateral, length
+
+
+def on_segment(along, lateral, length, width=1.0):
+    """
+    decides from a segment_projection whether points lie on the segment ahead of its start
+
+    :param   along: double or array
+    :param lateral: double or array
+    :param  length: double or array
+    :param   width: double: largest distance from the segment at which a point still counts as on it
+    :return   mask: bool or array of bool
+    """
+    return (along > 0) & (along <= length + width) & (lateral <= width)
+
+
 def clean_list(alist):
     """
     Simply removes duplicates from a list
@@ -113,28 +202,18 @@ def clean_list(alist):
     return clean
 
 
-def path_decompiler(lines):
+def remove_twin_points(points):
     """
-    Decompiles a path from its geometry configuration into a pure list of tuples
+    removes twin points from a path: points which overlap the point after them (two nodes laying on top of each other
+    on the same point). OpenStreetMap has this issue, and the car dynamics need every path segment to have a length
 
-    :param  lines:      list in geometric form according to osmnx 'geometry' feature
-    :return new_path:   list of tuples
+    :param  points: array: (m, 2) path points
+    :return  clean: array: (k, 2) path points, k <= m
     """
-    path = []
-    for line in lines:
-        for point in line:
-            path.append(point)
-
-    # the path must be cleaned of twin nodes for car dynamics
-    # these are nodes which overlap (two nodes laying on top of each other on the same point)
-    # OpenStreetMap has this issue
-    clean_path = [] if len(path) else path
-    if len(path):
-        for i in range(len(path)):
-            if (i < len(path) - 1) and (path[i] != path[i + 1]):
-                clean_path.append(path[i])
-        clean_path.append(path[-1])
-    return clean_path
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    keep = np.ones(len(points), dtype=bool)
+    keep[:-1] = (points[:-1] != points[1:]).any(axis=1)
+    return points[keep]
 
 
 def new_route_decompiler(new_path):
@@ -144,33 +223,10 @@ def new_route_decompiler(new_path):
     :param      new_path:
     :return:  clean_path:
     """
-    clean_path = []
-    for i in range(len(new_path)):
-        if (i < len(new_path) - 1) and (new_path[i] != new_path[i + 1]):
-            clean_path.append(new_path[i])
-    clean_path.append(new_path[-1])
+    clean_path = list(map(tuple, remove_twin_points(new_path).tolist()))
     return clean_path
 
 
-def upcoming_linspace(frontview):
-    """
-    this function returns a 2D linspace between the next two nodes in the view
-
-    :param     frontview: object: FrontView object
-    :return        space:  tuple: of np.arrays
-    """
-    # TODO: don't make linspace so large. nx and ny should not be so large. it's unnecessary
-    next_node = frontview.upcoming_node_position()
-
-    x_distance_between = abs(next_node[0] - frontview.car['x'])
-    y_distance_between = abs(next_node[1] - frontview.car['y'])
-
-    nx, ny = int(x_distance_between), int(y_distance_between)
-    x = np.linspace(frontview.car['x'], next_node[0], nx)
-    y = np.linspace(frontview.car['y'], next_node[1], ny)
-    return x, y
-
-
 def upcoming_vectors(view):
     """
     determines the vectors between the nodes in a view
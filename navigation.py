@@ -7,7 +7,6 @@ and calculating the curvature of the bend in the road for speed adjustments
 import models
 import networkx as nx
 import numpy as np
-import osmnx as ox
 
 
 class FrontView:
@@ -34,21 +33,21 @@ class FrontView:
 
         :return view: list or bool: list of nodes immediately ahead of the car or False if end of route
         """
-        xpath, ypath = np.array(self.car['xpath']), np.array(self.car['ypath'])
-        if xpath.any() and ypath.any():
+        if len(self.car['xpath']) and len(self.car['ypath']):
             x, y = self.car['xpath'][:self.look_ahead_nodes], self.car['ypath'][:self.look_ahead_nodes]
             return [(x[i], y[i]) for i in range(len(x))]
         else:
             return False
 
-    def distance_to_car(self, cars):
+    def distance_to_car(self, cars, bins=None):
         """
         dispatches a car Series into another nav function and retrieves the distance to a car obstacle if there is one
 
         :param      cars: Dataframe of cars
+        :param      bins: SpatialBins object from binning (optional): the bin members of the cars
         :return distance:
         """
-        return car_obstacles(self, cars)
+        return car_obstacles(self, cars, bins)
 
     def distance_to_light(self, lights):
         """
@@ -145,7 +144,7 @@ class StateView:
         self.index = car_index
         self.car = cars.loc[self.index]
         self.route = np.array(self.car['route'])
-        self.eta = eta(self.graph.G, self.car, self.lights)
+        self.eta = eta(self.graph, self.car, self.lights)
         self.max_cars = 10  # the number of cars in a bin for the bin to be considered 'congested traffic'
         self.speed_limit = 1000
 
@@ -212,14 +211,10 @@ class StateView:
         Calculate the length of the detour and the length of
          the stretch of the original route which was avoided by the detour:
         """
-        detour_length = sum([self.graph.G.get_edge_data(detour[i], detour[i + 1])[0]['length']
-                             for i in range(len(detour) - 1)])
+        detour_length = self.graph.compiled.route_length(detour)
         departure_ind = np.where(self.route == detour[0])[0][0]
         return_ind = np.where(self.route == detour[-1])[0][0]
-        span = return_ind - departure_ind
-        original_length = sum([self.graph.get_edge_data(self.route[departure_ind + i],
-                                                        self.route[departure_ind + i + 1])[0]['length']
-                               for i in range(span + 1)])
+        original_length = self.graph.compiled.route_length(self.route[departure_ind:return_ind + 2])
         if detour_length <= 2 * original_length:
             # detour is short
             obstacles_in_detour = np.array([self.get_lights_in_route(route=detour),
@@ -360,13 +355,8 @@ class StateView:
         if not route:
             route = self.route
         xbins, ybins = np.arange(self.axis[0], self.axis[1], 200), np.arange(self.axis[2], self.axis[3], 200)
-        x_inds, y_inds = [], []
-        for node in route:
-            x, y = get_position_of_node(self.graph, node)
-            x_inds.append(np.digitize(x, xbins))
-            y_inds.append(np.digitize(y, ybins))
-
-        x_inds, y_inds = np.array(x_inds), np.array(y_inds)
+        positions = self.graph.compiled.positions_of(route)
+        x_inds, y_inds = np.digitize(positions[:, 0], xbins), np.digitize(positions[:, 1], ybins)
 
         # remove double-counted bins from result
         xbins, ybins = [], []
@@ -392,68 +382,61 @@ class StateView:
         :param      node:
         :return dv_table:
         """
-        possible_directions = np.array([dot for dot in self.graph.G[node].__iter__()])
-        nodes_already_in_route = [np.where(route_node == possible_directions)[0][0] for route_node in self.route
-                                  if np.where(route_node == possible_directions)[0].size > 0]
-        possible_directions = np.delete(possible_directions, nodes_already_in_route)
+        compiled = self.graph.compiled
+        possible_directions = compiled.successors(compiled.index_of(node))
+        route_indices = compiled.indices_of(self.route)
+
+        # avoid culdesacs and nodes already in the route
+        has_out_edges = np.diff(compiled.indptr)[possible_directions] > 0
+        possible_directions = possible_directions[has_out_edges & ~np.isin(possible_directions, route_indices)]
 
         reroute_node_index = np.where(node == self.route)[0][0]
-        sum_three_node_dist = []
-        directions = []
-        for direction in possible_directions:
-            twice_out = np.array([dot for dot in self.graph.G[direction].__iter__()])
-            if twice_out.size == 0 or (direction == self.route).any():
-                # avoid culdesacs and nodes already in the route
-                continue
+        compare_positions = compiled.positions[route_indices[reroute_node_index + 2:reroute_node_index + 5]]
+        potential_positions = compiled.positions[possible_directions]
+        distances = np.linalg.norm(potential_positions[:, None, :] - compare_positions[None, :, :], axis=2)
 
-            directions.append(direction)
-            distances = []
-            for compare_node in self.route[reroute_node_index + 2:reroute_node_index + 5]:
-                compare_node_pos = get_position_of_node(self.graph, compare_node)
-                potential_node_pos = get_position_of_node(self.graph, direction)
-                distances.append(np.linalg.norm(compare_node_pos - potential_node_pos))
-            sum_three_node_dist.append(sum(distances))
+        directions = compiled.node_ids[possible_directions].tolist()
+        sum_three_node_dist = distances.sum(axis=1).tolist()
 
         dv_table = models.make_table({'potential-nodes': directions, 'sum-distances': sum_three_node_dist})
         return dv_table
 
 
-# TODO: optimize this function
-def car_obstacles(frontview, cars):
+def car_obstacles(frontview, cars, bins=None):
     """
-    Determines if there are any other_cars within the car's bin and then calculates the distance to the
-    nearest car in the same bin
+    Determines if there are any other_cars within the car's bin which lie on the segment between the car and
+    its upcoming node, and then calculates the distance to the nearest one
 
     Parameters
     __________
     :param frontview:    object: FrontView object
     :param      cars: dataframe:
+    :param      bins:    object: SpatialBins object from binning (optional); if given, the other cars in the bin
+                                 are read from its member sets instead of scanning every car
 
     Returns
     _______
     :return distance: list: double or False (returns False if no car obstacle found)
     """
-    x_space, y_space = models.upcoming_linspace(frontview)
-    if x_space.any() and y_space.any():
+    if bins is not None:
+        position = cars.index.get_loc(frontview.car.name)
+        nearby = sorted(bins.neighbours(bins.xbin[position], bins.ybin[position]) - {position})
+        nearby_cars = cars.iloc[nearby]
+    else:
         other_cars = cars.drop(frontview.car.name)
         obstacles = (frontview.car['xbin'] == other_cars['xbin']) & (frontview.car['ybin'] == other_cars['ybin'])
-        if obstacles.any():
-            nearby_cars = other_cars[obstacles]
-            for car in nearby_cars.iterrows():
-                car_within_xlinspace = np.isclose(x_space, car[1]['x'], rtol=1.0e-6).any()
-                car_within_ylinspace = np.isclose(y_space, car[1]['y'], rtol=1.0e-6).any()
-
-                if car_within_xlinspace and car_within_ylinspace:
-                    first_x, first_y = car[1]['x'], car[1]['y']
-                    vector = (first_x - frontview.car['x'], first_y - frontview.car['y'])
-                    distance = models.magnitude(vector)
-                    return distance
-                else:
-                    return False
-        else:
-            return False
-    else:
-        return False
+        nearby_cars = other_cars[obstacles]
+
+    if len(nearby_cars):
+        next_x, next_y = frontview.upcoming_node_position()
+        along, lateral, length = models.segment_projection(
+            nearby_cars['x'].to_numpy(dtype=float), nearby_cars['y'].to_numpy(dtype=float),
+            frontview.car['x'], frontview.car['y'], next_x, next_y
+        )
+        ahead = models.on_segment(along, lateral, length)
+        if ahead.any():
+            return np.hypot(along[ahead], lateral[ahead]).min()
+    return False
 
 
 def light_obstacles(frontview, lights):
@@ -469,33 +452,123 @@ def light_obstacles(frontview, lights):
     _______
     :return distance: list: double for False (returns False if no red light is found)
     """
-    x_space, y_space = models.upcoming_linspace(frontview)
-    if x_space.any() and y_space.any():
-        obstacles = (frontview.car['xbin'] == lights['xbin']) & (frontview.car['ybin'] == lights['ybin'])
-        if obstacles.any():
-            nearby_lights = lights[obstacles]
-            for light in nearby_lights.iterrows():
-                light_within_xlinspace = np.isclose(x_space[1:], light[1]['x'], rtol=1.0e-6).any()
-                light_within_ylinspace = np.isclose(y_space[1:], light[1]['y'], rtol=1.0e-6).any()
-
-                if light_within_xlinspace and light_within_ylinspace:
-                    car_vector = [light[1]['x'] - frontview.car['x'], light[1]['y'] - frontview.car['y']]
-                    face_values = light[1]['go-values']
-                    face_vectors = [(light[1]['out-xvectors'][i], light[1]['out-yvectors'][i])
-                                    for i in range(light[1]['degree'])]
-
-                    for value, vector in zip(face_values, face_vectors):
-                        if not value and models.determine_anti_parallel_vectors(car_vector, vector):
-                            distance = models.magnitude(car_vector)
-                            return distance
-                        else:
-                            continue
-                else:
-                    return False
+    # every light is projected on the segment to the next node: a light on it may lie in another bin than the car
+    if len(lights):
+        next_x, next_y = frontview.upcoming_node_position()
+        along, lateral, length = models.segment_projection(
+            lights['x'].to_numpy(dtype=float), lights['y'].to_numpy(dtype=float),
+            frontview.car['x'], frontview.car['y'], next_x, next_y
+        )
+        ahead = models.on_segment(along, lateral, length)
+
+        # inspect the lights on the segment from nearest to furthest
+        for i in np.flatnonzero(ahead)[np.argsort(along[ahead])]:
+            light = lights.iloc[i]
+            car_vector = [light['x'] - frontview.car['x'], light['y'] - frontview.car['y']]
+            face_vectors = [(light['out-xvectors'][j], light['out-yvectors'][j]) for j in range(light['degree'])]
+
+            for value, vector in zip(light['go-values'], face_vectors):
+                if not value and models.determine_anti_parallel_vectors(car_vector, vector):
+                    return models.magnitude(car_vector)
+    return False
+
+
+def fleet_view(fleet, cars=None, exact=False):
+    """
+    the vectorized counterpart of FrontView: determines the frontal view of every car in a Fleet at once
+
+    :param  fleet: object: Fleet object from fleet
+    :param   cars: array of int: positions of the cars to view (every car by default)
+    :param  exact:   bool: a car only crosses a path point it is exactly on, for arc-length kinematics, whose cursors
+                           move past the points a car reaches (see Fleet.move_along). Otherwise, within the proximity
+                           tolerance of FrontView.crossed_node_event
+    :return crossed, next_x, next_y, angles: arrays:
+        whether each car is crossing its next path point, the position of the node it should pilot to,
+        and the next angle of road curvature (0 where fewer than three path points are in view)
+    """
+    x0, y0, valid = fleet.upcoming(0, cars)
+    x1, y1, has_second = fleet.upcoming(1, cars)
+    x2, y2, has_third = fleet.upcoming(2, cars)
+
+    # same L1-norm proximity tolerance as FrontView.crossed_node_event
+    cars = slice(None) if cars is None else cars
+    tolerance = 0 if exact else 1.0e-5
+    crossed = valid & np.isclose(x0, fleet.x[cars], rtol=tolerance) & np.isclose(y0, fleet.y[cars], rtol=tolerance)
+
+    xdest, ydest = fleet.destination[cars, 0], fleet.destination[cars, 1]
+    next_x = np.where(crossed, np.where(has_second, x1, xdest), np.where(valid, x0, xdest))
+    next_y = np.where(crossed, np.where(has_second, y1, ydest), np.where(valid, y0, ydest))
+
+    first = np.column_stack((x1 - x0, y1 - y0))
+    second = np.column_stack((x2 - x1, y2 - y1))
+    angles = np.where(has_third, models.angles_between(np.nan_to_num(first), np.nan_to_num(second)), 0.0)
+    return crossed, next_x, next_y, angles
+
+
+def fleet_obstacles(fleet, view, lights, look_ahead=200, past_node=True):
+    """
+    the vectorized counterpart of FrontView.distance_to_node, car_obstacles and light_obstacles for a Fleet
+
+    The car obstacle of every car is its leader in the fleet's edge occupancy index: the next car on the same
+    directed edge, or the rearmost car on the next edge of its route. The red light of every car is the next light
+    on its route, from the fleet's route light index, when the face governing its approach is red.
+
+    Parameters
+    __________
+    :param      fleet:    object: Fleet object from fleet
+    :param       view:     tuple: output of fleet_view
+    :param     lights: dataframe: traffic lights state
+    :param look_ahead:    double: obstacles further along the road than this are ignored
+    :param  past_node:      bool: report red lights up to look_ahead along the path, past the node each car pilots
+                                  to, for arc-length kinematics, which may cross it within a step. Otherwise, as
+                                  light_obstacles, only the red lights on the segment to that node (see
+                                  RouteLights.segment_red_light_distances)
+
+    Returns
+    _______
+    :return node_distances, car_distances, light_distances: arrays (0 where there is no obstacle)
+    """
+    crossed, next_x, next_y, angles = view
+    node_distances = np.hypot(next_x - fleet.x, next_y - fleet.y)
+
+    # cars
+    _, car_distances = fleet.occupancy.leaders(look_ahead)
+
+    # lights
+    light_distances = np.zeros(fleet.n)
+    if len(lights):
+        fleet.attach_lights(lights)
+        go = np.concatenate(lights['go-values'].to_numpy()).astype(bool)
+        if past_node:
+            light_distances = fleet.route_lights.red_light_distances(fleet.paths, fleet.x, fleet.y, go, look_ahead)
         else:
-            return False
-    else:
-        return False
+            light_distances = fleet.route_lights.segment_red_light_distances(fleet.paths, fleet.x, fleet.y,
+                                                                             next_x, next_y, go)
+
+    car_distances[np.isinf(car_distances)] = 0
+    return node_distances, car_distances, light_distances
+
+
+def fleet_events(fleet, lights, look_ahead=200):
+    """
+    the distance from every car of a Fleet to its nearest event, for multi-rate integration: the car ahead, the next
+    light on its route (whatever its colour) or the next bend of the road. Needs arc-length kinematics
+
+    :param      fleet:    object: Fleet object from fleet, after fleet_obstacles
+    :param     lights: dataframe: traffic lights state
+    :param look_ahead:    double: cars and lights further along the road than this are ignored
+    :return distances:     array (inf where there is no event, or the car has reached its destination)
+    """
+    distances = np.where(fleet.distance_to_car > 0, fleet.distance_to_car, np.inf)
+    if len(lights):
+        fleet.attach_lights(lights)
+        # with every face red, the distance to a red light is the distance to the next light
+        red = np.zeros(len(np.concatenate(lights['go-values'].to_numpy())), dtype=bool)
+        light_distances = fleet.route_lights.red_light_distances(fleet.paths, fleet.x, fleet.y, red, look_ahead)
+        distances = np.minimum(distances, np.where(light_distances > 0, light_distances, np.inf))
+
+    distances = np.minimum(distances, fleet.paths.distance_to_bend(fleet.s))
+    return np.where(fleet.remaining() > 0, distances, np.inf)
 
 
 def determine_pedigree(graph, node_id):
@@ -506,19 +579,31 @@ def determine_pedigree(graph, node_id):
      :param  node_id:    int
      :return vectors:   list: list of vectors pointing from the intersection to the nearest point on the out roads
      """
-    x, y = get_position_of_node(graph, node_id)
+    _, vectors = light_faces(graph, [node_id])
+    return list(map(tuple, vectors.tolist()))
 
-    out_nodes = [dot for dot in graph.G[node_id].__iter__()]
 
-    vectors = []
-    for node in out_nodes:
-        try:
-            out_x, out_y = lines_to_node(graph, node_id, node)[0][1]
-        except IndexError:
-            continue
-        vectors.append((out_x - x, out_y - y))
+def light_faces(graph, nodes):
+    """
+    the face vectors of many traffic lights at once, read directly off the first segment of every out edge's geometry
+    (self-loops have no face), in the order of the out roads of each light in graph.G
+
+    :param    graph: object: OGraph object from osm_request
+    :param    nodes:   list: node IDs of the lights
+    :return degrees, vectors: arrays: the number of faces of each light, and the (sum(degrees), 2) face vectors,
+                              those of nodes[i] being vectors[sum(degrees[:i]):sum(degrees[:i + 1])]
+    """
+    compiled = graph.compiled
+    index = compiled.indices_of(nodes)
 
-    return vectors
+    # the out roads of every light in the order graph.G lists them, which sets which faces start on go
+    targets = [[compiled.node_index[node] for node in graph.G[light] if node != light] for light in nodes]
+    degrees = np.array([len(out) for out in targets], dtype=np.int64)
+    owner = np.repeat(np.arange(len(index)), degrees)
+    edges = compiled.edge_ids(index[owner], np.array([node for out in targets for node in out], dtype=np.int64))
+
+    vectors = compiled.geometry[compiled.geometry_offsets[edges] + 1] - compiled.positions[index[owner]]
+    return degrees, vectors
 
 
 def find_culdesacs(graph):
@@ -528,6 +613,7 @@ def find_culdesacs(graph):
     :param graph: object: OGraph object from osm_request
     :return culdesacs: list of node IDs
     """
+    import osmnx as ox
     streets_per_node = ox.stats.count_streets_per_node(graph.G)
     culdesacs = [key for key, value in streets_per_node.items() if int(value) == 1]
     return culdesacs
@@ -574,7 +660,7 @@ def get_position_of_node(graph, node):
     # note that the x and y coordinates of the graph.nodes are flipped
     # this is possibly an issue with the omnx graph.load_graphml method
     # a correction is to make the position tuple be (y, x) as below
-    position = np.array([graph.G.nodes[node]['x'], graph.G.nodes[node]['y']])
+    position = graph.compiled.position(node)
     return position
 
 
@@ -592,8 +678,20 @@ def get_init_path(graph, origin, destination):
     _______
     :return path: list where each entry is a tuple of tuples
     """
-    lines = shortest_path_lines_nx(graph, origin, destination)
-    path = models.path_decompiler(lines)
+    route = get_route(graph, origin, destination)
+    path = get_path_along_route(graph, route)
+    return path
+
+
+def get_path_along_route(graph, route):
+    """
+    compiles the list of tuples which represents a route which is already known, without searching for it again
+
+    :param graph: object: OGraph object from osm_request
+    :param route:   list: node IDs
+    :return path:   list: as in get_init_path
+    """
+    path = models.new_route_decompiler(graph.compiled.route_polyline(route))
     return path
 
 
@@ -606,6 +704,10 @@ def get_route(graph, origin, destination):
     :param destination: node ID
     :return:     route: list of intersection nodes
     """
+    routes = getattr(graph, 'routes', None)
+    if routes is not None:
+        # graph-fingerprinted route cache from osm_request
+        return routes.route(graph.G, origin, destination, weight='length')
     return nx.shortest_path(graph.G, origin, destination, weight='length')
 
 
@@ -613,7 +715,7 @@ def eta(graph, car, lights, speed_limit=250):
     """
     calculates the ETA by considering traffic lights, car traffic (in future versions), and distances
 
-    :param:         graph: G graph object from OSMx (i.e. OGraph.G object)
+    :param:         graph: object: OGraph object from osm_request
     :param:           car: Series
     :param:        lights: DataFrame
     :param:   speed_limit: int
@@ -622,14 +724,13 @@ def eta(graph, car, lights, speed_limit=250):
     route = np.array(car['route'])
 
     if route.size > 0:
-        route_length = sum([graph.get_edge_data(route[i], route[i + 1])[0]['length'] for i in range(route.size - 1)])
+        route_length = graph.compiled.route_length(route)
 
         eta_from_distance = route_length / speed_limit
 
-        light_locs = [(node == lights['node']).tolist().index(True) for node in route if (node == lights['node']).any()]
-
         # let the expected wait time for all lights found in the route be half the sum of the times
-        expected_wait = sum([lights.loc[index]['switch-time'] for index in light_locs]) / 2
+        lights_in_route = np.isin(lights['node'].to_numpy(), route)
+        expected_wait = lights['switch-time'].to_numpy()[lights_in_route].sum() / 2
         path_time = eta_from_distance + expected_wait
     else:
         path_time = 0
@@ -659,10 +760,8 @@ def build_new_route(graph, route, reroute_node, direction, traffic, avoid):
 
     # get the coordinate positions of the next three nodes in the original route
     # TODO: this will not work if we are building a new route near the very end of a route, where there are not 3 nodes
-    next_nodes_pos = []
-    for node in route[reroute_index + 1:reroute_index + 4]:
-        x, y = get_position_of_node(graph=graph, node=node)
-        next_nodes_pos.append((x, y))
+    compiled = graph.compiled
+    next_nodes_pos = compiled.positions_of(route[reroute_index + 1:reroute_index + 4])
 
     returned = False
     i = 0
@@ -673,33 +772,24 @@ def build_new_route(graph, route, reroute_node, direction, traffic, avoid):
                 route, avoid, direction
             ))
             break
-        out_from_direction = [dot for dot in graph.G[direction].__iter__() if dot != reroute_node]
-
-        # Populate a list of the sums of the distances to the next
-        # three nodes in the original route, for each potential new node
-        sum_three_node_dist, refined_out_from_direction = [], []
-        for node in out_from_direction:
-            if (node == route[:avoid_index + 1 + traffic]).any():
-                # avoid all the nodes in the route including the ones around which we are rerouting
-                continue
+        direction_index = compiled.index_of(direction)
+        out_from_direction = compiled.successors(direction_index)
+        out_from_direction = out_from_direction[out_from_direction != compiled.index_of(reroute_node)]
 
-            twice_out = np.array([dot for dot in graph.G[node].__iter__()])
-            if (direction == twice_out).any():
-                twice_out = np.delete(twice_out, np.where(twice_out == direction)[0][0])
-
-            if twice_out.size == 0:
-                # avoid culdesacs
-                continue
+        # avoid all the nodes in the route including the ones around which we are rerouting
+        out_from_direction = out_from_direction[~np.isin(out_from_direction,
+                                                         compiled.indices_of(route[:avoid_index + 1 + traffic]))]
 
-            distances = []
-            for compare_node in next_nodes_pos:
-                potential_node_pos = get_position_of_node(graph, node)
-                distances.append(np.linalg.norm(compare_node - potential_node_pos))
-            sum_three_node_dist.append(sum(distances))
-            refined_out_from_direction.append(node)
+        # avoid culdesacs (nodes whose only way out is back to direction)
+        out_degree = np.diff(compiled.indptr)[out_from_direction]
+        leads_back = compiled.edge_ids(out_from_direction, np.full(out_from_direction.size, direction_index)) >= 0
+        refined = out_from_direction[out_degree - leads_back > 0]
 
-        sum_three_node_dist = np.array(sum_three_node_dist)
-        refined_out_from_direction = np.array(refined_out_from_direction)
+        # Populate the sums of the distances to the next
+        # three nodes in the original route, for each potential new node
+        distances = np.linalg.norm(compiled.positions[refined][:, None, :] - next_nodes_pos[None, :, :], axis=2)
+        sum_three_node_dist = distances.sum(axis=1)
+        refined_out_from_direction = compiled.node_ids[refined]
 
         if refined_out_from_direction.size == 0:
             # unable to continue rerouting, try rerouting from an earlier node in the route
@@ -722,21 +812,7 @@ def build_new_route(graph, route, reroute_node, direction, traffic, avoid):
             reroute_node = direction
             direction = next_node
 
-    lines = []
-    for i in range(len(new_route)):
-        if i < len(new_route) - 1:
-            lines.append(shortest_path_lines_nx(graph, new_route[i], new_route[i + 1]))
-
-    new_path = []
-    for geometry in lines:
-        # Lines are returned as a list of tuples.
-        # However, the full package has this data structure:
-        #  [ [[(x1, y1), ...]], [[(x2, y2), ...]], ... ]
-        #  So we always iterate over the first element of each element:
-        for point in geometry[0]:
-            new_path.append(point)
-
-    new_clean_path = models.new_route_decompiler(new_path)
+    new_clean_path = models.new_route_decompiler(graph.compiled.route_polyline(new_route))
     new_xpath, new_ypath = [point[0] for point in new_clean_path], [point[1] for point in new_clean_path]
     return new_route, new_xpath, new_ypath, detour
 
@@ -749,11 +825,8 @@ def determine_limits(graph, route):
     :param:   route: list
     :return   axis: list
     """
-    xs, ys = [], []
-    for node in route:
-        x, y = get_position_of_node(graph, node)
-        xs.append(x)
-        ys.append(y)
+    positions = graph.compiled.positions_of(route)
+    xs, ys = positions[:, 0], positions[:, 1]
 
     xmin, xmax = min(xs), max(xs)
     ymin, ymax = min(ys), max(ys)
@@ -761,43 +834,6 @@ def determine_limits(graph, route):
     return axis
 
 
-def lines_to_node(graph, origin, destination):
-    """
-    return the points of all nodes in the route, including the minor nodes which make up line geometry
-
-    :param graph: object: OGraph object from osm_request
-    :param      origin: int
-    :param destination: int
-    :return      lines: list
-    """
-
-    route = nx.shortest_path(graph.G, origin, destination, weight='length')
-
-    # find the route lines
-    edge_nodes = list(zip(route[:-1], route[1:]))
-    lines = []
-    for u, v in edge_nodes:
-        # if there are parallel edges, select the shortest in length
-        data = min(graph.G.get_edge_data(u, v).values(), key=lambda x: x['length'])
-
-        # if it has a geometry attribute (ie, a list of line segments)
-        if 'geometry' in data:
-            # add them to the list of lines to plot
-            xs, ys = data['geometry'].xy
-            lines.append(list(zip(xs, ys)))
-        else:
-            # if it doesn't have a geometry attribute, the edge is a straight
-            # line from node to node
-            x1 = graph.G.nodes[u]['x']
-            y1 = graph.G.nodes[u]['y']
-            x2 = graph.G.nodes[v]['x']
-            y2 = graph.G.nodes[v]['y']
-            line = ((x1, y1), (x2, y2))
-            lines.append(line)
-
-    return lines
-
-
 def shortest_path_lines_nx(graph, origin, destination):
     """
     uses the default shortest path algorithm available through networkx
@@ -814,28 +850,18 @@ def shortest_path_lines_nx(graph, origin, destination):
         [(double, double), ...]:   each tuple represents the bend-point in a straight road
     """
 
-    route = nx.shortest_path(graph.G, origin, destination, weight='length')
+    route = get_route(graph, origin, destination)
+    return lines_along_route(graph, route)
 
-    # find the route lines
-    edge_nodes = list(zip(route[:-1], route[1:]))
-    lines = []
-    for u, v in edge_nodes:
-        # if there are parallel edges, select the shortest in length
-        data = min(graph.G.get_edge_data(u, v).values(), key=lambda x: x['length'])
 
-        # if it has a geometry attribute (ie, a list of line segments)
-        if 'geometry' in data:
-            # add them to the list of lines to plot
-            xs, ys = data['geometry'].xy
-            lines.append(list(zip(xs, ys)))
-        else:
-            # if it doesn't have a geometry attribute, the edge is a straight
-            # line from node to node
-            x1 = graph.G.nodes[u]['x']
-            y1 = graph.G.nodes[u]['y']
-            x2 = graph.G.nodes[v]['x']
-            y2 = graph.G.nodes[v]['y']
-            line = ((x1, y1), (x2, y2))
-            lines.append(line)
+def lines_along_route(graph, route):
+    """
+    returns the line geometry of every edge along a route which is already known, sliced from the compiled graph
 
+    :param graph: object: OGraph object from osm_request
+    :param route:   list: node IDs
+    :return lines:  list: as in shortest_path_lines_nx, one (m, 2) array per edge
+    """
+    compiled = graph.compiled
+    lines = [compiled.edge_polyline(edge) for edge in compiled.route_edges(route)] if len(route) > 1 else []
     return lines
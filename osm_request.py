@@ -1,9 +1,17 @@
-import osmnx as ox
+from compiled_graph import CompiledGraph
+import hashlib
+import json
+import numpy as np
 import os
+import pickle
+from route_cache import RouteCache
+
+# version of the layout of the compiled cache (see OGraph.load_compiled); a cache of another version is rebuilt
+SCHEMA = 2
 
 
 class OGraph:
-    def __init__(self, query, save=False, preview=False):
+    def __init__(self, query, save=False, preview=False, headless=False):
         """
         Silently sends a geo-codable query to OSMNX for the graph of roads, saves result,
         and loads .graphml files locally if they exist in the graph_files/ folder
@@ -11,16 +19,24 @@ class OGraph:
         :param query: str: geo-codable query such as "Harlem, NY" or "Kigali, Rwanda"
         :param preview: bool: will show graph at run-time if True else False
         :param save: bool:
+        :param headless: bool: if True, no figure is plotted (fig and ax are None) and the axis limits are
+                               computed from the node coordinates. With a valid compiled cache, neither OSMnx
+                               nor Matplotlib is imported
         """
         self.query = query
         self.save = save
         self.preview = preview
+        self.headless = headless
         self.store = 'graphml_files'
         self.graph_name = self.query.lower().replace(',', '').replace(' ', '_') + '.graphml'
         self.local_files = os.listdir(self.store)
-        self.init_graph = self.request()
+        self.cache = os.path.join(self.store, self.graph_name.replace('.graphml', '.compiled'))
+        self.init_graph = None
         self.fig, self.axis = None, None
-        self.ax, self.G = self.project_axis()
+        self.G, self.compiled = self.load_compiled()
+        self.ax = self.bounds_axis() if self.headless else self.plot_axis()
+        self.routes = RouteCache(os.path.join(self.store, self.graph_name.replace('.graphml', '.routes.sqlite')),
+                                 self.compiled.fingerprint())
 
     def request(self):
         """
@@ -28,6 +44,7 @@ class OGraph:
 
         :return: result:
         """
+        import osmnx as ox
         result = ox.load_graphml(
             self.store + '/' + self.graph_name
         ) if (self.graph_name in self.local_files) else self.send_query()
@@ -39,6 +56,7 @@ class OGraph:
 
         :return: G: OSMN Graph object
         """
+        import osmnx as ox
         # query graph from place
         G = None
         try:
@@ -50,21 +68,114 @@ class OGraph:
                               f' Please try a geocode-able place from OpenStreetMaps.')
         return G
 
-    def project_axis(self):
+    def load_compiled(self):
         """
-        projects graph geometry and plots figure, retrieving an axis
-        :return: self.fig, self.axis, ax, graph
+        loads the projected graph and its compiled arrays from the binary cache next to the .graphml file,
+        which is valid while the hash of the .graphml file matches the one it was built from.
+        Otherwise the graph is requested, projected and compiled, and the cache is rebuilt
+
+        :return G, compiled: projected networkx graph and CompiledGraph object
         """
-        # project and plot
-        graph = ox.project_graph(self.init_graph)
-        fig, ax = ox.plot_graph(graph, node_size=0, edge_linewidth=0.5,
+        cached = self.read_cache(self.source_hash())
+        if cached is not None:
+            return cached
+
+        import osmnx as ox
+        self.init_graph = self.request()
+        G = ox.project_graph(self.init_graph)
+        compiled = CompiledGraph(G)
+
+        # a graph which was not saved locally has no source file to validate a cache against
+        source = self.source_hash()
+        if source is not None:
+            self.write_cache(G, compiled, source)
+        return G, compiled
+
+    def read_cache(self, source):
+        """
+        :param      source: str: sha1 of the local .graphml file (see source_hash)
+        :return G, compiled: projected networkx graph and CompiledGraph object, or None if the cache is missing, of
+                             another schema, built from another .graphml file or unreadable
+        """
+        meta_file = os.path.join(self.cache, 'meta.json')
+        if source is None or not os.path.exists(meta_file):
+            return None
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta.get('schema') != SCHEMA or meta.get('source') != source:
+                return None
+            compiled = CompiledGraph.load(self.cache)
+            if compiled.fingerprint() != meta.get('fingerprint'):
+                return None
+            with open(os.path.join(self.cache, 'graph.pickle'), 'rb') as f:
+                G = pickle.load(f)
+        except (OSError, ValueError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+            # a damaged cache, or a pickle written with other versions of Python, networkx or shapely
+            return None
+        if len(G) != len(compiled.node_ids):
+            return None
+        return G, compiled
+
+    def write_cache(self, G, compiled, source):
+        """
+        writes the projected graph and its compiled arrays to the binary cache
+
+        :param        G: networkx MultiDiGraph: projected graph
+        :param compiled:        object: CompiledGraph object
+        :param   source:           str: sha1 of the local .graphml file the graph was built from
+        """
+        meta_file = os.path.join(self.cache, 'meta.json')
+        # the metadata is removed first and written last, so an interrupted save is never taken for a valid cache
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+        compiled.save(self.cache)
+        with open(os.path.join(self.cache, 'graph.pickle'), 'wb') as f:
+            pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(meta_file, 'w') as f:
+            json.dump({'schema': SCHEMA, 'source': source, 'fingerprint': compiled.fingerprint(),
+                       'graph': self.graph_name}, f)
+        return
+
+    def source_hash(self):
+        """
+        :return digest: str: sha1 of the local .graphml file, or None if there is none
+        """
+        path = os.path.join(self.store, self.graph_name)
+        if not os.path.exists(path):
+            return None
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def plot_axis(self):
+        """
+        plots the projected graph, retrieving an axis
+        :return: ax
+        """
+        import osmnx as ox
+        fig, ax = ox.plot_graph(self.G, node_size=0, edge_linewidth=0.5,
                                 show=True if self.preview else False,
                                 bgcolor='#FFFFFF')
         # set the axis title and grab the dimensions of the figure
         self.fig = fig
         ax.set_title(self.query)
         self.axis = ax.axis()
-        return ax, graph
+        return ax
+
+    def bounds_axis(self, margin=0.02):
+        """
+        determines the axis limits from the node coordinates, padded as in ox.plot_graph, without plotting
+
+        :param margin: double: fraction of the width and height added on every side
+        :return:   ax: None
+        """
+        (xmin, ymin), (xmax, ymax) = self.compiled.positions.min(axis=0), self.compiled.positions.max(axis=0)
+        dx, dy = (xmax - xmin) * margin, (ymax - ymin) * margin
+        self.axis = tuple(np.array([xmin - dx, xmax + dx, ymin - dy, ymax + dy]).tolist())
+        return None
 
     def dir_check(self):
         """
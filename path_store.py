@@ -0,0 +1,302 @@
+"""
+A flat, ragged store of every car's path for the 'array' engine of Cars.
+
+All path points share one (M, 2) coordinate buffer, where M is the total number of points over all paths.
+Car i owns points[offsets[i]:offsets[i + 1]] and cursor[i] is the position (relative to its offset) of the point it
+is piloting to. Advancing along a path is a cursor increment: the buffer is never sliced or copied during a run.
+"""
+import numpy as np
+
+
+class PathStore:
+    def __init__(self, xpaths, ypaths):
+        """
+        packs per-car lists of path coordinates into the shared buffer
+
+        :param xpaths: iterable: one list (or array) of x coordinates per car
+        :param ypaths: iterable: one list (or array) of y coordinates per car
+        """
+        xpaths, ypaths = list(xpaths), list(ypaths)
+        self.lengths = np.array([len(xpath) for xpath in xpaths], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.lengths))).astype(np.int64)
+        self.cursor = np.zeros(len(self.lengths), dtype=np.int64)
+
+        self.points = np.empty((self.offsets[-1], 2))
+        if self.offsets[-1]:
+            self.points[:, 0] = np.concatenate([np.asarray(xpath, dtype=float) for xpath in xpaths])
+            self.points[:, 1] = np.concatenate([np.asarray(ypath, dtype=float) for ypath in ypaths])
+
+        # cumulative arc length of every point from the start of its own path
+        steps = np.zeros(len(self.points))
+        steps[1:] = np.hypot(*np.diff(self.points, axis=0).T)
+        steps[self.offsets[:-1][self.lengths > 0]] = 0
+        self.arc = np.cumsum(steps)
+        self.arc -= np.repeat(self.arc[self.offsets[:-1][self.lengths > 0]], self.lengths[self.lengths > 0])
+        self.totals = np.where(self.lengths > 0, self.arc[np.maximum(self.offsets[1:] - 1, 0)], 0.0) \
+            if len(self.points) else np.zeros(len(self.lengths))
+
+        # arc length made increasing over the whole buffer, by shifting each path past the end of the previous one,
+        # so that a single searchsorted locates a distance along any path (see locate)
+        self.shift = np.concatenate(([0.0], np.cumsum(self.totals + 1.0)[:-1]))
+        self.arc_key = self.arc + np.repeat(self.shift, self.lengths)
+
+        # the first point at or after every point which is followed by a bend, or else the last point of its path
+        # (see distance_to_bend)
+        self.bend = self.find_bends()
+
+        # directed graph edges along the paths, see assign_edges
+        self.edges = np.full(len(self.points), -1, dtype=np.int64)
+        self.edge_arc = np.zeros(len(self.points))
+        self.edge_end = np.arange(len(self.points), dtype=np.int64)
+        self.nodes = np.full(len(self.points), -1, dtype=np.int64)
+
+    def find_bends(self):
+        """
+        :return bend: array of int: for every point of the buffer, the index of the first point at or after it which
+                      precedes a change of direction of its path, or else the last point of its path
+        """
+        n = len(self.points)
+        if not n:
+            return np.zeros(0, dtype=np.int64)
+        last = np.zeros(n, dtype=bool)
+        last[self.offsets[1:][self.lengths > 0] - 1] = True
+
+        # the turn at point p + 1, between the segments (p, p + 1) and (p + 1, p + 2) of the same path
+        first, second = self.points[1:-1] - self.points[:-2], self.points[2:] - self.points[1:-1]
+        cross = first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0]
+        dot = (first * second).sum(axis=1)
+        turn = ~np.isclose(np.arctan2(np.abs(cross), dot), 0)
+        same_path = ~last[:-2] & ~last[1:-1]
+
+        flag = last.copy()
+        flag[:-2] |= turn & same_path
+        # the next flagged point, by a reversed running minimum; the last point of every path is flagged
+        index = np.where(flag, np.arange(n), n)
+        return np.minimum.accumulate(index[::-1])[::-1]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def remaining(self, cars=None):
+        """
+        :param        cars: array of int: positions of the cars to consider (every car by default)
+        :return remaining: array of int: the number of path points left in each car's route
+        """
+        cars = slice(None) if cars is None else cars
+        return self.lengths[cars] - self.cursor[cars]
+
+    def upcoming(self, k=0, cars=None):
+        """
+        gathers the k-th upcoming path point of every car
+
+        :param           k: int: 0 is the point each car is currently piloting to
+        :param        cars: array of int: positions of the cars to consider (every car by default)
+        :return x, y, valid: arrays: coordinates (nan where the path is shorter than k + 1) and a validity mask
+        """
+        valid = self.remaining(cars) > k
+        cars = slice(None) if cars is None else cars
+        point = self.points[np.where(valid, self.offsets[:-1][cars] + self.cursor[cars] + k, 0)] if len(self.points) \
+            else np.zeros((len(valid), 2))
+        return np.where(valid, point[:, 0], np.nan), np.where(valid, point[:, 1], np.nan), valid
+
+    def advance(self, mask, cars=None):
+        """
+        moves the cursor of the masked cars to the next point of their paths
+
+        :param mask: array of bool
+        :param cars: array of int: positions of the cars the mask refers to (every car by default)
+        """
+        cars = slice(None) if cars is None else cars
+        self.cursor[cars] += mask
+        return
+
+    def locate(self, s, cars=None):
+        """
+        finds the point at arc length s along every path, rolling over any number of path points exactly
+
+        :param           s: array: distance travelled by each car from the start of its path
+        :param        cars: array of int: positions of the cars s refers to (every car by default)
+        :return x, y, cursor: arrays: positions on the paths (nan for an empty path), and the position (relative to
+                              its offset) of the point each car pilots to next (the path length once the end of the
+                              path is reached)
+        """
+        cars = slice(None) if cars is None else cars
+        starts, ends, lengths, totals = self.offsets[:-1][cars], self.offsets[1:][cars], self.lengths[cars], \
+            self.totals[cars]
+        if not len(self.points):
+            return np.full(len(lengths), np.nan), np.full(len(lengths), np.nan), lengths.copy()
+        on_path = lengths >= 2
+        s = np.clip(s, 0, totals)
+
+        # start of the path segment holding each car (its only point for a path of one point)
+        p = np.searchsorted(self.arc_key, s + self.shift[cars], side='right') - 1
+        p = np.where(on_path, np.clip(p, starts, ends - 2), np.where(lengths > 0, starts, 0))
+        q = np.where(on_path, p + 1, p)
+        a, b = self.points[p], self.points[q]
+        length = self.arc[q] - self.arc[p]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.clip(np.where(length > 0, (s - self.arc[p]) / length, 1.0), 0, 1)
+
+        x, y = a[:, 0] + t * (b[:, 0] - a[:, 0]), a[:, 1] + t * (b[:, 1] - a[:, 1])
+        x, y = np.where(lengths > 0, x, np.nan), np.where(lengths > 0, y, np.nan)
+        cursor = np.where(on_path & (s < totals), p - starts + 1, lengths)
+        return x, y, cursor
+
+    def distance_to_bend(self, s, cars=None):
+        """
+        distance along each path to the next point where the road curvature slows a car down: the point before a
+        bend (the curvature ahead of a car is read one point past the point it pilots to) or the end of the path
+
+        :param           s: array: distance travelled by each car from the start of its path
+        :param        cars: array of int: positions of the cars s refers to (every car by default)
+        :return distances: array (0 once the end of the path is reached)
+        """
+        cars = slice(None) if cars is None else cars
+        lengths = self.lengths[cars]
+        target = self.offsets[:-1][cars] + np.minimum(self.cursor[cars], np.maximum(lengths - 1, 0))
+        if not len(self.points):
+            return np.zeros(len(lengths))
+        # an empty path at the end of the buffer starts past its last point
+        target = np.where(lengths > 0, target, 0)
+        return np.where(lengths > 0, np.maximum(self.arc[self.bend[target]] - s, 0), 0.0)
+
+    def assign_edges(self, routes, compiled):
+        """
+        attributes every path point to the directed graph edge whose geometry ends at or passes through it:
+            edges[p]:    edge index of the segment which ends at point p (-1 for the first point of a path)
+            edge_arc[p]: arc length from the start of that edge to point p
+            edge_end[p]: buffer position of the point where that edge ends (the next route node)
+            nodes[p]:    compiled index of the route node at point p (-1 for geometry points between nodes)
+
+        :param   routes: iterable: the route (list of node IDs) of each car, matching its path
+        :param compiled: object: CompiledGraph object from compiled_graph
+        """
+        routes = list(routes)
+        counts = np.array([len(route) for route in routes], dtype=np.int64)
+        nodes = compiled.indices_of([node for route in routes for node in route])
+        car = np.repeat(np.arange(len(counts)), counts)
+
+        # the edge from every route node to the next node of its route (-1 for the last node of a route)
+        pairs = np.zeros(len(nodes), dtype=bool)
+        pairs[:-1] = car[:-1] == car[1:]
+        edges = np.full(len(nodes), -1, dtype=np.int64)
+        edges[pairs] = compiled.edge_ids(nodes[:-1][pairs[:-1]], nodes[1:][pairs[:-1]])
+
+        # a route which does not follow graph edges is not tracked on any edge
+        broken = np.bincount(car[pairs & (edges < 0)], minlength=len(counts)) > 0
+        tracked = (self.lengths >= 2) & (counts >= 2) & ~broken
+        if not tracked.any():
+            return
+        keep = tracked[car]
+        car, nodes, edges, counts = car[keep], nodes[keep], edges[keep], counts[tracked]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        # buffer position of every route node, increasing over the whole buffer
+        vertices = self.offsets[car] + self.match_vertices(car, nodes, edges, starts, compiled)
+        self.nodes[vertices] = nodes
+
+        # every point but the first of a tracked path belongs to the edge of the last route node before it
+        cars = car[starts]
+        sizes = self.lengths[cars] - 1
+        owner = np.repeat(np.arange(len(cars)), sizes)
+        points = np.repeat(self.offsets[cars] + 1 - np.concatenate(([0], np.cumsum(sizes)[:-1])), sizes) \
+            + np.arange(sizes.sum())
+        segment = np.clip(np.searchsorted(vertices, points) - 1, starts[owner], starts[owner] + counts[owner] - 2)
+        self.edges[points] = edges[segment]
+        self.edge_end[points] = vertices[segment + 1]
+        self.edge_arc[points] = self.arc[points] - self.arc[vertices[segment]]
+        return
+
+    def match_vertices(self, car, nodes, edges, starts, compiled):
+        """
+        locates every route node on its car's path
+
+        A path built from its route (see navigation.get_path_along_route) is the route polyline without twin points,
+        so its nodes are found by counting the polyline points of each edge. Any other path, such as one which was
+        trimmed as its car advanced, is searched for the nearest point to each node in turn.
+
+        Parameters
+        __________
+        :param      car: array of int: car position of every route node, route by route
+        :param    nodes: array of int: compiled index of every route node
+        :param    edges: array of int: edge from every route node to the next one (-1 for the last node of a route)
+        :param   starts: array of int: position of the first node of each route in the arrays above
+        :param compiled: object: CompiledGraph object from compiled_graph
+
+        Returns
+        _______
+        :return vertices: array of int: position of every route node on its path, relative to the path's offset
+        """
+        cars = car[starts]
+        on_edge = edges >= 0
+        first = compiled.geometry_offsets[edges[on_edge]]
+        sizes = compiled.geometry_offsets[edges[on_edge] + 1] - first
+        line_starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+        # the route polyline of every car, as in CompiledGraph.route_polyline, and the points remove_twin_points keeps
+        polyline = compiled.geometry[np.repeat(first - line_starts, sizes) + np.arange(sizes.sum())]
+        owner = np.repeat(car[on_edge], sizes)
+        kept = np.ones(len(polyline), dtype=bool)
+        kept[:-1] = (polyline[:-1] != polyline[1:]).any(axis=1) | (owner[:-1] != owner[1:])
+        before = np.cumsum(kept) - kept
+        origin = np.zeros(len(self), dtype=np.int64)
+        origin[cars] = before[np.searchsorted(owner, cars)]
+
+        # a node is at the first kept point of the polyline of its edge, and the destination ends the path
+        vertices = np.empty(len(car), dtype=np.int64)
+        vertices[on_edge] = before[line_starts] - origin[car[on_edge]]
+        vertices[~on_edge] = self.lengths[car[~on_edge]] - 1
+
+        # the paths which are their route polylines
+        owner, polyline = owner[kept], polyline[kept]
+        matched = np.zeros(len(self), dtype=bool)
+        matched[cars] = np.bincount(owner, minlength=len(self))[cars] == self.lengths[cars]
+        check = matched[owner]
+        position = self.offsets[owner[check]] + np.flatnonzero(check) - origin[owner[check]]
+        matched[owner[check][(self.points[position] != polyline[check]).any(axis=1)]] = False
+
+        stops = np.append(starts[1:], len(car))
+        for j in np.flatnonzero(~matched[cars]):
+            points = self.points[self.offsets[cars[j]]:self.offsets[cars[j] + 1]]
+            vertex = 0
+            for k in range(starts[j], stops[j]):
+                vertex += np.argmin(np.hypot(*(points[vertex:] - compiled.positions[nodes[k]]).T))
+                vertices[k] = vertex
+        return vertices
+
+    def edge_positions(self, x, y, cars=None):
+        """
+        locates every car on the directed edge it travels along
+
+        :param                        x, y: arrays: car positions
+        :param                        cars: array of int: positions of the cars x and y refer to (every car by default)
+        :return edges, offsets, next_edges, lengths: arrays: edge index (-1 when the car is not on an edge),
+                                                     arc-length offset from the start of that edge,
+                                                     the following edge of the route (-1 at the end of the route),
+                                                     and the arc length of the edge along the path
+        """
+        n = len(x)
+        if not len(self.points):
+            return np.full(n, -1, dtype=np.int64), np.zeros(n), np.full(n, -1, dtype=np.int64), np.zeros(n)
+
+        index = slice(None) if cars is None else cars
+        # a car which has not left its origin yet is at the start of its first edge
+        on_path = (self.remaining(cars) > 0) & (self.lengths[index] >= 2)
+        target = np.where(on_path, self.offsets[:-1][index] + np.maximum(self.cursor[index], 1), 0)
+
+        edges = np.where(on_path, self.edges[target], -1)
+        to_target = np.hypot(self.points[target, 0] - x, self.points[target, 1] - y)
+        offsets = np.where(edges >= 0, np.maximum(self.edge_arc[target] - to_target, 0), 0)
+
+        after = self.edge_end[target] + 1
+        has_next = on_path & (after < self.offsets[1:][index])
+        next_edges = np.where(has_next, self.edges[np.where(has_next, after, 0)], -1)
+        lengths = np.where(edges >= 0, self.edge_arc[self.edge_end[target]], 0)
+        return edges, offsets, next_edges, lengths
+
+    def remaining_path(self, i):
+        """
+        :param       i: int: car position in the store
+        :return points: array: (m, 2) view of the points car i has yet to reach
+        """
+        return self.points[self.offsets[i] + self.cursor[i]:self.offsets[i + 1]]
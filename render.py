@@ -0,0 +1,260 @@
+"""
+Record-then-render movies.
+
+Instead of simulating inside a FuncAnimation, the simulation is first recorded (car positions and light face go-values
+at every frame), and the frames are then rendered by a pool of processes. Each worker keeps its own offscreen figure
+with the cached road basemap (see basemap), over which it blits the cars and faces of each frame, and the rendered
+frames are streamed in order to the stdin of FFmpeg as raw RGBA video, so the render time divides by the number of
+cores.
+
+For high-volume batch video, Rasterizer skips Matplotlib altogether: it stamps the car dots and light faces straight
+into a copy of the basemap pixels with NumPy, and rasterize_movie pipes those RGB frames to FFmpeg.
+
+Example usage:
+
+recording = record(cars, lights, n_frames=600, dt=1 / 1000)
+render_movie(recording, graph, 'traffic.mp4', fps=60, processes=8)
+rasterize_movie(recording, graph, 'traffic.mp4', fps=60)
+"""
+from animate import BLUE, GREEN, RED
+from basemap import load_basemap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+import os
+import subprocess
+
+# the figure of each render worker, built once by init_renderer
+_renderer = None
+
+# colors of the Rasterizer, as uint8 RGB
+RGB_BLUE, RGB_GREEN, RGB_RED = [np.round(np.array(color[:3]) * 255).astype(np.uint8) for color in (BLUE, GREEN, RED)]
+
+
+class Recording:
+    def __init__(self, light_positions, face_positions):
+        """
+        the trajectory of a simulation, frame by frame
+
+        :param light_positions: array: (lights, 2) x, y of every light
+        :param  face_positions: array: (faces, 2) x, y of every light face
+        """
+        self.light_positions = light_positions
+        self.face_positions = face_positions
+        self.car_positions = []
+        self.face_go_values = []
+
+    def __len__(self):
+        return len(self.car_positions)
+
+    def append(self, car_positions, face_go_values):
+        """
+        :param  car_positions: array: (cars, 2)
+        :param face_go_values: array of bool: (faces,)
+        """
+        self.car_positions.append(np.asarray(car_positions, dtype=np.float32))
+        self.face_go_values.append(np.array(face_go_values, dtype=bool))
+        return
+
+
+def record(cars, lights, n_frames, dt=1 / 1000):
+    """
+    runs the simulation without rendering, recording one frame per update
+
+    :param     cars: object: Cars object from cars
+    :param   lights: object: TrafficLights object from cars
+    :param n_frames:    int
+    :param       dt: double: simulated time between frames
+    :return recording: Recording
+    """
+    recording = Recording(lights.positions(), lights.face_positions())
+    for _ in range(n_frames):
+        lights.update(dt)
+        cars.update(dt, lights.state)
+        recording.append(cars.positions(), lights.face_go_values())
+    return recording
+
+
+def ffmpeg_command(path, width, height, fps, pix_fmt='rgba'):
+    """
+    :param   path:    str: output movie
+    :param  width:    int: frame width in pixels
+    :param height:    int: frame height in pixels
+    :param    fps:    int: frames per second
+    :param pix_fmt:   str: pixel format of the raw frames, 'rgba' or 'rgb24'
+    :return command: list: FFmpeg reading raw frames from stdin and encoding them with H.264
+    """
+    return ['ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', pix_fmt, '-s', '{}x{}'.format(width, height), '-r', str(fps), '-i', '-',
+            # H.264 in yuv420p needs even dimensions
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', path]
+
+
+def init_renderer(basemap, axis, light_positions, face_positions, dpi, width):
+    """
+    builds the figure of a render worker: the basemap and the static lights are drawn once and cached as the background
+    of every frame, over which only the (animated) cars and faces are drawn
+
+    :param         basemap:  array: RGBA road-network image from basemap.load_basemap
+    :param            axis:  tuple: (xmin, xmax, ymin, ymax)
+    :param light_positions:  array: (lights, 2)
+    :param  face_positions:  array: (faces, 2)
+    :param             dpi:    int
+    :param           width: double: inches
+    """
+    global _renderer
+    fig = Figure(figsize=(width, width * basemap.shape[0] / basemap.shape[1]), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    ax.imshow(basemap, extent=axis, origin='upper', interpolation='nearest', zorder=0)
+    ax.scatter(light_positions[:, 0], light_positions[:, 1], s=4, color='red', marker='+', zorder=3)
+    faces = ax.scatter(face_positions[:, 0], face_positions[:, 1], s=4, color='red', marker='^', linewidths=0,
+                       zorder=3, animated=True)
+    cars = ax.scatter([], [], s=1, color='blue', marker='o', zorder=3, animated=True)
+    ax.set_xlim(axis[0], axis[1])
+    ax.set_ylim(axis[2], axis[3])
+    canvas.draw()
+    _renderer = (canvas, ax, canvas.copy_from_bbox(fig.bbox), cars, faces)
+    return
+
+
+def render_frame(car_positions, face_go_values):
+    """
+    renders one recorded frame in a worker, blitting the cars and faces over the cached background
+
+    :param  car_positions: array: (cars, 2)
+    :param face_go_values: array of bool: (faces,)
+    :return         frame: bytes: raw RGBA pixels
+    """
+    canvas, ax, background, cars, faces = _renderer
+    cars.set_offsets(car_positions)
+    faces.set_facecolors(np.where(face_go_values[:, None], GREEN, RED))
+    canvas.restore_region(background)
+    ax.draw_artist(faces)
+    ax.draw_artist(cars)
+    return bytes(canvas.buffer_rgba())
+
+
+def render_movie(recording, graph, path, fps=60, processes=None, dpi=100, width=8, window=None):
+    """
+    renders a recording in a process pool and streams the frames, in order, to FFmpeg
+
+    :param recording: Recording
+    :param     graph:  object: OGraph object from osm_request (headless is enough)
+    :param      path:     str: output movie, i.e. 'traffic.mp4'
+    :param       fps:     int
+    :param processes:     int: number of render processes (all cores by default)
+    :param       dpi:     int
+    :param     width:  double: inches
+    :param    window:     int: most frames rendered ahead of FFmpeg (4 per process by default)
+    """
+    processes = processes or os.cpu_count()
+    window = window or 4 * processes
+    initargs = (load_basemap(graph, graph.axis, dpi, width), graph.axis,
+                recording.light_positions, recording.face_positions, dpi, width)
+
+    # the frame size in pixels, as the workers' canvases will have it
+    init_renderer(*initargs)
+    pixels, height = _renderer[0].get_width_height()
+
+    ffmpeg = subprocess.Popen(ffmpeg_command(path, pixels, height, fps), stdin=subprocess.PIPE)
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_renderer, initargs=initargs) as executor:
+        pending = deque()
+        # keep at most `window` frames in flight, and write them in submission order
+        for frame in zip(recording.car_positions, recording.face_go_values):
+            pending.append(executor.submit(render_frame, *frame))
+            if len(pending) >= window:
+                ffmpeg.stdin.write(pending.popleft().result())
+        while pending:
+            ffmpeg.stdin.write(pending.popleft().result())
+
+    ffmpeg.stdin.close()
+    if ffmpeg.wait():
+        raise RuntimeError('FFmpeg exited with code {} while writing {}'.format(ffmpeg.returncode, path))
+    return
+
+
+class Rasterizer:
+    def __init__(self, basemap, axis, light_positions, face_positions, radius=1):
+        """
+        precomputes the background and the pixels of everything which does not move
+
+        :param         basemap: array: RGBA road-network image from basemap.load_basemap
+        :param            axis: tuple: (xmin, xmax, ymin, ymax) extent of the basemap
+        :param light_positions: array: (lights, 2)
+        :param  face_positions: array: (faces, 2)
+        :param          radius:   int: cars and faces are squares of 2 * radius + 1 pixels
+        """
+        self.background = np.ascontiguousarray(basemap[..., :3])
+        self.height, self.width = self.background.shape[:2]
+        self.axis = axis
+        offsets = np.arange(-radius, radius + 1)
+        self.stamp = (offsets[:, None] * self.width + offsets[None, :]).ravel()
+        self.radius = radius
+
+        self.light_pixels, _ = self.pixels(light_positions, stamp=False)
+        self.face_pixels, self.face_owner = self.pixels(face_positions)
+
+    def pixels(self, positions, stamp=True):
+        """
+        :param positions: array: (n, 2) x, y
+        :param     stamp:  bool: if True every point covers a square, else a single pixel
+        :return pixels, owner: arrays: flat indices of the covered pixels, and the point each one belongs to
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        xmin, xmax, ymin, ymax = self.axis
+        col = np.floor((positions[:, 0] - xmin) / (xmax - xmin) * self.width).astype(np.int64)
+        row = np.floor((ymax - positions[:, 1]) / (ymax - ymin) * self.height).astype(np.int64)
+
+        # squares are kept whole, so the points too near the edge of the frame are left out
+        margin = self.radius if stamp else 0
+        inside = (col >= margin) & (col < self.width - margin) & (row >= margin) & (row < self.height - margin)
+        owner = np.flatnonzero(inside)
+        centers = row[inside] * self.width + col[inside]
+        if not stamp:
+            return centers, owner
+        return (centers[:, None] + self.stamp[None, :]).ravel(), np.repeat(owner, len(self.stamp))
+
+    def draw(self, car_positions, face_go_values):
+        """
+        :param  car_positions: array: (cars, 2)
+        :param face_go_values: array of bool: (faces,)
+        :return         frame: array: (height, width, 3) RGB pixels (uint8)
+        """
+        frame = self.background.copy()
+        flat = frame.reshape(-1, 3)
+        flat[self.light_pixels] = RGB_RED
+        flat[self.face_pixels] = np.where(np.asarray(face_go_values, dtype=bool)[self.face_owner, None],
+                                          RGB_GREEN, RGB_RED)
+        car_pixels, _ = self.pixels(car_positions)
+        flat[car_pixels] = RGB_BLUE
+        return frame
+
+
+def rasterize_movie(recording, graph, path, fps=60, dpi=100, width=8, radius=1):
+    """
+    rasterizes a recording with NumPy and pipes the RGB frames to FFmpeg, with no Matplotlib drawing per frame
+
+    :param recording: Recording
+    :param     graph:  object: OGraph object from osm_request (headless is enough)
+    :param      path:     str: output movie, i.e. 'traffic.mp4'
+    :param       fps:     int
+    :param       dpi:     int: resolution of the basemap
+    :param     width:  double: inches
+    :param    radius:     int: half the width of a car or face square, in pixels
+    """
+    rasterizer = Rasterizer(load_basemap(graph, graph.axis, dpi, width), graph.axis,
+                            recording.light_positions, recording.face_positions, radius=radius)
+
+    ffmpeg = subprocess.Popen(ffmpeg_command(path, rasterizer.width, rasterizer.height, fps, pix_fmt='rgb24'),
+                              stdin=subprocess.PIPE)
+    for car_positions, face_go_values in zip(recording.car_positions, recording.face_go_values):
+        ffmpeg.stdin.write(rasterizer.draw(car_positions, face_go_values).tobytes())
+
+    ffmpeg.stdin.close()
+    if ffmpeg.wait():
+        raise RuntimeError('FFmpeg exited with code {} while writing {}'.format(ffmpeg.returncode, path))
+    return
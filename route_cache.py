@@ -0,0 +1,149 @@
+"""
+A persistent cache of shortest routes, keyed by graph fingerprint and (origin, destination, weight).
+
+Recently used routes are held in a bounded in-memory LRU; every route is also stored in a small SQLite file kept
+next to the .graphml files, as a blob of int64 node IDs, so that warm runs skip shortest path searches entirely.
+Pairs of nodes with no route between them are stored too, as an empty blob, so that they are not searched again.
+
+New routes are committed in batches of flush_every, and when the cache is closed, left as a context manager or
+garbage collected (or the interpreter exits).
+"""
+from collections import OrderedDict
+import networkx as nx
+import numpy as np
+import sqlite3
+import weakref
+
+
+class RouteCache:
+    def __init__(self, path, fingerprint, maxsize=100000, flush_every=1000):
+        """
+        :param        path:  str: path of the SQLite store, e.g. 'graphml_files/harlem_ny.routes.sqlite'
+        :param fingerprint:  str: fingerprint of the graph the routes belong to (CompiledGraph.fingerprint)
+        :param     maxsize:  int: number of routes kept in memory
+        :param flush_every:  int: number of new routes stored between commits
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.maxsize = maxsize
+        self.flush_every = flush_every
+        self.pending = 0
+        self.memory = OrderedDict()
+        self.hits, self.misses = 0, 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS routes ('
+            'fingerprint TEXT, origin INTEGER, destination INTEGER, weight TEXT, route BLOB, '
+            'PRIMARY KEY (fingerprint, origin, destination, weight))'
+        )
+        self.connection.commit()
+        # the finalizer holds the connection but not the cache, so an unused cache can still be collected
+        self.finalizer = weakref.finalize(self, RouteCache.finish, self.connection)
+
+    @staticmethod
+    def finish(connection):
+        """ Commits the pending routes and closes the connection """
+        connection.commit()
+        connection.close()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return
+
+    def remember(self, key, route):
+        """ Adds a route to the in-memory LRU, evicting the least recently used one when full """
+        self.memory[key] = route
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+        return
+
+    def get(self, origin, destination, weight='length'):
+        """
+        :param      origin: node ID
+        :param destination: node ID
+        :param      weight:  str: edge attribute the route was minimized over
+        :return      route: list of node IDs ([] if there is no route between the nodes), or None if the route is not
+                            cached
+        """
+        key = (origin, destination, weight)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        if not self.finalizer.alive:
+            # closed: only the routes in memory are left
+            self.misses += 1
+            return None
+
+        row = self.connection.execute(
+            'SELECT route FROM routes WHERE fingerprint = ? AND origin = ? AND destination = ? AND weight = ?',
+            (self.fingerprint, int(origin), int(destination), weight)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        route = np.frombuffer(row[0], dtype=np.int64).tolist()
+        self.remember(key, route)
+        return route
+
+    def put(self, origin, destination, route, weight='length'):
+        """
+        stores a route; it is written to disk at the next flush, which happens every flush_every new routes
+
+        :param      origin: node ID
+        :param destination: node ID
+        :param       route: list of node IDs ([] if there is no route between the nodes)
+        :param      weight:  str
+        """
+        self.remember((origin, destination, weight), list(route))
+        if not self.finalizer.alive:
+            return
+        self.connection.execute(
+            'INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?)',
+            (self.fingerprint, int(origin), int(destination), weight, np.asarray(route, dtype=np.int64).tobytes())
+        )
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+        return
+
+    def flush(self):
+        """ Commits the routes stored since the last flush """
+        if self.finalizer.alive:
+            self.connection.commit()
+        self.pending = 0
+        return
+
+    def close(self):
+        """ Commits the pending routes and closes the store; from then on, routes are only kept in memory """
+        self.finalizer()
+        return
+
+    def route(self, G, origin, destination, weight='length'):
+        """
+        the cached route between two nodes, computed with networkx and stored on a miss
+
+        :param           G: networkx graph (i.e. OGraph.G)
+        :param      origin: node ID
+        :param destination: node ID
+        :param      weight:  str
+        :return      route: list of node IDs
+        :raises NetworkXNoPath: if there is no route between the nodes (which is cached as well)
+        """
+        route = self.get(origin, destination, weight)
+        if route is None:
+            try:
+                route = nx.shortest_path(G, origin, destination, weight=weight)
+            except nx.NetworkXNoPath:
+                route = []
+            self.put(origin, destination, route, weight)
+        if not route:
+            raise nx.NetworkXNoPath(f'No route between {origin} and {destination}.')
+        return route
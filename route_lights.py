@@ -0,0 +1,137 @@
+"""
+A per-route index of the traffic lights each car will meet, for red-light detection in the 'array' engine of Cars.
+
+Routes are known when cars are initialized, so the lights along each path are looked up once: for every car, the
+ragged table holds the path position of each light it passes, in order, and the face of that light which governs
+the car's approach (the face pointing back along the road the car arrives on). During a run, each car only looks at
+its next light: finding red lights is a cursor lookup and a phase lookup, vectorized over the fleet.
+"""
+import models
+import numpy as np
+
+
+class RouteLights:
+    def __init__(self, paths, lights, compiled):
+        """
+        builds the index from the route nodes of a PathStore and the lights DataFrame
+
+        :param    paths:    object: PathStore object from path_store, after assign_edges
+        :param   lights: dataframe: traffic lights state, as from sim.init_traffic_lights
+        :param compiled:    object: CompiledGraph object from compiled_graph
+        """
+        self.nodes = lights['node'].to_numpy()
+        degree = lights['degree'].to_numpy(dtype=np.int64)
+        face_offsets = np.cumsum(degree) - degree
+
+        light_at_node = np.full(len(compiled.node_ids), -1, dtype=np.int64)
+        light_at_node[compiled.indices_of(self.nodes)] = np.arange(len(self.nodes))
+
+        # lights on the route nodes of every path (except where a car starts, as it never approaches it)
+        light_at_point = np.where(paths.nodes >= 0, light_at_node[paths.nodes], -1)
+        light_at_point[paths.offsets[:-1][paths.lengths > 0]] = -1
+        points = np.flatnonzero(light_at_point >= 0)
+        light = light_at_point[points]
+
+        # expand every (point, light) entry over the faces of the light and keep the face most anti-parallel
+        # to the direction of approach, if it is anti-parallel at all (as in light_obstacles)
+        entry = np.repeat(np.arange(points.size), degree[light])
+        local = np.arange(entry.size) - np.repeat(np.cumsum(degree[light]) - degree[light], degree[light])
+        face = face_offsets[light][entry] + local
+        if entry.size:
+            face_vectors = np.column_stack((np.concatenate(lights['out-xvectors'].to_numpy()),
+                                            np.concatenate(lights['out-yvectors'].to_numpy())))[face]
+        else:
+            face_vectors = np.empty((0, 2))
+        approach = (paths.points[points] - paths.points[points - 1])[entry]
+        governs = models.anti_parallel_mask(approach, face_vectors)
+        alignment = np.einsum('ij,ij->i', models.unit_vectors(approach), models.unit_vectors(face_vectors))
+
+        candidates = np.flatnonzero(governs)
+        candidates = candidates[np.lexsort((alignment[candidates], entry[candidates]))]
+        first = np.ones(candidates.size, dtype=bool)
+        first[1:] = entry[candidates][1:] != entry[candidates][:-1]
+        self.face = np.full(points.size, -1, dtype=np.int64)
+        self.face[entry[candidates[first]]] = face[candidates[first]]
+
+        self.point = points
+        self.light = light
+        car = np.searchsorted(paths.offsets, points, side='right') - 1
+        self.offsets = np.searchsorted(car, np.arange(len(paths) + 1)).astype(np.int64)
+        self.cursor = self.offsets[:-1].copy()
+
+    def next_lights(self, paths, cars=None):
+        """
+        moves each car's light cursor past the lights it has already crossed
+
+        :param  paths: object: PathStore object from path_store
+        :param   cars: array of int: positions of the cars to consider (every car by default)
+        :return entry, valid: arrays: index of each car's next light entry and whether it has one
+        """
+        cars = slice(None) if cars is None else cars
+        position = paths.offsets[:-1][cars] + paths.cursor[cars]
+        ends = self.offsets[1:][cars]
+        while True:
+            cursor = self.cursor[cars]
+            valid = cursor < ends
+            passed = valid & (self.point[np.where(valid, cursor, 0)] < position) if self.point.size else valid
+            if not passed.any():
+                return cursor, valid
+            self.cursor[cars] += passed
+
+    def red_light_distances(self, paths, x, y, go, look_ahead=np.inf, cars=None):
+        """
+        distance along each car's path to its next light if the face governing its approach is red
+
+        :param      paths: object: PathStore object from path_store
+        :param       x, y:  arrays: car positions
+        :param         go:  array of bool: go-value of every light face, in the order of the lights DataFrame
+        :param look_ahead: double: red lights further along the path than this are ignored
+        :param       cars:  array of int: positions of the cars x and y refer to (every car by default)
+        :return distances:  array (0 where there is no red light ahead)
+        """
+        entry, valid = self.next_lights(paths, cars)
+        distances = np.zeros(len(x))
+        if not valid.any():
+            return distances
+
+        entry, local = entry[valid], np.flatnonzero(valid)
+        ids = local if cars is None else cars[local]
+        face = self.face[entry]
+        red = (face >= 0) & ~go[np.maximum(face, 0)]
+
+        target = paths.offsets[:-1][ids] + paths.cursor[ids]
+        to_target = np.hypot(paths.points[target, 0] - x[local], paths.points[target, 1] - y[local])
+        along = to_target + paths.arc[self.point[entry]] - paths.arc[target]
+
+        red &= (along > 0) & (along <= look_ahead)
+        distances[local[red]] = along[red]
+        return distances
+
+    def segment_red_light_distances(self, paths, x, y, next_x, next_y, go, cars=None):
+        """
+        distance to the nearest red light on the segment from each car to the node it pilots to, as light_obstacles
+        finds it for point kinematics: the lights around the car's path cursor are projected on that segment, which
+        also holds the light of a node the car has crossed within the proximity tolerance of nav.fleet_view, but not
+        yet reached
+
+        :param           paths: object: PathStore object from path_store
+        :param            x, y:  arrays: car positions
+        :param  next_x, next_y:  arrays: position of the node each car pilots to (see nav.fleet_view)
+        :param              go:  array of bool: go-value of every light face, in the order of the lights DataFrame
+        :param            cars:  array of int: positions of the cars x and y refer to (every car by default)
+        :return      distances:  array (0 where there is no red light on the segment)
+        """
+        entry, _ = self.next_lights(paths, cars)
+        ids = np.arange(len(x)) if cars is None else np.asarray(cars)
+        distances = np.full(len(x), np.inf)
+        for candidate in (entry - 1, entry, entry + 1):
+            valid = (candidate >= self.offsets[:-1][ids]) & (candidate < self.offsets[1:][ids])
+            candidate = np.where(valid, candidate, 0)
+            if not self.point.size:
+                break
+            light_x, light_y = paths.points[self.point[candidate], 0], paths.points[self.point[candidate], 1]
+            ahead = models.on_segment(*models.segment_projection(light_x, light_y, x, y, next_x, next_y))
+            face = self.face[candidate]
+            red = valid & ahead & (face >= 0) & ~go[np.maximum(face, 0)]
+            distances = np.where(red, np.minimum(distances, np.hypot(light_x - x, light_y - y)), distances)
+        return np.where(np.isinf(distances), 0.0, distances)
@@ -1,9 +1,12 @@
 """
 Description of module...
 """
+from concurrent.futures import ProcessPoolExecutor
+import kernels
 import math
 import models
 import navigation as nav
+import networkx as nx
 from networkx.exception import NetworkXNoPath
 import numpy as np
 import pandas as pd
@@ -14,6 +17,10 @@ speed_limit = 1500
 stop_distance = 20
 free_distance = 60
 default_acceleration = 4
+# cars and red lights further along the road than this do not slow a car down
+look_ahead = 200
+# cars following a car in sight move in explicit sub-steps of at most this (see integrate_fleet)
+follow_step = 1.0e-2
 
 
 # TODO: profile
@@ -35,8 +42,7 @@ def update_cars(cars, graph, dt):
     new_times = []
 
     for i, car in enumerate(cars.iterrows()):
-        xpath, ypath = np.array(car[1]['xpath']), np.array(car[1]['ypath'])
-        if xpath.any() and ypath.any():
+        if len(car[1]['xpath']) and len(car[1]['ypath']):
             # add to route timer
             new_times.append(car[1]['route-time'] + dt)
 
@@ -146,8 +152,7 @@ def road_curvature_factor(car, angle, d):
     _______
     :return speed_factor: double:  factor by which to diminish speed
     """
-    xpath = np.array(car['xpath'])
-    if xpath.size == 1:
+    if len(car['xpath']) == 1:
         # if it's the end of the path, treat the last node like a hard-stop intersection
         theta = math.pi / 2
     else:
@@ -186,7 +191,361 @@ def obstacle_factor(d):
     return factor
 
 
-def init_random_node_start_location(n, graph, car_id=None, alternate_route=None):
+def update_fleet(fleet, view, dt, cars=None, jit=False):
+    """
+    The vectorized counterpart of update_cars for the 'array' engine of Cars:
+    advances the route progress of cars which just crossed a node and sets every car's velocity in place
+
+    :param:  fleet: object: Fleet object from fleet
+    :param:   view:  tuple: output of nav.fleet_view (for the same cars)
+    :param:     dt: double, or array: one time step per car
+    :param:   cars: array of int: positions of the cars to update (every car by default)
+    :param:    jit:   bool: compute the velocities with the Numba kernel of kernels.fleet_velocities, if available
+    :return: fleet: object
+    """
+    crossed, next_x, next_y, angles = view
+    remaining = fleet.remaining(cars)
+    moving = remaining > 0
+    index = slice(None) if cars is None else cars
+
+    # add to route timers
+    fleet.route_time[index] += dt * moving
+
+    distance_to_car, distance_to_red_light = fleet.distance_to_car[index], fleet.distance_to_red_light[index]
+    if jit and kernels.available:
+        fleet.vx[index], fleet.vy[index] = kernels.fleet_velocities(
+            fleet.x[index], fleet.y[index], next_x, next_y, fleet.distance_to_node[index], distance_to_car,
+            distance_to_red_light, angles, remaining, speed_limit, stop_distance, free_distance, default_acceleration)
+        fleet.advance(crossed & moving, cars)
+        return fleet
+
+    factor = update_speed_factors(fleet.distance_to_node[index], distance_to_car, distance_to_red_light,
+                                  angles, remaining == 1)
+
+    dx, dy = next_x - fleet.x[index], next_y - fleet.y[index]
+    norm = np.hypot(dx, dy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vx = np.where(norm > 0, dx / norm, 0.0) * speed_limit * factor
+        vy = np.where(norm > 0, dy / norm, 0.0) * speed_limit * factor
+
+    # if the car has stalled and should accelerate, then give it a push
+    stalled = np.isclose(0, vx, atol=0.1) & np.isclose(0, vy, atol=0.1)
+    push = stalled & should_accelerate(distance_to_car, distance_to_red_light)
+    vx, vy = vx + default_acceleration * push, vy + default_acceleration * push
+
+    fleet.vx[index], fleet.vy[index] = np.where(moving, vx, 0.0), np.where(moving, vy, 0.0)
+    fleet.advance(crossed & moving, cars)
+    return fleet
+
+
+def travel_distances(fleet, dt, cars=None, jit=False):
+    """
+    the distance each car of a Fleet travels along its path in a sub-step of multi-rate integration (see
+    Cars.update_multirate): its speed times dt, but never closer than stop_distance to a car or red light ahead, so
+    that long steps do not skip past obstacles
+
+    :param:     fleet: object: Fleet object from fleet, after update_fleet
+    :param:        dt: double, or array: one time step per car
+    :param:      cars: array of int: positions of the cars which move (every car by default)
+    :param:       jit:   bool: use the Numba kernel of kernels.travel_distances, if available
+    :return: distances: array
+    """
+    cars = slice(None) if cars is None else cars
+    vx, vy = fleet.vx[cars], fleet.vy[cars]
+    if jit and kernels.available:
+        return kernels.travel_distances(vx, vy, np.broadcast_to(np.asarray(dt, dtype=float), len(vx)),
+                                        fleet.distance_to_car[cars], fleet.distance_to_red_light[cars], stop_distance)
+
+    distances = np.hypot(vx, vy) * dt
+    for obstacle in (fleet.distance_to_car[cars], fleet.distance_to_red_light[cars]):
+        distances = np.where(obstacle > 0, np.minimum(distances, np.maximum(obstacle - stop_distance, 0)), distances)
+    return distances
+
+
+def integrate_fleet(fleet, dt, leaders, cars=None, jit=False):
+    """
+    one step of arc-length kinematics: moves every car along its path by integrating its speed within the step, then
+    sets its velocity at the end of the step as update_fleet does
+
+    Within the step, the gap from a car to its leader follows the distance both have travelled (the leader at its
+    speed at the start of the step), and its distance to a red light follows the distance it has travelled. The speed
+    of a car which sees no car ahead only depends on where it is along its path, so it is integrated in closed form:
+    at the speed limit up to the next point where its speed factor may change, and through the logarithmic speed
+    factor near a bend or red light with exponential integrals (see zone_time). A car on its own thus follows the same
+    trajectory whatever dt, up to the lights, which only switch between steps. Cars which see a car ahead move in
+    explicit sub-steps of at most follow_step, and only meet the cars which merge ahead of them at the next step.
+
+    Parameters
+    __________
+    :param:   fleet: object: Fleet object from fleet, after nav.fleet_obstacles with a look-ahead of
+                             look_ahead + speed_limit * dt (every obstacle a car may come in sight of within the step)
+    :param:      dt: double
+    :param: leaders: array of int: position of the leader of each car in the fleet (-1 where there is none)
+    :param:    cars: array of int: positions of the cars to update (every car by default)
+    :param:     jit:   bool: compute the velocities with the Numba kernel of kernels.fleet_velocities, if available
+
+    Returns
+    _______
+    :return: fleet: object
+    """
+    cars = np.arange(fleet.n) if cars is None else np.asarray(cars)
+    car_gaps, light_gaps = fleet.distance_to_car[cars].copy(), fleet.distance_to_red_light[cars].copy()
+    leader_speeds = np.where(leaders >= 0, np.hypot(fleet.vx, fleet.vy)[leaders], 0.0)
+
+    moving = fleet.remaining(cars) > 0
+    start, left = fleet.s[cars].copy(), np.where(moving, float(dt), 0.0)
+    active = np.flatnonzero(left > 0)
+    while len(active):
+        distances, times = substep(fleet, cars[active], left[active], dt - left[active],
+                                   fleet.s[cars[active]] - start[active], car_gaps[active], leader_speeds[active],
+                                   light_gaps[active])
+        fleet.move_along(distances, cars[active])
+        left[active] -= times
+        active = active[(left[active] > 0) & (fleet.remaining(cars[active]) > 0)]
+    # the time left is that after the arrival of a car
+    fleet.route_time[cars] += np.where(moving, dt - left, 0)
+
+    # the obstacles in sight at the end of the step, and the velocity which follows (route times are kept above)
+    gaps, lights = obstacles_ahead(car_gaps, leader_speeds, light_gaps, dt, fleet.s[cars] - start)
+    fleet.distance_to_car[cars] = np.where(gaps <= look_ahead, gaps, 0)
+    fleet.distance_to_red_light[cars] = np.where(lights <= look_ahead, lights, 0)
+    view = nav.fleet_view(fleet, cars, exact=True)
+    fleet.distance_to_node[cars] = np.hypot(view[1] - fleet.x[cars], view[2] - fleet.y[cars])
+    update_fleet(fleet, view, 0, cars, jit=jit)
+    return fleet
+
+
+def obstacles_ahead(car_gaps, leader_speeds, light_gaps, elapsed, travelled):
+    """
+    the gaps to the leader and red light of cars some time into a step of integrate_fleet
+
+    :param:      car_gaps: array: gap to the leader at the start of the step (0 where there is none)
+    :param: leader_speeds: array
+    :param:    light_gaps: array: distance to the red light ahead at the start of the step (0 where there is none)
+    :param:       elapsed: double, or array: time since the start of the step
+    :param:     travelled: array: distance travelled since the start of the step
+    :return: gaps, lights: arrays (0 where there is no obstacle)
+    """
+    # obstacles are kept positive, as 0 means there is none
+    gaps = np.where(car_gaps > 0, np.maximum(car_gaps + leader_speeds * elapsed - travelled, 1.0e-9), 0)
+    lights = np.where(light_gaps > 0, np.maximum(light_gaps - travelled, 1.0e-9), 0)
+    return gaps, lights
+
+
+def substep(fleet, cars, left, elapsed, travelled, car_gaps, leader_speeds, light_gaps):
+    """
+    one sub-step of integrate_fleet: how far each car moves, and in how long, before its speed factor may change
+
+    :param:         fleet: object: Fleet object from fleet
+    :param:          cars: array of int: positions of the cars to move
+    :param:          left: array: time left in the step
+    :param:       elapsed: array: time since the start of the step
+    :param:     travelled: array: distance travelled since the start of the step
+    :param:      car_gaps: array: gap to the leader at the start of the step (0 where there is none)
+    :param: leader_speeds: array
+    :param:    light_gaps: array: distance to the red light ahead at the start of the step (0 where there is none)
+    :return: distances, times: arrays: the times are at most the time left
+    """
+    gaps, lights = obstacles_ahead(car_gaps, leader_speeds, light_gaps, elapsed, travelled)
+    seen_cars, seen_lights = np.where(gaps <= look_ahead, gaps, 0), np.where(lights <= look_ahead, lights, 0)
+
+    _, next_x, next_y, angles = nav.fleet_view(fleet, cars, exact=True)
+    dx, dy = next_x - fleet.x[cars], next_y - fleet.y[cars]
+    distance_to_node = np.hypot(dx, dy)
+    last_node = fleet.remaining(cars) == 1
+    factor = update_speed_factors(distance_to_node, seen_cars, seen_lights, angles, last_node)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ux, uy = np.where(distance_to_node > 0, dx / distance_to_node, 0), \
+            np.where(distance_to_node > 0, dy / distance_to_node, 0)
+
+    # a car which cannot move (at a red light) waits for the rest of the step
+    distances, times = np.zeros(len(cars)), left.copy()
+    # the time before a car ahead comes in sight, however fast the car catches up with it
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sighting = np.where(gaps > look_ahead, (gaps - look_ahead) / np.maximum(speed_limit - leader_speeds, 0), np.inf)
+
+    # behind a car in sight: an explicit sub-step, as update_fleet then travel_distances
+    follow = seen_cars > 0
+    h = np.minimum(left, follow_step)
+    vx, vy = ux * speed_limit * factor, uy * speed_limit * factor
+    stalled = np.isclose(0, vx, atol=0.1) & np.isclose(0, vy, atol=0.1)
+    push = stalled & should_accelerate(seen_cars, seen_lights)
+    step = np.hypot(vx + default_acceleration * push, vy + default_acceleration * push) * h
+    for obstacle in (seen_cars, seen_lights):
+        step = np.where(obstacle > 0, np.minimum(step, np.maximum(obstacle - stop_distance, 0)), step)
+    distances, times = np.where(follow, step, distances), np.where(follow, h, times)
+
+    # within free_distance of a red light in sight, or else of a bend, the speed factor is logarithmic
+    theta = np.where(last_node, math.pi / 2, angles)
+    light = ~follow & (seen_lights > stop_distance) & (seen_lights <= free_distance)
+    bend = ~follow & (seen_lights == 0) & (stop_distance < distance_to_node) & (distance_to_node <= free_distance) & \
+        ~np.isclose(theta, 0, rtol=1.0e-1)
+
+    # free flow: at the speed limit, up to the next path point, or free_distance from it, or a car or light in sight
+    free = ~follow & ~light & ~bend & (factor > 0)
+    bounds = np.min([distance_to_node,
+                     np.where(distance_to_node > free_distance, distance_to_node - free_distance, np.inf),
+                     np.where(lights > look_ahead, lights - look_ahead,
+                              np.where(lights > free_distance, lights - free_distance, np.inf)),
+                     sighting * speed_limit], axis=0)
+    # never less than a nanometre, so that rounding cannot hold a car on a boundary
+    jump, reach = np.maximum(bounds, 1.0e-9), speed_limit * left
+    distances = np.where(free, np.minimum(jump, reach), distances)
+    times = np.where(free, np.where(reach <= jump, left, jump / speed_limit), times)
+
+    # along the logarithmic speed factor
+    zone = np.flatnonzero(light | bend)
+    if len(zone):
+        light = light[zone]
+        d = np.where(light, seen_lights[zone], distance_to_node[zone])
+        scale = np.where(light, stop_distance, stop_distance * 2 * theta[zone] / math.pi)
+
+        # a car stalled at a bend gets a push (see update_fleet), which takes it past stop_distance at once
+        with np.errstate(divide='ignore'):
+            stall_speed = 0.1 / np.maximum(np.abs(ux[zone]), np.abs(uy[zone]))
+        stall = scale * np.exp(stall_speed * np.log(free_distance / scale) / speed_limit)
+        # unless a red light ahead comes in sight first
+        end = np.where(light, stop_distance, np.maximum(stop_distance, stall))
+        sight = np.where(lights[zone] > look_ahead, d - np.maximum(lights[zone] - look_ahead, 1.0e-9), -np.inf)
+        end = np.maximum(end, sight)
+
+        duration = np.where(d > end, zone_time(d, scale, np.minimum(end, d)), 0)
+        # at least a microsecond, so that a car about to come in sight cannot hold up the step
+        h = np.minimum(left[zone], np.maximum(sighting[zone], np.minimum(left[zone], 1.0e-6)))
+        reached = duration <= h
+        after = np.where(end > sight, stop_distance - 1.0e-9, end)
+        after[~reached] = zone_reach(d[~reached], scale[~reached], h[~reached])
+        distances[zone], times[zone] = d - after, np.where(reached, duration, h)
+    return distances, times
+
+
+def zone_time(d, scale, end):
+    """
+    the time a car takes from a distance d to a distance end (at most d) from a bend or obstacle, at the speed limit
+    times the speed factor log(d / scale) / log(free_distance / scale) of road_curvature_factors or obstacle_factors
+    (scale is stop_distance for an obstacle). Integrating dd / speed gives exponential integrals of log(d / scale)
+
+    :param       d: array
+    :param   scale: array: at most stop_distance
+    :param     end: array: above scale (the time is inf at scale)
+    :return   time: array
+    """
+    rate = scale * np.log(free_distance / scale) / speed_limit
+    return rate * (models.exponential_integral(np.log(d / scale)) - models.exponential_integral(np.log(end / scale)))
+
+
+def zone_reach(d, scale, time):
+    """
+    the inverse of zone_time: the distance from a bend or obstacle a car starting at d reaches after a time
+
+    :param     d: array
+    :param scale: array
+    :param  time: array
+    :return reach: array
+    """
+    rate = scale * np.log(free_distance / scale) / speed_limit
+    target = models.exponential_integral(np.log(d / scale)) - time / rate
+    # Newton's method on w = log(log(reach / scale)): Ei(exp(w)) is increasing and convex in w, so that every iterate
+    # from the start stays on the side of the root towards d
+    w = np.log(np.log(d / scale))
+    converged = np.zeros(len(w), dtype=bool)
+    for _ in range(100):
+        y = np.exp(w)
+        error = models.exponential_integral(y) - target
+        # each car stops at its own root, so that its reach does not depend on the other cars
+        converged |= np.abs(error) <= 1.0e-12 * np.maximum(np.abs(target), 1)
+        if converged.all():
+            break
+        w = np.where(converged, w, w - error / np.exp(y))
+    return scale * np.exp(np.exp(w))
+
+
+def step_levels(distances, dt, max_level):
+    """
+    the sub-step level of every car for multi-rate integration: a car of level l moves in 2 ** l sub-steps of
+    dt / 2 ** l, the fewest in which it covers at most half the distance between free_distance from its nearest event
+    and itself at the speed limit (the speed factors only vary within free_distance of an event)
+
+    :param: distances: array: distance from each car to its nearest event (inf where there is none)
+    :param:        dt: double
+    :param: max_level: int: the finest level
+    :return:   levels: array of int
+    """
+    reach = speed_limit * dt
+    margin = np.maximum(distances - free_distance, 0) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        levels = np.ceil(np.log2(reach / margin))
+    return np.clip(np.nan_to_num(levels, nan=0, posinf=max_level, neginf=0), 0, max_level).astype(np.int64)
+
+
+def should_accelerate(distance_to_car, distance_to_red_light):
+    """
+    vectorized accelerate: True for the cars which have no red light and no car close ahead
+
+    :param       distance_to_car: array
+    :param distance_to_red_light: array
+    :return                 mask: array of bool
+    """
+    return (distance_to_red_light == 0) & ((distance_to_car == 0) | (distance_to_car > stop_distance))
+
+
+def update_speed_factors(distance_to_node, distance_to_car, distance_to_red_light, angles, last_node):
+    """
+    vectorized update_speed_factor over arrays of car distances
+
+    :param      distance_to_node: array
+    :param       distance_to_car: array: 0 where there is no car obstacle
+    :param distance_to_red_light: array: 0 where there is no red light
+    :param                angles: array: next angle of road curvature for each car
+    :param             last_node: array of bool: True where the next node is the last of the path
+    :return         final_factor: array
+    """
+    curvature_factor = road_curvature_factors(angles, distance_to_node, last_node)
+    car_factor = obstacle_factors(distance_to_car)
+    has_car, has_light = distance_to_car != 0, distance_to_red_light != 0
+
+    nearest_factor = obstacle_factors(np.where(distance_to_car <= distance_to_red_light,
+                                               distance_to_car, distance_to_red_light))
+    weighed_factor = models.weigh_factors(car_factor, curvature_factor, distance_to_car, distance_to_node,
+                                          free_distance)
+    car_only_factor = np.where(distance_to_car > distance_to_node, weighed_factor, car_factor)
+
+    final_factor = np.select([has_car & has_light, has_car, has_light],
+                             [nearest_factor, car_only_factor, obstacle_factors(distance_to_red_light)],
+                             default=curvature_factor)
+    return np.abs(final_factor)
+
+
+def road_curvature_factors(angles, d, last_node):
+    """
+    vectorized road_curvature_factor
+
+    :param        angles: array: angles of road curvature ahead
+    :param             d: array: distances from cars to next node
+    :param     last_node: array of bool: treat the next node like a hard-stop intersection where True
+    :return speed_factor: array
+    """
+    theta = np.where(last_node, math.pi / 2, angles)
+    scale = stop_distance * 2 * theta / math.pi
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bend = np.log(d / scale) / np.log(free_distance / scale)
+    in_range = (stop_distance < d) & (d <= free_distance) & ~np.isclose(theta, 0, rtol=1.0e-1)
+    return np.where(in_range, bend, 1.0)
+
+
+def obstacle_factors(d):
+    """
+    vectorized obstacle_factor
+
+    :param                d: array: distances to obstacles
+    :return obstacle_factor: array
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slow = np.log(d / stop_distance) / math.log(free_distance / stop_distance)
+    return np.where(d <= stop_distance, 0.0, np.where(d <= free_distance, slow, 1.0))
+
+
+def init_random_node_start_location(n, graph, car_id=None, alternate_route=None, processes=None):
     """
     initializes n cars at n random nodes and sets their destinations as a culdesac
 
@@ -194,6 +553,7 @@ def init_random_node_start_location(n, graph, car_id=None, alternate_route=None)
     :param graph: object: OGraph object from osm_request
     :param car_id: None or int: optional, int if you wish to prescribe an alternate route for car
     :param alternate_route: list: optional, list of alternate route nodes for provided car
+    :param processes: None or int: optional, number of worker processes for route initialization (see init_routes)
 
     :return state: dict
     """
@@ -201,7 +561,7 @@ def init_random_node_start_location(n, graph, car_id=None, alternate_route=None)
 
     nodes = nav.find_nodes(graph, n)
 
-    cars_data = []
+    pairs = []
     for i in range(n):
         if i < n - 1:
             origin = nodes[i]
@@ -213,32 +573,14 @@ def init_random_node_start_location(n, graph, car_id=None, alternate_route=None)
             # random routes end at random places too
             random_index = round(random.random() * n)
             destination = nodes[random_index] if random_index != n else nodes[0]
+            pairs.append((origin, destination))
 
-            try:
-                path = nav.get_init_path(graph, origin, destination)
-                route = nav.get_route(graph, origin, destination)
-            except NetworkXNoPath:
-                print('No path between {} and {}.'.format(origin, destination))
-                continue
-
-            x, y = nav.get_position_of_node(graph, origin)
-
-            car = {'object': 'car',
-                   'x': x,
-                   'y': y,
-                   'vx': 0,
-                   'vy': 0,
-                   'route-time': 0,
-                   'origin': origin,
-                   'destination': destination,
-                   'route': route,
-                   'xpath': [path[i][0] for i in range(len(path))],
-                   'ypath': [path[i][1] for i in range(len(path))],
-                   'distance-to-car': 0,
-                   'distance-to-node': 0,
-                   'distance-to-red-light': 0}
-
-            cars_data.append(car)
+    cars_data = []
+    for (origin, destination), routing in zip(pairs, init_routes(graph, pairs, processes=processes)):
+        if routing is None:
+            print('No path between {} and {}.'.format(origin, destination))
+            continue
+        cars_data.append(init_car(graph, origin, destination, *routing))
 
     if alternate_route:
         cars_data[car_id]['route'], cars_data[car_id]['xpath'], cars_data[car_id]['ypath'] = alternate_route
@@ -256,7 +598,7 @@ def init_random_node_start_location(n, graph, car_id=None, alternate_route=None)
     return cars
 
 
-def init_culdesac_start_location(n, graph, car_id=None, alternate_route=None):
+def init_culdesac_start_location(n, graph, car_id=None, alternate_route=None, processes=None):
     """
     initializes N cars into N culdesacs
 
@@ -266,6 +608,7 @@ def init_culdesac_start_location(n, graph, car_id=None, alternate_route=None):
     :param graph: object: OGraph object from osm_request
     :param          car_id:            None or int: optional, int if you wish to prescribe an alternate route for car
     :param alternate_route:                   list: optional, list of alternate route nodes for provided car
+    :param       processes:            None or int: optional, number of worker processes for route initialization
 
     Returns
     _______
@@ -279,40 +622,18 @@ def init_culdesac_start_location(n, graph, car_id=None, alternate_route=None):
         raise ValueError('Number of cars greater than culdesacs to place them. '
                          'Choose a number less than {}'.format(len(culdesacs)))
 
-    cars_data = []
+    # i = 17  # TEMP SETTING
+    """ START TEMP SETTINGS FOR ONE-CAR-ONE-ROUTE STUDY """
+    # destination = 53028190
+    """ END TEMP SETTINGS FOR ONE-CAR-ONE-ROUTE STUDY """
+    pairs = [(culdesacs[i], culdesacs[i + 1]) for i in range(n)]
 
-    for i in range(n):
-        # i = 17  # TEMP SETTING
-        origin = culdesacs[i]
-        destination = culdesacs[i + 1]
-        """ START TEMP SETTINGS FOR ONE-CAR-ONE-ROUTE STUDY """
-        # destination = 53028190
-        """ END TEMP SETTINGS FOR ONE-CAR-ONE-ROUTE STUDY """
-        try:
-            path = nav.get_init_path(graph, origin, destination)
-            route = nav.get_route(graph, origin, destination)
-        except NetworkXNoPath:
+    cars_data = []
+    for (origin, destination), routing in zip(pairs, init_routes(graph, pairs, processes=processes)):
+        if routing is None:
             print('No path between {} and {}.'.format(origin, destination))
             continue
-
-        position = nav.get_position_of_node(graph, origin)
-
-        car = {'object': 'car',
-               'x': position[0],
-               'y': position[1],
-               'vx': 0,
-               'vy': 0,
-               'route-time': 0,
-               'origin': origin,
-               'destination': destination,
-               'route': route,
-               'xpath': [path[i][0] for i in range(len(path))],
-               'ypath': [path[i][1] for i in range(len(path))],
-               'distance-to-car': 0,
-               'distance-to-node': 0,
-               'distance-to-red-light': 0}
-
-        cars_data.append(car)
+        cars_data.append(init_car(graph, origin, destination, *routing))
 
     if alternate_route:
         cars_data[car_id]['route'], cars_data[car_id]['xpath'], cars_data[car_id]['ypath'] = alternate_route
@@ -326,6 +647,118 @@ def init_culdesac_start_location(n, graph, car_id=None, alternate_route=None):
     return cars
 
 
+def init_car(graph, origin, destination, route, path):
+    """
+    builds the dictionary of a car waiting at its origin
+
+    :param       graph: object: OGraph object from osm_request
+    :param      origin:    int: node ID
+    :param destination:    int: node ID
+    :param       route:   list: node IDs from origin to destination
+    :param        path:   list: tuples of the route geometry, as from nav.get_init_path
+    :return        car:   dict
+    """
+    x, y = nav.get_position_of_node(graph, origin)
+
+    car = {'object': 'car',
+           'x': x,
+           'y': y,
+           'vx': 0,
+           'vy': 0,
+           'route-time': 0,
+           'origin': origin,
+           'destination': destination,
+           'route': route,
+           'xpath': [path[i][0] for i in range(len(path))],
+           'ypath': [path[i][1] for i in range(len(path))],
+           'distance-to-car': 0,
+           'distance-to-node': 0,
+           'distance-to-red-light': 0}
+    return car
+
+
+def init_routes(graph, pairs, processes=None):
+    """
+    computes the route and path of many (origin, destination) pairs with one shortest path search per pair.
+    Pairs are grouped by origin so that an origin with several destinations grows a single shortest path tree,
+    and the searches of different origins can fan out across a process pool. Pairs found in the graph's route cache
+    are not searched for, and new routes are added to it, as are the pairs found unreachable (as empty routes).
+
+    :param     graph: object: OGraph object from osm_request
+    :param     pairs:   list: (origin, destination) node ID tuples
+    :param processes: None or int: number of worker processes; None or 1 computes the routes in this process
+    :return  routing:   list: a (route, path) tuple for each pair, or None if there is no path between them
+    """
+    # routes already in the graph's route cache are not searched for again
+    cache = getattr(graph, 'routes', None)
+    cached = {}
+    if cache is not None:
+        for pair in pairs:
+            route = cache.get(*pair)
+            if route is not None:
+                cached[pair] = route
+
+    destinations = {}
+    for origin, destination in pairs:
+        if (origin, destination) not in cached:
+            destinations.setdefault(origin, set()).add(destination)
+    origins = list(destinations)
+
+    if processes and processes > 1 and len(origins) > 1:
+        with ProcessPoolExecutor(max_workers=processes, initializer=set_route_worker_graph,
+                                 initargs=(graph.G,)) as executor:
+            trees = list(executor.map(routes_from_origin, origins, [destinations[o] for o in origins],
+                                      chunksize=max(1, len(origins) // (4 * processes))))
+    else:
+        trees = [routes_from_origin(origin, destinations[origin], graph.G) for origin in origins]
+    routes = dict(zip(origins, trees))
+
+    if cache is not None:
+        # unreachable destinations are cached too, as empty routes, so that they are not searched for again
+        for origin, tree in routes.items():
+            for destination in destinations[origin]:
+                cache.put(origin, destination, tree.get(destination, []))
+        cache.flush()
+
+    routing = []
+    for origin, destination in pairs:
+        route = cached.get((origin, destination))
+        if route is None:
+            route = routes[origin].get(destination)
+        # an empty route is a cached unreachable pair
+        routing.append((route, nav.get_path_along_route(graph, route)) if route else None)
+    return routing
+
+
+_route_worker_G = None
+
+
+def set_route_worker_graph(G):
+    """ Process pool initializer: keep the graph in the worker so that it is only sent once """
+    global _route_worker_G
+    _route_worker_G = G
+
+
+def routes_from_origin(origin, destinations, G=None):
+    """
+    shortest routes (weight=length) from one origin to several destinations
+
+    :param       origin:       node ID
+    :param destinations: set of node IDs
+    :param            G: networkx graph (defaults to the graph of a process pool worker)
+    :return      routes: dict: destination -> route (list of node IDs); unreachable destinations are left out
+    """
+    G = _route_worker_G if G is None else G
+    if len(destinations) == 1:
+        destination = next(iter(destinations))
+        try:
+            return {destination: nx.shortest_path(G, origin, destination, weight='length')}
+        except NetworkXNoPath:
+            return {}
+    paths = nx.single_source_dijkstra_path(G, origin, weight='length')
+    return {destination: paths[destination] for destination in destinations if destination in paths}
+
+
 def init_traffic_lights(graph, prescale=10):
     """
     traffic lights are initialized here
@@ -336,43 +769,35 @@ def init_traffic_lights(graph, prescale=10):
     """
     epsilon = 0.3  # a factor which forces the positions of the light faces to be close to the intersection
 
-    light_nodes = nav.find_traffic_lights(graph, prescale)
-
-    lights_data = []
-
-    for i, light in enumerate(light_nodes):
-
-        node_id = light[0]
-
-        try:
-            out_vectors = np.array(nav.determine_pedigree(graph, node_id))
-        except NetworkXNoPath or ValueError:
-            print('Could not determine pedigree for light at node {}'.format(node_id))
-            continue
-
-        degree = len(out_vectors)
-        position = nav.get_position_of_node(graph, node_id)
-        go = [False, True] * degree * 2
-        go = go[:degree]
-
-        light = {'object': 'light',
-                 'node': node_id,
-                 'degree': degree,
-                 'x': position[0],
-                 'y': position[1],
-                 'switch-counter': 0,
-                 'switch-time': models.determine_traffic_light_timer(degree)
-                 }
-
-        light['out-xpositions'] = [position[0] + epsilon * out_vectors[j][0] for j in range(light['degree'])]
-        light['out-ypositions'] = [position[1] + epsilon * out_vectors[j][1] for j in range(light['degree'])]
-        light['out-xvectors'] = [out_vectors[j][0] for j in range(light['degree'])]
-        light['out-yvectors'] = [out_vectors[j][1] for j in range(light['degree'])]
-        light['go-values'] = np.array([go[j] for j in range(light['degree'])])
-
-        lights_data.append(light)
-
-    lights = pd.DataFrame(lights_data)
+    light_nodes = [node for node, _ in nav.find_traffic_lights(graph, prescale)]
+
+    # the faces of all lights in one pass over the compiled edge geometry
+    degrees, out_vectors = nav.light_faces(graph, light_nodes)
+    positions = graph.compiled.positions_of(light_nodes)
+    face_positions = positions[np.repeat(np.arange(len(light_nodes)), degrees)] + epsilon * out_vectors
+
+    # the faces of each light alternate between stop and go
+    splits = np.cumsum(degrees)[:-1]
+    face_number = np.arange(degrees.sum()) - np.repeat(np.concatenate(([0], splits)), degrees)
+    go = face_number % 2 == 1
+
+    def per_light(values):
+        return [face.tolist() for face in np.split(values, splits)] if len(light_nodes) else []
+
+    lights = pd.DataFrame({
+        'object': 'light',
+        'node': light_nodes,
+        'degree': degrees,
+        'x': positions[:, 0],
+        'y': positions[:, 1],
+        'switch-counter': 0,
+        'switch-time': [models.determine_traffic_light_timer(int(degree)) for degree in degrees],
+        'out-xpositions': per_light(face_positions[:, 0]),
+        'out-ypositions': per_light(face_positions[:, 1]),
+        'out-xvectors': per_light(out_vectors[:, 0]),
+        'out-yvectors': per_light(out_vectors[:, 1]),
+        'go-values': [values.copy() for values in np.split(go, splits)] if len(light_nodes) else [],
+    })
 
     # determine binning and assign bins to lights
     lights['xbin'], lights['ybin'] = models.determine_bins(graph.axis, lights)
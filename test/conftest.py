@@ -0,0 +1,77 @@
+"""
+Shared fixtures: a small synthetic road network, built without OSMnx or a network connection.
+
+The grid has projected coordinates like an OSMnx graph after ox.project_graph, and a share of its edges bend through a
+midpoint geometry, so paths have more points than route nodes.
+"""
+from compiled_graph import CompiledGraph
+import networkx as nx
+import numpy as np
+from osm_request import OGraph
+import pytest
+import random
+from shapely.geometry import LineString
+
+
+def grid_graph(n=8, spacing=120.0, x0=583000.0, y0=4507000.0, seed=0):
+    """
+    :param       n:    int: nodes per side
+    :param spacing: double: distance between neighbouring nodes
+    :param  x0, y0: double: projected coordinates of the first node
+    :param    seed:    int: seed of the choice of bent edges
+    :return      G: networkx MultiDiGraph
+    """
+    rng = random.Random(seed)
+    G = nx.MultiDiGraph(crs='epsg:32618')
+    for i in range(n):
+        for j in range(n):
+            G.add_node(1000 + i * n + j, x=x0 + i * spacing, y=y0 + j * spacing)
+
+    for i in range(n):
+        for j in range(n):
+            for di, dj in ((1, 0), (0, 1)):
+                if i + di >= n or j + dj >= n:
+                    continue
+                u, v = 1000 + i * n + j, 1000 + (i + di) * n + j + dj
+                a, b = (G.nodes[u]['x'], G.nodes[u]['y']), (G.nodes[v]['x'], G.nodes[v]['y'])
+                if rng.random() < 0.3:
+                    middle = ((a[0] + b[0]) / 2 + 7 * dj, (a[1] + b[1]) / 2 + 7 * di)
+                    points = [a, middle, b]
+                    length = float(sum(np.hypot(q[0] - p[0], q[1] - p[1]) for p, q in zip(points, points[1:])))
+                    G.add_edge(u, v, length=length, geometry=LineString(points))
+                    G.add_edge(v, u, length=length, geometry=LineString(points[::-1]))
+                else:
+                    G.add_edge(u, v, length=spacing)
+                    G.add_edge(v, u, length=spacing)
+    return G
+
+
+def make_graph(n=8, **kwargs):
+    """
+    an OGraph over grid_graph, headless and without the local graph store
+
+    :param      n: int: nodes per side
+    :return graph: object: OGraph object
+    """
+    graph = OGraph.__new__(OGraph)
+    graph.query = 'grid'
+    graph.G = grid_graph(n, **kwargs)
+    graph.compiled = CompiledGraph(graph.G)
+    graph.init_graph = None
+    graph.fig, graph.ax = None, None
+    graph.routes = None
+    graph.bounds_axis()
+    return graph
+
+
+@pytest.fixture(scope='session')
+def graph():
+    return make_graph()
+
+
+@pytest.fixture
+def seeded():
+    """ Seeds the random choices of the init functions """
+    random.seed(1)
+    np.random.seed(1)
+    return
@@ -11,13 +11,14 @@ import tqdm
 parser = argparse.ArgumentParser()
 parser.add_argument('-l', '--location', type=str, help='A geocode-able location over which to simulate traffic.')
 parser.add_argument('-t', '--timesteps', type=int, help='The number of timesteps to simulate in the test.')
+parser.add_argument('-e', '--engine', type=str, default='frame', help="The Cars engine to profile: 'frame' or 'array'.")
 
 
-def test_cars_update(timesteps):
+def test_cars_update(timesteps, engine='frame'):
 
     # initialize cars
     init_cars = sim.init_random_node_start_location(100, graph)
-    cars_object = Cars(init_state=init_cars, graph=graph)
+    cars_object = Cars(init_state=init_cars, graph=graph, engine=engine)
 
     # initialize lights
     init_lights = sim.init_traffic_lights(graph, prescale=40)
@@ -50,7 +51,7 @@ if __name__ == '__main__':
     profiler.enable()
 
     # begin test function call
-    test_cars_update(timesteps=args.timesteps or 100)
+    test_cars_update(timesteps=args.timesteps or 100, engine=args.engine)
     # end tests
 
     # end profile
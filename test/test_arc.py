@@ -0,0 +1,55 @@
+from cars import Cars
+import numpy as np
+import pandas as pd
+import pytest
+import simulation as sim
+
+# routes which never share a directed edge, so that neither car ever follows the other
+PAIRS = [(1000, 1063), (1063, 1000)]
+
+
+@pytest.fixture(scope='module')
+def init_state(graph):
+    routings = sim.init_routes(graph, PAIRS)
+    return pd.DataFrame([sim.init_car(graph, origin, destination, *routing)
+                         for (origin, destination), routing in zip(PAIRS, routings)])
+
+
+def travelled(graph, init_state, lights, dt, duration=1.0, every=0.5, max_level=0):
+    """
+    :return distances, cars: the distance travelled by every car every `every` seconds in steps of dt, and the Cars
+    """
+    cars = Cars(init_state.copy(), graph, engine='array', kinematics='arc', max_level=max_level)
+    distances = []
+    for step in range(1, int(round(duration / dt)) + 1):
+        cars.update(dt, lights)
+        assert not cars.fleet.distance_to_car.any()
+        if step % int(round(every / dt)) == 0:
+            distances.append(cars.fleet.s.copy())
+    return np.array(distances), cars
+
+
+@pytest.mark.parametrize('red', [False, True])
+def test_lone_cars_take_the_same_trajectory_whatever_the_step(graph, init_state, seeded, red):
+    lights = sim.init_traffic_lights(graph, prescale=3)
+    if red:
+        # lights only switch between steps, so they are held: the cars wait at the red ones
+        lights['switch-time'] = 0
+    else:
+        lights = lights.iloc[:0]
+
+    reference, cars = travelled(graph, init_state, lights, 1.0e-3)
+    assert (cars.fleet.distance_to_red_light > 0).any() == red
+    for dt in (0.01, 0.1, 0.5):
+        np.testing.assert_allclose(travelled(graph, init_state, lights, dt)[0], reference, rtol=0, atol=1.0e-4)
+
+
+@pytest.mark.parametrize('max_level', [2, 4])
+def test_multirate_keeps_the_trajectory_of_lone_cars(graph, init_state, seeded, max_level):
+    lights = sim.init_traffic_lights(graph, prescale=3)
+    lights['switch-time'] = 0
+
+    reference, _ = travelled(graph, init_state, lights, 1.0e-3)
+    for dt in (0.1, 0.5):
+        np.testing.assert_allclose(travelled(graph, init_state, lights, dt, max_level=max_level)[0], reference,
+                                   rtol=0, atol=1.0e-4)
@@ -0,0 +1,36 @@
+from binning import SpatialBins
+import numpy as np
+
+AXIS = (0.0, 1000.0, 0.0, 600.0)
+
+
+def rebinned(bins, x, y):
+    """ the bins of every object, from scratch """
+    return np.digitize(x, bins.xedges), np.digitize(y, bins.yedges)
+
+
+def test_update_matches_rebinning_from_scratch():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(-100, 1100, 300), rng.uniform(-100, 700, 300)
+    bins = SpatialBins(AXIS, x, y)
+    for _ in range(20):
+        x, y = x + rng.normal(0, 40, 300), y + rng.normal(0, 40, 300)
+        bins.update(x, y)
+        xbin, ybin = rebinned(bins, x, y)
+        np.testing.assert_array_equal(bins.xbin, xbin)
+        np.testing.assert_array_equal(bins.ybin, ybin)
+
+    members = {}
+    for i, key in enumerate(zip(xbin.tolist(), ybin.tolist())):
+        members.setdefault(key, set()).add(i)
+    assert {key: objects for key, objects in bins.members.items() if objects} == members
+    assert all(bins.neighbours(*key) == objects for key, objects in members.items())
+
+
+def test_update_returns_only_the_objects_which_changed_bin():
+    x, y = np.array([10.0, 390.0, 50.0]), np.array([10.0, 10.0, 590.0])
+    bins = SpatialBins(AXIS, x, y)
+    moved = bins.update(x + [5.0, 15.0, 0.0], y)
+    np.testing.assert_array_equal(moved, [1])
+    assert bins.neighbours(*rebinned(bins, 405.0, 10.0)) == {1}
+    assert bins.neighbours(-5, -5) == set()
@@ -0,0 +1,51 @@
+from cars import Cars, TrafficLights
+import domains
+import multiprocessing
+import numpy as np
+import pytest
+import simulation as sim
+
+STATE = ['s', 'x', 'y', 'vx', 'vy', 'route_time', 'distance_to_car', 'distance_to_red_light']
+
+
+def run(init_cars, init_lights, graph, workers, steps=15, dt=0.05):
+    cars = Cars(init_cars.copy(), graph, engine='array', kinematics='arc', workers=workers)
+    lights = TrafficLights(init_lights.copy(), graph)
+    owner = cars.domains.owner.copy() if workers else None
+    for _ in range(steps):
+        lights.update(dt)
+        cars.update(dt, lights.state)
+    state = {name: getattr(cars.fleet, name).copy() for name in STATE}
+    state['cursor'] = cars.fleet.paths.cursor.copy()
+    moved = (cars.domains.owner != owner).sum() if workers else 0
+    cars.close()
+    return state, moved
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+@pytest.mark.parametrize('method', [method for method in ('forkserver', 'spawn')
+                                    if method in multiprocessing.get_all_start_methods()])
+def test_domains_match_a_single_process(graph, seeded, monkeypatch, workers, method):
+    monkeypatch.setattr(domains, 'START_METHOD', method)
+    init_cars = sim.init_random_node_start_location(40, graph)
+    init_lights = sim.init_traffic_lights(graph, prescale=3)
+
+    single, _ = run(init_cars, init_lights, graph, 0)
+    tiled, moved = run(init_cars, init_lights, graph, workers)
+    # cars were handed off between tiles, and some cars followed others
+    assert moved
+    assert (single['distance_to_car'] > 0).any()
+    for name, values in single.items():
+        np.testing.assert_array_equal(tiled[name], values, err_msg=name)
+
+
+def test_border_cars_hold_every_halo(graph, seeded):
+    fleet = Cars(sim.init_random_node_start_location(40, graph), graph, engine='array').fleet
+    tiles = domains.Domains(fleet, graph.axis, 4)
+    width = 150.0
+    tiles.border = tiles.borders(width)
+    for tile, (xmin, xmax, ymin, ymax) in enumerate(tiles.bounds):
+        x, y = fleet.x, fleet.y
+        near = (x >= xmin - width) & (x <= xmax + width) & (y >= ymin - width) & (y <= ymax + width)
+        np.testing.assert_array_equal(tiles.halo(tile, width), np.flatnonzero(near & (tiles.owner != tile)))
+    assert len(tiles.border) < fleet.n
@@ -0,0 +1,73 @@
+from cars import Cars, TrafficLights
+from environment import Env
+import models
+import navigation as nav
+import numpy as np
+import pandas as pd
+import pytest
+import random
+import simulation as sim
+
+COLUMNS = ['x', 'y', 'vx', 'vy', 'route-time', 'distance-to-node', 'distance-to-red-light']
+# routes which cross bent edges and lights, and which the cars do not finish in the run
+PAIRS = [(1009, 1054), (1007, 1056)]
+
+
+def run(init_cars, init_lights, graph, engine, steps=400, dt=1.0e-3):
+    cars = Cars(init_cars.copy(), graph, engine=engine)
+    lights = TrafficLights(init_lights.copy(), graph)
+    red = False
+    for _ in range(steps):
+        cars.update(dt, lights.state)
+        lights.update(dt)
+        red |= bool(cars.state['distance-to-red-light'].astype(float).any())
+    return cars.state, red
+
+
+@pytest.mark.parametrize('seed', [3, 4, 5])
+def test_array_engine_matches_frame_engine(graph, seed):
+    # car-following differs between the engines by design (bins against the edge occupancy index),
+    # so the trajectories are compared for single cars, along routes which meet bends and lights
+    random.seed(seed)
+    np.random.seed(seed)
+    init_lights = sim.init_traffic_lights(graph, prescale=3)
+    seen = False
+    for pair in PAIRS:
+        init_cars = pd.DataFrame([sim.init_car(graph, *pair, *sim.init_routes(graph, [pair])[0])])
+        init_cars['xbin'], init_cars['ybin'] = models.determine_bins(graph.axis, init_cars)
+
+        frame, red = run(init_cars, init_lights, graph, 'frame')
+        array, _ = run(init_cars, init_lights, graph, 'array')
+        seen |= red
+        assert np.hypot(*(frame[['x', 'y']].to_numpy(float) - init_cars[['x', 'y']].to_numpy(float))[0]) > 20
+        np.testing.assert_array_equal(frame[COLUMNS].to_numpy(float), array[COLUMNS].to_numpy(float))
+        assert [len(path) for path in frame['xpath']] == [len(path) for path in array['xpath']]
+    assert seen
+
+
+def test_array_engine_state_has_frame_layout(graph, seeded):
+    init_cars = sim.init_random_node_start_location(10, graph)
+    init_lights = sim.init_traffic_lights(graph, prescale=10)
+    state, _ = run(init_cars, init_lights, graph, 'array', steps=5)
+    assert list(state.columns) == list(init_cars.columns)
+    assert state.index.equals(init_cars.index)
+
+
+def test_unknown_engine(graph, seeded):
+    init_cars = sim.init_random_node_start_location(3, graph)
+    with pytest.raises(ValueError):
+        Cars(init_cars, graph, engine='vector')
+
+
+def test_env_reads_the_end_of_route_from_the_fleet(graph, seeded):
+    env = Env(n=6, graph=graph, agent=0, dt=0.01, kinematics='arc')
+    cars = env.cars_object
+    env.agent = cars.state.index[0]
+    for _ in range(5):
+        cars.update(env.dt, env.lights_object.state)
+        assert env.end_of_route() == nav.FrontView(cars.state.loc[env.agent], graph).end_of_route()
+
+    car = cars.fleet.index.get_loc(env.agent)
+    cars.fleet.x[car], cars.fleet.y[car] = cars.fleet.destination[car] + 1.0
+    assert env.end_of_route()
+    cars.close()
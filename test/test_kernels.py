@@ -0,0 +1,37 @@
+from cars import Cars, TrafficLights
+import kernels
+import numpy as np
+import pytest
+import simulation as sim
+
+COLUMNS = ['x', 'y', 'vx', 'vy', 'route-time']
+
+
+def run(init_cars, init_lights, graph, jit, kinematics, max_level, steps=100, dt=1.0e-2):
+    cars = Cars(init_cars.copy(), graph, engine='array', kinematics=kinematics, max_level=max_level, jit=jit)
+    assert cars.jit == jit
+    lights = TrafficLights(init_lights.copy(), graph)
+    for _ in range(steps):
+        cars.update(dt, lights.state)
+        lights.update(dt)
+    return cars.state
+
+
+@pytest.mark.parametrize('kinematics, max_level', [('point', 0), ('arc', 0), ('arc', 2)])
+def test_kernels_match_numpy(graph, seeded, monkeypatch, kinematics, max_level):
+    # without Numba the kernels are plain Python functions, which run the same code as the compiled ones
+    monkeypatch.setattr(kernels, 'available', True)
+    init_cars = sim.init_random_node_start_location(20, graph)
+    init_lights = sim.init_traffic_lights(graph, prescale=3)
+
+    numpy = run(init_cars, init_lights, graph, False, kinematics, max_level)
+    jit = run(init_cars, init_lights, graph, True, kinematics, max_level)
+    np.testing.assert_allclose(jit[COLUMNS].to_numpy(float), numpy[COLUMNS].to_numpy(float),
+                               rtol=kernels.TOLERANCE, atol=kernels.TOLERANCE)
+    assert [len(path) for path in jit['xpath']] == [len(path) for path in numpy['xpath']]
+
+
+def test_kernels_need_the_array_engine(graph, seeded):
+    init_cars = sim.init_random_node_start_location(3, graph)
+    with pytest.raises(ValueError):
+        Cars(init_cars, graph, jit=True)
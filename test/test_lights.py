@@ -0,0 +1,92 @@
+from cars import TrafficLights
+import models
+import navigation as nav
+import numpy as np
+import pytest
+import random
+import simulation as sim
+
+
+@pytest.fixture
+def lights(graph):
+    return sim.init_traffic_lights(graph, prescale=10)
+
+
+def test_event_clock_keeps_fractions_of_a_tick(graph, lights):
+    # 1.5 ticks per step: rounding every step would run the clock a third fast
+    events = TrafficLights(lights.copy(), graph, engine='event', tick=1.0e-3)
+    for _ in range(1000):
+        events.update(1.5e-3)
+    assert events.clock == 1500
+    assert events.time_elapsed == pytest.approx(1.5)
+
+
+def test_event_clock_counts_whole_ticks(graph, lights):
+    # dt / tick is a whole number up to rounding error (1.0e-3 / 1.0e-6 == 999.9999999999999)
+    events = TrafficLights(lights.copy(), graph, engine='event')
+    for _ in range(250):
+        events.update(1.0e-3)
+    assert events.clock == 250000
+
+
+def test_event_engine_switches_on_time(graph, lights):
+    lights = lights.copy()
+    lights['switch-time'] = 1.0
+    events = TrafficLights(lights, graph, engine='event', tick=1.0e-3)
+    start = events.face_go_values().copy()
+    for _ in range(3):
+        events.update(0.3)
+    np.testing.assert_array_equal(events.face_go_values(), start)
+    events.update(0.3)
+    np.testing.assert_array_equal(events.face_go_values(), ~start)
+
+
+def test_unknown_lights_engine(graph, lights):
+    with pytest.raises(ValueError):
+        TrafficLights(lights, graph, engine='vector')
+
+
+def pedigree_lights(graph, prescale):
+    """ the lights as init_traffic_lights built them from determine_pedigree, one shortest path per out road """
+    epsilon = 0.3
+    lights = []
+    for node_id, _ in nav.find_traffic_lights(graph, prescale):
+        x, y = nav.get_position_of_node(graph, node_id)
+        vectors = []
+        for node in graph.G[node_id]:
+            try:
+                out_x, out_y = nav.shortest_path_lines_nx(graph, node_id, node)[0][1]
+            except IndexError:
+                continue
+            vectors.append((out_x - x, out_y - y))
+        degree = len(vectors)
+        go = ([False, True] * degree * 2)[:degree]
+        lights.append({'node': node_id,
+                       'degree': degree,
+                       'x': x,
+                       'y': y,
+                       'switch-time': models.determine_traffic_light_timer(degree),
+                       'out-xpositions': [x + epsilon * vector[0] for vector in vectors],
+                       'out-ypositions': [y + epsilon * vector[1] for vector in vectors],
+                       'out-xvectors': [vector[0] for vector in vectors],
+                       'out-yvectors': [vector[1] for vector in vectors],
+                       'go-values': np.array(go)})
+    return lights
+
+
+@pytest.mark.parametrize('prescale', [1, 3])
+def test_light_faces_match_the_pedigree(graph, seeded, prescale):
+    expected = pedigree_lights(graph, prescale)
+    random.seed(1)
+    np.random.seed(1)
+    lights = sim.init_traffic_lights(graph, prescale=prescale)
+
+    assert len(expected) > 1
+    assert list(lights['node']) == [light['node'] for light in expected]
+    for light, old in zip(lights.to_dict('records'), expected):
+        assert light['degree'] == old['degree']
+        assert light['switch-time'] == old['switch-time']
+        assert (light['x'], light['y']) == pytest.approx((old['x'], old['y']))
+        for column in ('out-xpositions', 'out-ypositions', 'out-xvectors', 'out-yvectors'):
+            np.testing.assert_allclose(light[column], old[column], rtol=0, atol=1e-9)
+        np.testing.assert_array_equal(light['go-values'], old['go-values'])
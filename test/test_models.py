@@ -0,0 +1,58 @@
+import models
+import numpy as np
+import pytest
+import warnings
+
+# a segment from (0, 0) to (10, 0)
+SEGMENT = (0.0, 0.0, 10.0, 0.0)
+
+
+@pytest.mark.parametrize('px, py, along, lateral', [
+    (0.0, 0.0, 0.0, 0.0),      # the start
+    (10.0, 0.0, 10.0, 0.0),    # the end
+    (4.0, -3.0, 4.0, 3.0),     # beside the segment
+    (-2.0, 1.0, -2.0, 1.0),    # behind the start
+    (13.0, 4.0, 13.0, 4.0),    # beyond the end
+])
+def test_segment_projection(px, py, along, lateral):
+    projected = models.segment_projection(px, py, *SEGMENT)
+    np.testing.assert_allclose(projected, (along, lateral, 10.0))
+
+
+@pytest.mark.parametrize('px, py, expected', [
+    (0.0, 0.0, False),    # the start is not ahead of itself
+    (0.5, 0.0, True),
+    (10.0, 0.0, True),    # the end
+    (10.0, 1.0, True),    # within the width of the end
+    (10.0, 1.5, False),
+    (11.0, 0.0, True),    # within the width past the end
+    (11.5, 0.0, False),   # beyond the end
+    (-0.5, 0.0, False),   # behind the start
+    (5.0, -1.5, False),
+])
+def test_on_segment(px, py, expected):
+    assert models.on_segment(*models.segment_projection(px, py, *SEGMENT)) == expected
+
+
+def test_zero_length_segments():
+    # a car standing on its next node: points are as far from the segment as from its start, and never on it
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        along, lateral, length = models.segment_projection(np.array([3.0, 5.0]), np.array([4.0, 5.0]), 5.0, 5.0,
+                                                           bx=5.0, by=5.0)
+        mask = models.on_segment(along, lateral, length)
+    np.testing.assert_array_equal(along, [0.0, 0.0])
+    np.testing.assert_allclose(lateral, [np.hypot(2.0, 1.0), 0.0])
+    assert length == 0.0
+    np.testing.assert_array_equal(mask, [False, False])
+
+
+def test_projection_broadcasts_over_a_fleet():
+    # three cars, each heading to its own node, against one obstacle
+    ax, ay = np.array([0.0, 0.0, 20.0]), np.array([0.0, 5.0, 0.0])
+    bx, by = np.array([10.0, 0.0, 20.0]), np.array([0.0, 15.0, 0.0])
+    along, lateral, length = models.segment_projection(0.0, 10.0, ax, ay, bx, by)
+    np.testing.assert_allclose(along, [0.0, 5.0, 0.0])
+    np.testing.assert_allclose(lateral, [10.0, 0.0, np.hypot(20.0, 10.0)])
+    np.testing.assert_allclose(length, [10.0, 10.0, 0.0])
+    np.testing.assert_array_equal(models.on_segment(along, lateral, length), [False, True, False])
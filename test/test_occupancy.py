@@ -0,0 +1,91 @@
+import navigation as nav
+import numpy as np
+from occupancy import EdgeOccupancy
+from path_store import PathStore
+import pytest
+import random
+import simulation as sim
+
+
+def nearest_vertices(paths, i, route, compiled):
+    """ the per-car search of route nodes along a path, which assign_edges does without a loop for built paths """
+    points = paths.points[paths.offsets[i]:paths.offsets[i + 1]]
+    vertices, vertex = [], 0
+    for node in compiled.positions_of(route):
+        vertex += np.argmin(np.hypot(*(points[vertex:] - node).T))
+        vertices.append(vertex)
+    return np.array(vertices)
+
+
+def route_store(graph, routes, trim=()):
+    paths = [nav.get_path_along_route(graph, route) for route in routes]
+    paths = [path[2:] if i in trim else path for i, path in enumerate(paths)]
+    store = PathStore([[p[0] for p in path] for path in paths], [[p[1] for p in path] for path in paths])
+    store.assign_edges(routes, graph.compiled)
+    return store
+
+
+def random_routes(graph, n, seed=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    return list(sim.init_random_node_start_location(n, graph)['route'])
+
+
+@pytest.mark.parametrize('trim', [(), (0, 3, 4, 9)])
+def test_assign_edges(graph, trim):
+    # trimmed paths no longer start at their route's origin, and are searched node by node
+    routes = random_routes(graph, 12)
+    routes[5] = routes[5][::-1][:1] + routes[5][1:]  # not along graph edges: untracked
+    paths = route_store(graph, routes, trim)
+    compiled = graph.compiled
+
+    for i, route in enumerate(routes):
+        start, stop = paths.offsets[i], paths.offsets[i + 1]
+        if i == 5 or stop - start < 2 or len(route) < 2:
+            assert (paths.edges[start:stop] == -1).all()
+            continue
+        vertices = nearest_vertices(paths, i, route, compiled)
+        np.testing.assert_array_equal(np.flatnonzero(paths.nodes[start:stop] >= 0), np.unique(vertices))
+        np.testing.assert_array_equal(paths.nodes[start + vertices[-1]], compiled.index_of(route[-1]))
+        # the edges of a path follow its route, and edge_arc restarts at every node
+        route_edges = list(compiled.route_edges(route))
+        order = [route_edges.index(edge) for edge in paths.edges[start + 1:stop]]
+        assert order == sorted(order)
+        if i not in trim:
+            assert set(order) == set(range(len(route_edges)))
+        ends = paths.edge_end[start + 1:stop]
+        np.testing.assert_allclose(paths.edge_arc[start + 1:stop],
+                                   paths.arc[start + 1:stop] - paths.arc[ends] + paths.edge_arc[ends])
+
+
+def test_leaders_same_edge_and_next_edge():
+    occupancy = EdgeOccupancy(4)
+    edges = np.array([3, 3, 7, -1])
+    offsets = np.array([10.0, 40.0, 5.0, 0.0])
+    next_edges = np.array([7, 7, -1, -1])
+    lengths = np.array([100.0, 100.0, 50.0, 0.0])
+    occupancy.update(edges, offsets, next_edges, lengths)
+
+    leader, gap = occupancy.leaders()
+    np.testing.assert_array_equal(leader, [1, 2, -1, -1])
+    np.testing.assert_allclose(gap, [30.0, 100.0 - 40.0 + 5.0, np.inf, np.inf])
+
+    leader, gap = occupancy.leaders(look_ahead=50)
+    np.testing.assert_array_equal(leader, [1, -1, -1, -1])
+
+
+def test_gaps_are_arc_lengths_along_the_path(graph):
+    # two cars on one route, on either side of a node: the gap is the difference of their distances along the path
+    route = nav.get_route(graph, 1000, 1063)
+    paths = route_store(graph, [route, route])
+    node = np.flatnonzero(paths.nodes[:paths.lengths[0]] >= 0)[1]
+    s = paths.arc[node] + np.array([-5.0, 7.0])
+    x, y, paths.cursor[:] = paths.locate(s)
+
+    occupancy = EdgeOccupancy(2)
+    edges, offsets, next_edges, lengths = paths.edge_positions(x, y)
+    assert next_edges[0] == edges[1]
+    occupancy.update(edges, offsets, next_edges, lengths)
+    leader, gap = occupancy.leaders()
+    assert leader[0] == 1
+    assert gap[0] == pytest.approx(12.0)
@@ -0,0 +1,52 @@
+from compiled_graph import CompiledGraph
+import json
+import numpy as np
+import os
+from osm_request import OGraph
+import pytest
+from test.conftest import grid_graph
+
+
+@pytest.fixture
+def cached(tmp_path):
+    """ an OGraph over a local .graphml file, with its compiled cache written """
+    graph = OGraph.__new__(OGraph)
+    graph.store = str(tmp_path)
+    graph.graph_name = 'grid.graphml'
+    graph.cache = os.path.join(graph.store, 'grid.compiled')
+    with open(os.path.join(graph.store, graph.graph_name), 'w') as f:
+        f.write('<graphml/>')
+    G = grid_graph(4)
+    graph.write_cache(G, CompiledGraph(G), graph.source_hash())
+    return graph, G
+
+
+def test_cache_round_trip(cached):
+    graph, G = cached
+    loaded, compiled = graph.read_cache(graph.source_hash())
+    assert sorted(loaded.edges(keys=True)) == sorted(G.edges(keys=True))
+    assert compiled.fingerprint() == CompiledGraph(G).fingerprint()
+    np.testing.assert_array_equal(compiled.geometry, CompiledGraph(G).geometry)
+
+
+def test_stale_cache_is_not_read(cached):
+    graph, _ = cached
+    assert graph.read_cache('another source') is None
+    assert graph.read_cache(None) is None
+
+    meta_file = os.path.join(graph.cache, 'meta.json')
+    with open(meta_file) as f:
+        meta = json.load(f)
+    # a cache written before the schema field
+    with open(meta_file, 'w') as f:
+        json.dump({'source': meta['source'], 'graph': meta['graph']}, f)
+    assert graph.read_cache(graph.source_hash()) is None
+
+
+@pytest.mark.parametrize('damaged', ['graph.pickle', 'edge_length.npy', 'meta.json'])
+def test_damaged_cache_is_not_read(cached, damaged):
+    graph, _ = cached
+    with open(os.path.join(graph.cache, damaged), 'r+b') as f:
+        f.seek(os.path.getsize(f.name) // 2)
+        f.truncate()
+    assert graph.read_cache(graph.source_hash()) is None
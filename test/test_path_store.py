@@ -0,0 +1,84 @@
+import numpy as np
+from path_store import PathStore
+
+XPATHS = [[0.0, 3.0, 3.0, 10.0], [], [5.0, 6.0], [1.0]]
+YPATHS = [[0.0, 4.0, 8.0, 8.0], [], [5.0, 5.0], [1.0]]
+
+
+def test_buffer_layout():
+    paths = PathStore(XPATHS, YPATHS)
+    assert len(paths) == 4
+    np.testing.assert_array_equal(paths.lengths, [4, 0, 2, 1])
+    np.testing.assert_array_equal(paths.offsets, [0, 4, 4, 6, 7])
+    np.testing.assert_allclose(paths.arc[:4], [0, 5, 9, 16])
+    np.testing.assert_allclose(paths.totals, [16, 0, 1, 0])
+
+
+def test_cursor_matches_list_slicing():
+    paths = PathStore(XPATHS, YPATHS)
+    paths.advance(np.array([True, False, True, False]))
+    np.testing.assert_array_equal(paths.remaining(), [3, 0, 1, 1])
+
+    x, y, valid = paths.upcoming(0)
+    np.testing.assert_array_equal(valid, [True, False, True, True])
+    np.testing.assert_array_equal(x[valid], [3.0, 6.0, 1.0])
+    np.testing.assert_array_equal(y[valid], [4.0, 5.0, 1.0])
+
+    x, y, valid = paths.upcoming(2)
+    np.testing.assert_array_equal(valid, [True, False, False, False])
+    assert (x[0], y[0]) == (10.0, 8.0)
+    np.testing.assert_array_equal(paths.remaining_path(0), [[3.0, 4.0], [3.0, 8.0], [10.0, 8.0]])
+
+
+def test_subset_matches_whole_fleet():
+    paths = PathStore(XPATHS, YPATHS)
+    cars = np.array([2, 0])
+    for k in range(3):
+        whole, subset = paths.upcoming(k), paths.upcoming(k, cars)
+        for a, b in zip(whole, subset):
+            np.testing.assert_array_equal(a[cars], b)
+    np.testing.assert_array_equal(paths.remaining(cars), paths.remaining()[cars])
+
+
+def test_locate_rolls_over_points():
+    paths = PathStore(XPATHS, YPATHS)
+    x, y, cursor = paths.locate(np.array([7.0, 3.0, 0.5, 2.0]))
+    # 2 past the second point of the first path, on the vertical segment
+    np.testing.assert_allclose((x[0], y[0]), (3.0, 6.0))
+    assert cursor[0] == 2
+    # past the end of a path, a car stays at its last point and its cursor is at the path length
+    x, y, cursor = paths.locate(np.array([100.0, 0.0, 100.0, 0.0]))
+    np.testing.assert_allclose((x[0], y[0], x[2], y[2]), (10.0, 8.0, 6.0, 5.0))
+    np.testing.assert_array_equal(cursor, [4, 0, 2, 1])
+
+
+def test_locate_subset():
+    paths = PathStore(XPATHS, YPATHS)
+    s = np.array([7.0, 0.0, 0.5, 0.0])
+    cars = np.array([0, 2])
+    whole, subset = paths.locate(s), paths.locate(s[cars], cars)
+    for a, b in zip(whole, subset):
+        np.testing.assert_array_equal(a[cars], b)
+
+
+def test_locate_paths_without_points():
+    paths = PathStore(XPATHS, YPATHS)
+    x, y, cursor = paths.locate(np.array([7.0, 1.0, 0.5, 1.0]))
+    # nowhere on an empty path, and at its only point on a path of one point
+    assert np.isnan(x[1]) and np.isnan(y[1])
+    assert (x[3], y[3], cursor[3]) == (1.0, 1.0, 1)
+
+    empty = PathStore([[], []], [[], []])
+    x, y, cursor = empty.locate(np.array([0.0, 5.0]))
+    assert np.isnan(x).all() and np.isnan(y).all()
+    np.testing.assert_array_equal(cursor, [0, 0])
+
+
+def test_distance_to_bend_with_an_empty_last_path():
+    s = np.array([1.0, 0.5, 0.0])
+    paths = PathStore(XPATHS[:1] + XPATHS[2:3] + [[]], YPATHS[:1] + YPATHS[2:3] + [[]])
+    distances = paths.distance_to_bend(s)
+    assert distances[2] == 0.0
+    np.testing.assert_array_equal(distances[:2], PathStore(XPATHS[:1] + XPATHS[2:3], YPATHS[:1] + YPATHS[2:3])
+                                  .distance_to_bend(s[:2]))
+    np.testing.assert_array_equal(paths.distance_to_bend(s[[2, 0]], np.array([2, 0])), distances[[2, 0]])
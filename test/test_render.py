@@ -0,0 +1,114 @@
+from cars import Cars, TrafficLights
+import io
+import numpy as np
+import pytest
+import random
+import render
+from render import RGB_BLUE, RGB_GREEN, RGB_RED, Rasterizer
+import shutil
+import simulation as sim
+import subprocess
+from test.conftest import make_graph
+
+WHITE = np.array([255, 255, 255], dtype=np.uint8)
+
+# one pixel per metre: x in [0, 100) are the columns, y in (0, 50] the rows from the top
+AXIS = (0.0, 100.0, 0.0, 50.0)
+
+
+@pytest.fixture
+def basemap():
+    return np.full((50, 100, 4), 255, dtype=np.uint8)
+
+
+@pytest.fixture
+def recording(graph):
+    """ a few recorded frames of cars driving on the synthetic grid """
+    random.seed(2)
+    np.random.seed(2)
+    cars = Cars(sim.init_random_node_start_location(6, graph), graph, engine='array')
+    lights = TrafficLights(sim.init_traffic_lights(graph, prescale=3), graph)
+    return render.record(cars, lights, n_frames=7, dt=0.01)
+
+
+@pytest.fixture
+def headless(tmp_path):
+    """ the graph of the recording, with its basemap cached in tmp_path """
+    graph = make_graph()
+    graph.store, graph.graph_name = str(tmp_path), 'grid.graphml'
+    return graph
+
+
+class Pipe:
+    """ stands in for the FFmpeg process, keeping what is written to its stdin """
+    def __init__(self, command, stdin=None):
+        self.command = command
+        self.stdin = io.BytesIO()
+        self.stdin.close = lambda: None
+        self.returncode = 0
+        Pipe.last = self
+
+    def wait(self):
+        return self.returncode
+
+
+def test_rasterizer_stamps_known_pixels(basemap):
+    rasterizer = Rasterizer(basemap, AXIS, light_positions=[(20.5, 40.5)], face_positions=[(50.5, 25.5), (70.5, 25.5)])
+    # the second car is too near the edge of the frame for its whole square
+    frame = rasterizer.draw([(10.5, 10.5), (0.2, 0.2)], [True, False])
+
+    assert frame.shape == (50, 100, 3) and frame.dtype == np.uint8
+    np.testing.assert_array_equal(frame[9, 20], RGB_RED)
+    np.testing.assert_array_equal(frame[23:26, 49:52], np.broadcast_to(RGB_GREEN, (3, 3, 3)))
+    np.testing.assert_array_equal(frame[23:26, 69:72], np.broadcast_to(RGB_RED, (3, 3, 3)))
+    np.testing.assert_array_equal(frame[38:41, 9:12], np.broadcast_to(RGB_BLUE, (3, 3, 3)))
+
+    # nothing else is drawn: a light pixel, two face squares and one car square
+    assert (frame != WHITE).any(axis=-1).sum() == 1 + 2 * 9 + 9
+    np.testing.assert_array_equal(rasterizer.background, basemap[..., :3])
+
+
+def test_render_frame_blits_what_a_full_draw_shows(basemap):
+    render.init_renderer(basemap, AXIS, np.array([(20.5, 40.5)]), np.array([(50.5, 25.5), (70.5, 25.5)]), 100, 2)
+    frame = render.render_frame(np.array([(10.5, 10.5), (60.5, 30.5)]), np.array([True, False]))
+
+    canvas, _, _, cars, faces = render._renderer
+    cars.set_animated(False)
+    faces.set_animated(False)
+    canvas.draw()
+    assert frame == bytes(canvas.buffer_rgba())
+
+
+@pytest.mark.parametrize('movie', ['render', 'rasterize'])
+def test_movies_write_every_frame(recording, headless, tmp_path, monkeypatch, movie):
+    monkeypatch.setattr(subprocess, 'Popen', Pipe)
+    if movie == 'render':
+        render.render_movie(recording, headless, str(tmp_path / 'traffic.mp4'), processes=2, window=3)
+        channels = 4
+    else:
+        render.rasterize_movie(recording, headless, str(tmp_path / 'traffic.mp4'))
+        channels = 3
+
+    width, height = map(int, Pipe.last.command[Pipe.last.command.index('-s') + 1].split('x'))
+    written = Pipe.last.stdin.getvalue()
+    assert len(written) == len(recording) * width * height * channels
+
+    # the frames arrive in order: each differs from the next only where the cars moved
+    frames = np.frombuffer(written, dtype=np.uint8).reshape(len(recording), height, width, channels)
+    assert all((frames[i] != frames[i + 1]).any() for i in range(len(recording) - 1))
+
+
+def test_recording_has_one_frame_per_update(recording):
+    assert len(recording) == 7
+    assert len({positions.shape for positions in recording.car_positions}) == 1
+    assert all(len(go) == len(recording.face_positions) for go in recording.face_go_values)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None, reason='needs FFmpeg')
+def test_ffmpeg_encodes_every_frame(recording, headless, tmp_path):
+    path = str(tmp_path / 'traffic.mp4')
+    render.rasterize_movie(recording, headless, path)
+    frames = subprocess.run(['ffprobe', '-v', 'error', '-count_frames', '-select_streams', 'v:0',
+                             '-show_entries', 'stream=nb_read_frames', '-of', 'csv=p=0', path],
+                            capture_output=True, text=True, check=True).stdout
+    assert int(frames) == len(recording)
@@ -0,0 +1,77 @@
+import gc
+import networkx as nx
+import pytest
+from route_cache import RouteCache
+import sqlite3
+
+
+@pytest.fixture
+def G():
+    G = nx.DiGraph()
+    G.add_edge(1, 2, length=1.0)
+    G.add_edge(2, 3, length=1.0)
+    G.add_edge(1, 3, length=5.0)
+    G.add_node(4)
+    return G
+
+
+def stored(path):
+    """ the number of routes committed to the store """
+    connection = sqlite3.connect(path)
+    count = connection.execute('SELECT COUNT(*) FROM routes').fetchone()[0]
+    connection.close()
+    return count
+
+
+def test_routes_are_cached_and_persisted(G, tmp_path):
+    path = str(tmp_path / 'routes.sqlite')
+    with RouteCache(path, 'graph') as cache:
+        assert cache.route(G, 1, 3) == [1, 2, 3]
+        assert cache.route(G, 1, 3) == [1, 2, 3]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    warm = RouteCache(path, 'graph')
+    assert warm.get(1, 3) == [1, 2, 3]
+    assert warm.get(1, 3, weight='time') is None
+    assert RouteCache(path, 'other graph').get(1, 3) is None
+
+
+def test_unreachable_pairs_are_cached(G, tmp_path):
+    cache = RouteCache(str(tmp_path / 'routes.sqlite'), 'graph')
+    with pytest.raises(nx.NetworkXNoPath):
+        cache.route(G, 1, 4)
+    assert cache.get(1, 4) == []
+
+    G.add_edge(3, 4)
+    # the negative entry is trusted: the cache belongs to one graph fingerprint
+    with pytest.raises(nx.NetworkXNoPath):
+        cache.route(G, 1, 4)
+    cache.close()
+
+
+def test_routes_are_flushed_in_batches(G, tmp_path):
+    path = str(tmp_path / 'routes.sqlite')
+    cache = RouteCache(path, 'graph', flush_every=2)
+    cache.put(1, 2, [1, 2])
+    assert stored(path) == 0
+    cache.put(2, 3, [2, 3])
+    assert stored(path) == 2
+    cache.put(1, 3, [1, 2, 3])
+    cache.close()
+    assert stored(path) == 3
+
+    # a closed cache still answers from memory
+    assert cache.get(1, 3) == [1, 2, 3]
+    cache.put(3, 2, [])
+    assert cache.get(3, 2) == []
+
+
+def test_collected_cache_is_flushed(G, tmp_path):
+    path = str(tmp_path / 'routes.sqlite')
+    cache = RouteCache(path, 'graph')
+    cache.put(1, 2, [1, 2])
+    finalizer = cache.finalizer
+    del cache
+    gc.collect()
+    assert not finalizer.alive
+    assert stored(path) == 1
@@ -0,0 +1,91 @@
+import models
+import navigation as nav
+import numpy as np
+from path_store import PathStore
+import pytest
+from route_lights import RouteLights
+import simulation as sim
+
+
+@pytest.fixture
+def setup(graph):
+    # along the edge of the grid, through a light at every node (prescale=1)
+    routes = [nav.get_route(graph, 1000, 1007), nav.get_route(graph, 1007, 1000), nav.get_route(graph, 1000, 1063)]
+    paths = [nav.get_path_along_route(graph, route) for route in routes]
+    store = PathStore([[p[0] for p in path] for path in paths], [[p[1] for p in path] for path in paths])
+    store.assign_edges(routes, graph.compiled)
+    lights = sim.init_traffic_lights(graph, prescale=1)
+    return store, lights, RouteLights(store, lights, graph.compiled), routes
+
+
+def test_index_holds_the_lights_along_each_route(setup):
+    store, lights, index, routes = setup
+    for i, route in enumerate(routes):
+        entries = np.arange(index.offsets[i], index.offsets[i + 1])
+        # every node but the origin, in path order
+        np.testing.assert_array_equal(lights['node'].to_numpy()[index.light[entries]], route[1:])
+        assert (np.diff(index.point[entries]) > 0).all()
+
+        # the governing face points back along the road the car arrives on
+        faces = index.face[entries]
+        assert (faces >= 0).all()
+        vectors = np.column_stack((np.concatenate(lights['out-xvectors'].to_numpy()),
+                                   np.concatenate(lights['out-yvectors'].to_numpy())))[faces]
+        approach = store.points[index.point[entries]] - store.points[index.point[entries] - 1]
+        assert models.anti_parallel_mask(approach, vectors).all()
+
+
+def test_red_light_distances(setup):
+    store, lights, index, _ = setup
+    faces = sum(lights['degree'])
+    x, y, store.cursor[:] = store.locate(np.array([10.0, 10.0, 10.0]))
+    first = store.offsets[:-1] + store.cursor
+    ahead = np.hypot(store.points[first, 0] - x, store.points[first, 1] - y) \
+        + store.arc[index.point[index.offsets[:-1]]] - store.arc[first]
+
+    np.testing.assert_array_equal(index.red_light_distances(store, x, y, np.ones(faces, dtype=bool)), 0)
+    red = index.red_light_distances(store, x, y, np.zeros(faces, dtype=bool))
+    np.testing.assert_allclose(red, ahead)
+    np.testing.assert_allclose(red, 110.0, atol=10)
+    np.testing.assert_array_equal(index.red_light_distances(store, x, y, np.zeros(faces, dtype=bool), 50), 0)
+
+    cars = np.array([2, 0])
+    np.testing.assert_array_equal(
+        index.red_light_distances(store, x[cars], y[cars], np.zeros(faces, dtype=bool), cars=cars), red[cars])
+
+
+def test_next_lights_skip_crossed_lights(setup):
+    store, _, index, _ = setup
+    x, y, store.cursor[:] = store.locate(np.array([250.0, 0.0, 0.0]))
+    entry, valid = index.next_lights(store)
+    assert valid.all()
+    # past the first two nodes of the first route, its next light is the third entry
+    assert entry[0] == index.offsets[0] + 2
+    np.testing.assert_array_equal(entry[1:], index.offsets[1:-1])
+
+    x, y, store.cursor[:] = store.locate(store.totals + 1)
+    _, valid = index.next_lights(store)
+    assert not valid.any()
+
+
+def test_segment_red_light_distances(setup):
+    store, lights, index, _ = setup
+    faces = sum(lights['degree'])
+    x, y, store.cursor[:] = store.locate(np.array([10.0, 10.0, 10.0]))
+    first = store.offsets[:-1] + store.cursor
+    red = index.segment_red_light_distances(store, x, y, store.points[first, 0], store.points[first, 1],
+                                            np.zeros(faces, dtype=bool))
+    np.testing.assert_allclose(red, 110.0)
+    np.testing.assert_array_equal(index.segment_red_light_distances(
+        store, x, y, store.points[first, 0], store.points[first, 1], np.ones(faces, dtype=bool)), 0)
+
+    # cars which crossed their next node within the proximity tolerance of fleet_view, 3 m before reaching it,
+    # pilot to the point after it: its light is still on the segment ahead, unless the road turns at the node, where
+    # the light of the point after it is the one on the segment
+    x, y, store.cursor[:] = store.locate(np.array([117.0, 117.0, 117.0]))
+    store.cursor += 1
+    first = store.offsets[:-1] + store.cursor
+    red = index.segment_red_light_distances(store, x, y, store.points[first, 0], store.points[first, 1],
+                                            np.zeros(faces, dtype=bool))
+    np.testing.assert_allclose(red[:2], 3.0)
+    np.testing.assert_allclose(red[2], np.hypot(store.points[first[2], 0] - x[2], store.points[first[2], 1] - y[2]))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import random
+from route_cache import RouteCache
+import simulation as sim
+from test.conftest import make_graph
+
+# an isolated node, which no route reaches
+ISLAND = 2000
+
+
+@pytest.fixture
+def cached_graph(tmp_path):
+    """ a small grid with an isolated node and a route cache """
+    graph = make_graph(4)
+    graph.G.add_node(ISLAND, x=0.0, y=0.0)
+    graph.routes = RouteCache(str(tmp_path / 'routes.sqlite'), 'grid')
+    yield graph
+    graph.routes.close()
+
+
+def test_cached_unreachable_pairs_have_no_route(cached_graph):
+    cached_graph.routes.put(1000, ISLAND, [])
+    routing = sim.init_routes(cached_graph, [(1000, ISLAND), (1001, 1015)])
+    assert routing[0] is None
+    route, path = routing[1]
+    assert (route[0], route[-1]) == (1001, 1015) and len(path) >= len(route)
+
+
+def test_unreachable_pairs_are_cached(cached_graph):
+    pairs = [(1001, ISLAND), (1002, ISLAND), (1002, 1012)]
+    routing = sim.init_routes(cached_graph, pairs)
+    assert routing[0] is None and routing[1] is None
+    assert cached_graph.routes.get(1001, ISLAND) == []
+    assert cached_graph.routes.get(1002, ISLAND) == []
+    assert cached_graph.routes.get(1002, 1012) == routing[2][0]
+    assert sim.init_routes(cached_graph, pairs) == routing
+
+
+def test_process_pool_routes_match_the_serial_routes():
+    graph = make_graph(4)
+    graph.G.add_node(ISLAND, x=0.0, y=0.0)
+    nodes = [node for node in graph.G.nodes if node != ISLAND]
+    rng = random.Random(3)
+    # several destinations per origin, so that the workers grow shortest path trees, and an unreachable pair
+    pairs = [(origin, rng.choice(nodes)) for origin in rng.sample(nodes, 6) for _ in range(3)] + [(1003, ISLAND)]
+
+    serial = sim.init_routes(graph, pairs)
+    pooled = sim.init_routes(graph, pairs, processes=2)
+    assert pooled[-1] is None and serial[-1] is None
+    for (route, path), (pooled_route, pooled_path) in zip(serial[:-1], pooled[:-1]):
+        assert pooled_route == route
+        np.testing.assert_array_equal(pooled_path, path)
@@ -0,0 +1,122 @@
+from cars import Cars, TrafficLights
+import numpy as np
+import pytest
+import random
+import simulation as sim
+import threading
+import time
+from trajectory import AsyncTrajectoryWriter, TrajectoryReader, TrajectoryWriter
+
+COLUMNS = ['x', 'y', 'vx', 'vy', 'route-time']
+
+
+@pytest.fixture(scope='module')
+def recording(graph):
+    """ 20 steps of the 'array' engine: the cars state and light go-values at every step """
+    random.seed(5)
+    np.random.seed(5)
+    cars = Cars(sim.init_random_node_start_location(12, graph), graph, engine='array')
+    lights = TrafficLights(sim.init_traffic_lights(graph, prescale=10), graph)
+    steps = [(cars.state.copy(), lights.state.copy(), lights.face_go_values().copy())]
+    for _ in range(20):
+        lights.update(0.01)
+        cars.update(0.01, lights.state)
+        steps.append((cars.state.copy(), lights.state.copy(), lights.face_go_values().copy()))
+    return steps
+
+
+@pytest.mark.parametrize('writer_class', [TrajectoryWriter, AsyncTrajectoryWriter])
+def test_round_trip(recording, tmp_path, writer_class):
+    # small buffers and car blocks, so the reader has many row groups to prune
+    writer = writer_class(str(tmp_path), buffer_steps=3, car_block=4)
+    writer.write_paths(0, recording[0][0])
+    for step, (cars, lights, _) in enumerate(recording):
+        writer.append(step, step * 0.01, cars, lights)
+    writer.close()
+
+    reader = TrajectoryReader(str(tmp_path))
+    assert reader.files['cars'].metadata.num_row_groups > 1
+    for step, (cars, _, go) in enumerate(recording):
+        state = reader.at_step(step)
+        np.testing.assert_array_equal(state['car'], cars.index)
+        np.testing.assert_array_equal(state[COLUMNS].to_numpy(), cars[COLUMNS].to_numpy(float))
+        np.testing.assert_array_equal(state['remaining'], cars['xpath'].map(len))
+        np.testing.assert_array_equal(reader.lights_at(step * 0.01 + 1.0e-9), go)
+
+    car = recording[0][0].index[3]
+    trajectory = reader.car(car, start=0.05, stop=0.1)
+    np.testing.assert_array_equal(trajectory['step'], np.arange(5, 11))
+    np.testing.assert_array_equal(trajectory['x'], [recording[step][0].loc[car, 'x'] for step in range(5, 11)])
+    assert len(reader.between(0.05, 0.1)) == 6 * len(recording[0][0])
+
+    np.testing.assert_array_equal(reader.at_time(0.125)['step'], 12)
+    path = reader.path(car)
+    np.testing.assert_array_equal(path['xpath'], recording[0][0].loc[car, 'xpath'])
+    np.testing.assert_array_equal(path['route'], recording[0][0].loc[car, 'route'])
+
+
+def test_full_queue_blocks_and_is_reported(recording, tmp_path):
+    writer = AsyncTrajectoryWriter(str(tmp_path), buffer_steps=2, car_block=4, queue_steps=2)
+    # hold the writer thread on its first step, as a slow disk would
+    gate = threading.Event()
+    append_snapshot = writer.writer.append_snapshot
+
+    def slow_append_snapshot(step_snapshot):
+        gate.wait()
+        append_snapshot(step_snapshot)
+    writer.writer.append_snapshot = slow_append_snapshot
+
+    writer.write_paths(0, recording[0][0])
+    writer.append(0, 0.0, recording[0][0], recording[0][1])
+    while writer.queue.qsize():
+        time.sleep(1.0e-3)
+
+    # two more steps fill the queue without waiting
+    for step in (1, 2):
+        writer.append(step, step * 0.01, recording[step][0], recording[step][1])
+    stats = writer.stats()
+    assert (stats['queued'], stats['written'], stats['depth'], stats['max-depth'], stats['blocked']) == (3, 0, 2, 2, 0)
+
+    # the next one waits until the writer thread moves on
+    threading.Timer(0.2, gate.set).start()
+    writer.append(3, 0.03, recording[3][0], recording[3][1])
+    stats = writer.stats()
+    assert stats['blocked'] == 1 and stats['blocked-time'] >= 0.1
+    assert stats['max-depth'] == 2
+
+    writer.close()
+    stats = writer.stats()
+    assert (stats['queued'], stats['written'], stats['depth']) == (4, 4, 0)
+    assert stats['write-time'] >= stats['blocked-time']
+    reader = TrajectoryReader(str(tmp_path))
+    np.testing.assert_array_equal(reader.between(0, 1)['step'].unique(), [0, 1, 2, 3])
+
+
+def test_time_of_reads_only_the_row_groups_straddling_the_time(recording, tmp_path, monkeypatch):
+    writer = TrajectoryWriter(str(tmp_path), buffer_steps=3, car_block=4)
+    for step, (cars, lights, _) in enumerate(recording):
+        writer.append(step, step * 0.01, cars, lights)
+    writer.close()
+
+    reader = TrajectoryReader(str(tmp_path))
+    read = reader.read
+    reads = []
+
+    def counted_read(name, groups, *args, **kwargs):
+        reads.append((name, list(groups)))
+        return read(name, groups, *args, **kwargs)
+    monkeypatch.setattr(reader, 'read', counted_read)
+
+    times = reader.index['cars']['time']
+    for t in (-1.0, 0.0, 0.035, 0.05, 0.125, 0.2, 5.0):
+        reads.clear()
+        steps = [step for step in range(len(recording)) if step * 0.01 <= t]
+        assert reader.time_of(t) == (steps[-1] if steps else None)
+        straddling = np.flatnonzero((times[:, 0] <= t) & (times[:, 1] > t)).tolist()
+        assert reads == ([('cars', straddling)] if straddling else [])
+
+        go = reader.lights_at(t)
+        if steps:
+            np.testing.assert_array_equal(go, recording[steps[-1]][2])
+        else:
+            assert go is None
@@ -0,0 +1,473 @@
+"""
+Append-only, columnar storage of a simulation's trajectory.
+
+A trajectory is a directory of three Parquet files:
+
+    paths.parquet:   car, step, route, xpath, ypath   (ragged list columns; written when a car's path is set)
+    cars.parquet:    step, time, car, x, y, vx, vy, route-time, remaining   (one row per car per step)
+    lights.parquet:  step, time, go   (one row per step; go is every light face's go-value, light by light)
+
+Paths never change during a step, so they are written once instead of being copied into every step. Per-step rows are
+buffered in memory and flushed every `buffer_steps` steps. In cars.parquet each flush is split into one row group per
+block of `car_block` cars, sorted by car and step, so the row group statistics form a (steps x cars) grid: a query
+for a time range or for a car only reads the row groups whose step or car range covers it (see TrajectoryReader).
+
+Example usage:
+
+writer = TrajectoryWriter('data_store')
+writer.write_paths(0, cars.state)
+for step in range(1, 1001):
+    lights.update(dt)
+    cars.update(dt, lights.state)
+    writer.append(step, step * dt, cars.state, lights.state)
+writer.close()
+
+reader = TrajectoryReader('data_store')
+reader.at_time(0.5)     # every car at t=0.5 s
+reader.car(17)          # the trajectory of car 17
+
+AsyncTrajectoryWriter has the same interface, but only snapshots each step in the simulation loop: a background
+thread does the buffering, compression and disk I/O, fed through a bounded queue. When the queue is full the
+simulation waits for the writer, and AsyncTrajectoryWriter.stats reports how long it waited.
+"""
+import atexit
+import numpy as np
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import queue
+import threading
+import time as clock
+
+PATH_SCHEMA = pa.schema([
+    ('car', pa.int64()),
+    ('step', pa.int64()),
+    ('route', pa.list_(pa.int64())),
+    ('xpath', pa.list_(pa.float64())),
+    ('ypath', pa.list_(pa.float64())),
+])
+
+CAR_SCHEMA = pa.schema([
+    ('step', pa.int64()),
+    ('time', pa.float64()),
+    ('car', pa.int64()),
+    ('x', pa.float64()),
+    ('y', pa.float64()),
+    ('vx', pa.float64()),
+    ('vy', pa.float64()),
+    ('route-time', pa.float64()),
+    # the number of path points left, counted from the end of the car's last written path
+    ('remaining', pa.int32()),
+])
+
+LIGHT_SCHEMA = pa.schema([
+    ('step', pa.int64()),
+    ('time', pa.float64()),
+    ('go', pa.list_(pa.bool_())),
+])
+
+
+class TrajectoryWriter:
+    def __init__(self, directory, buffer_steps=100, compression='zstd', car_block=256):
+        """
+        :param    directory:  str: created if it does not exist; existing trajectory files in it are replaced
+        :param buffer_steps:  int: number of steps held in memory before they are written as row groups
+        :param  compression:  str: Parquet compression codec
+        :param    car_block:  int: number of cars per row group of cars.parquet
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.buffer_steps = buffer_steps
+        self.car_block = car_block
+        self.writers = {name: pq.ParquetWriter(os.path.join(directory, name + '.parquet'), schema,
+                                               compression=compression)
+                        for name, schema in (('paths', PATH_SCHEMA), ('cars', CAR_SCHEMA), ('lights', LIGHT_SCHEMA))}
+        self.car_buffer = []
+        self.light_buffer = []
+        self.closed = False
+        atexit.register(self.close)
+
+    def write_paths(self, step, state):
+        """
+        writes the route and path of every car, from which the 'remaining' column of later steps is counted
+
+        :param  step:       int
+        :param state: dataframe: cars state with 'route', 'xpath' and 'ypath' columns
+        """
+        self.write_path_table(path_table(step, state))
+        return
+
+    def write_path_table(self, table):
+        """
+        :param table: pyarrow Table: as returned by path_table
+        """
+        self.writers['paths'].write_table(table)
+        return
+
+    def append(self, step, time, cars, lights=None):
+        """
+        buffers the fields which change every step
+
+        :param   step:    int
+        :param   time: double: simulated time elapsed
+        :param   cars: dataframe, or Fleet object from fleet (the 'array' engine)
+        :param lights: dataframe: traffic lights state, or None
+        """
+        self.append_snapshot(snapshot(step, time, cars, lights))
+        return
+
+    def append_snapshot(self, step_snapshot):
+        """
+        :param step_snapshot: tuple: as returned by snapshot
+        """
+        car_columns, light_row = step_snapshot
+        self.car_buffer.append(car_columns)
+        if light_row is not None:
+            self.light_buffer.append(light_row)
+
+        if len(self.car_buffer) >= self.buffer_steps:
+            self.flush()
+        return
+
+    def flush(self):
+        """ Writes the buffered steps as one row group of cars.parquet and lights.parquet """
+        if self.car_buffer:
+            columns = [np.concatenate(column) for column in zip(*self.car_buffer)]
+            # sort by car, then step, and cut the rows into blocks of car_block cars
+            order = np.lexsort((columns[0], columns[2]))
+            columns = [column[order] for column in columns]
+            cars = np.unique(columns[2])
+            bounds = np.searchsorted(columns[2], cars[::self.car_block])
+            table = pa.Table.from_arrays([pa.array(column, type=field.type)
+                                          for column, field in zip(columns, CAR_SCHEMA)], schema=CAR_SCHEMA)
+            for start, stop in zip(bounds, np.append(bounds[1:], len(table))):
+                self.writers['cars'].write_table(table.slice(start, stop - start), row_group_size=stop - start)
+            self.car_buffer = []
+
+        if self.light_buffer:
+            steps, times, go = zip(*self.light_buffer)
+            table = pa.table({'step': pa.array(steps, type=pa.int64()), 'time': pa.array(times, type=pa.float64()),
+                              'go': pa.array(list(go), type=pa.list_(pa.bool_()))}, schema=LIGHT_SCHEMA)
+            self.writers['lights'].write_table(table, row_group_size=len(table))
+            self.light_buffer = []
+        return
+
+    def close(self):
+        """ Flushes the remaining steps and finalizes the files """
+        if self.closed:
+            return
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.closed = True
+        return
+
+
+def path_table(step, state):
+    """
+    :param  step:       int
+    :param state: dataframe: cars state with 'route', 'xpath' and 'ypath' columns
+    :return table: pyarrow Table: in PATH_SCHEMA
+    """
+    table = pa.table({
+        'car': pa.array(state.index.to_numpy(), type=pa.int64()),
+        'step': pa.array(np.full(len(state), step), type=pa.int64()),
+        'route': pa.array([np.asarray(route, dtype=np.int64) for route in state['route']],
+                          type=pa.list_(pa.int64())),
+        'xpath': pa.array([np.asarray(xpath, dtype=float) for xpath in state['xpath']], type=pa.list_(pa.float64())),
+        'ypath': pa.array([np.asarray(ypath, dtype=float) for ypath in state['ypath']], type=pa.list_(pa.float64())),
+    }, schema=PATH_SCHEMA)
+    return table
+
+
+def snapshot(step, time, cars, lights=None):
+    """
+    copies the fields of one step which change every step
+
+    :param   step:    int
+    :param   time: double: simulated time elapsed
+    :param   cars: dataframe, or Fleet object from fleet (the 'array' engine)
+    :param lights: dataframe: traffic lights state, or None
+    :return car_columns, light_row: tuples: columns in CAR_SCHEMA order, and (step, time, go) or None
+    """
+    if hasattr(cars, 'paths'):
+        # a Fleet, whose arrays are read without building its DataFrame view
+        index, remaining = cars.index.to_numpy(), cars.remaining()
+        columns = (cars.x, cars.y, cars.vx, cars.vy, cars.route_time)
+    else:
+        index, remaining = cars.index.to_numpy(), cars['xpath'].map(len).to_numpy()
+        columns = tuple(cars[name].to_numpy(dtype=float) for name in ('x', 'y', 'vx', 'vy', 'route-time'))
+
+    n = len(index)
+    car_columns = (np.full(n, step), np.full(n, time), index) + tuple(np.array(c, dtype=float) for c in columns) + \
+        (remaining,)
+
+    light_row = None
+    if lights is not None:
+        go = np.concatenate([np.asarray(values, dtype=bool) for values in lights['go-values']]) \
+            if len(lights) else np.zeros(0, dtype=bool)
+        light_row = (step, time, go)
+    return car_columns, light_row
+
+
+class AsyncTrajectoryWriter:
+    def __init__(self, directory, buffer_steps=100, compression='zstd', car_block=256, queue_steps=None):
+        """
+        :param    directory:  str: as in TrajectoryWriter
+        :param buffer_steps:  int: as in TrajectoryWriter
+        :param  compression:  str: as in TrajectoryWriter
+        :param    car_block:  int: as in TrajectoryWriter
+        :param  queue_steps:  int: most snapshots waiting for the writer thread (4 flushes by default)
+        """
+        self.writer = TrajectoryWriter(directory, buffer_steps=buffer_steps, compression=compression,
+                                       car_block=car_block)
+        self.queue = queue.Queue(maxsize=queue_steps or 4 * buffer_steps)
+        self.error = None
+        self.closed = False
+
+        # backpressure metrics
+        self.queued = 0
+        self.written = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.write_time = 0.0
+        self.max_depth = 0
+
+        self.thread = threading.Thread(target=self.run, name='trajectory-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def run(self):
+        """ The writer thread: drains the queue into the TrajectoryWriter until it receives None """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                # keep draining so the simulation is never blocked by a failed writer
+                continue
+            kind, payload = item
+            start = clock.perf_counter()
+            try:
+                if kind == 'paths':
+                    self.writer.write_path_table(payload)
+                else:
+                    self.writer.append_snapshot(payload)
+                    self.written += 1
+            except Exception as error:
+                self.error = error
+            self.write_time += clock.perf_counter() - start
+        return
+
+    def put(self, item):
+        """ Queues an item for the writer thread, recording how long the simulation waits when the queue is full """
+        if self.error is not None:
+            raise RuntimeError('The trajectory writer thread failed.') from self.error
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.blocked += 1
+            start = clock.perf_counter()
+            self.queue.put(item)
+            self.blocked_time += clock.perf_counter() - start
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return
+
+    def write_paths(self, step, state):
+        """
+        :param  step:       int
+        :param state: dataframe: as in TrajectoryWriter.write_paths
+        """
+        self.put(('paths', path_table(step, state)))
+        return
+
+    def append(self, step, time, cars, lights=None):
+        """
+        snapshots one step and hands it to the writer thread
+
+        :param   step:    int
+        :param   time: double
+        :param   cars: dataframe, or Fleet object
+        :param lights: dataframe, or None
+        """
+        self.put(('step', snapshot(step, time, cars, lights)))
+        self.queued += 1
+        return
+
+    def stats(self):
+        """
+        :return stats: dict: steps queued and written, the current and largest queue depth, how many steps had to
+                             wait for a full queue and for how long (seconds), and the writer thread's busy time
+        """
+        return {
+            'queued': self.queued,
+            'written': self.written,
+            'depth': self.queue.qsize(),
+            'max-depth': self.max_depth,
+            'blocked': self.blocked,
+            'blocked-time': self.blocked_time,
+            'write-time': self.write_time,
+        }
+
+    def close(self):
+        """ Waits for the writer thread to write every queued step, then finalizes the files """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise RuntimeError('The trajectory writer thread failed.') from self.error
+        return
+
+
+class TrajectoryReader:
+    def __init__(self, directory):
+        """
+        opens a trajectory written by TrajectoryWriter, memory-mapped, and indexes its row groups by their statistics
+        (only the file footers are read)
+
+        :param directory: str
+        """
+        self.directory = directory
+        self.files = {name: pq.ParquetFile(os.path.join(directory, name + '.parquet'), memory_map=True)
+                      for name in ('paths', 'cars', 'lights')}
+        self.index = {name: self.row_group_ranges(file) for name, file in self.files.items()}
+
+    @staticmethod
+    def row_group_ranges(file):
+        """
+        :param   file: pyarrow ParquetFile
+        :return index: dict: column name -> (row groups, 2) array of the min and max of that column in each row group
+        """
+        metadata = file.metadata
+        index = {}
+        for j, name in enumerate(metadata.schema.names):
+            if name not in ('step', 'time', 'car'):
+                continue
+            ranges = np.empty((metadata.num_row_groups, 2))
+            for i in range(metadata.num_row_groups):
+                statistics = metadata.row_group(i).column(j).statistics
+                ranges[i] = (statistics.min, statistics.max) if statistics is not None and statistics.has_min_max \
+                    else (-np.inf, np.inf)
+            index[name] = ranges
+        return index
+
+    def read(self, name, groups, columns=None, filters=()):
+        """
+        reads the selected row groups of one file and keeps the rows passing the filters
+
+        :param    name:  str: 'paths', 'cars' or 'lights'
+        :param  groups: array: row group numbers
+        :param columns:  list: columns to read (all by default)
+        :param filters: tuple: (column, lower, upper) inclusive bounds
+        :return  table: pyarrow Table
+        """
+        schema = self.files[name].schema_arrow
+        read = None if columns is None else list(dict.fromkeys(list(columns) + [f[0] for f in filters]))
+        table = self.files[name].read_row_groups(groups, columns=read) if len(groups) else \
+            schema.empty_table().select(read or schema.names)
+        mask = np.ones(len(table), dtype=bool)
+        for column, lower, upper in filters:
+            values = table[column].to_numpy()
+            mask &= (values >= lower) & (values <= upper)
+        table = table.filter(pa.array(mask))
+        return table if columns is None else table.select(columns)
+
+    def groups(self, name, column, lower, upper):
+        """
+        :return groups: array: row groups of a file which may hold rows with lower <= column <= upper
+        """
+        ranges = self.index[name][column]
+        return np.flatnonzero((ranges[:, 1] >= lower) & (ranges[:, 0] <= upper))
+
+    def time_of(self, time):
+        """
+        :param   time: double
+        :return  step: int: the last recorded step at or before time (None if there is none)
+        """
+        return self.last_step('cars', time)
+
+    def last_step(self, name, time):
+        """
+        the last recorded step at or before time, found from the row group statistics: the row groups which end at
+        or before time give their largest step without being read, and only those which straddle time (or have no
+        statistics) and could still hold a later step are read
+
+        :param   name:    str: 'cars' or 'lights'
+        :param   time: double
+        :return  step:    int: or None if there is none
+        """
+        times, steps = self.index[name]['time'], self.index[name]['step']
+        before = (times[:, 1] <= time) & np.isfinite(steps[:, 1])
+        step = steps[before, 1].max() if before.any() else -np.inf
+
+        straddling = np.flatnonzero(~before & (times[:, 0] <= time) & (steps[:, 1] > step))
+        if len(straddling):
+            table = self.read(name, straddling, columns=['step'], filters=(('time', -np.inf, time),))
+            if len(table):
+                step = max(step, np.max(table['step'].to_numpy()))
+        return None if np.isinf(step) else int(step)
+
+    def at_step(self, step, columns=None):
+        """
+        :param     step:   int
+        :param  columns:  list: columns of cars.parquet (all by default)
+        :return   state: dataframe: every car at one recorded step
+        """
+        table = self.read('cars', self.groups('cars', 'step', step, step), columns, (('step', step, step),))
+        return table.to_pandas()
+
+    def at_time(self, time, columns=None):
+        """
+        :param     time: double
+        :param  columns:   list: columns of cars.parquet (all by default)
+        :return   state: dataframe: every car at the last recorded step at or before time
+        """
+        step = self.time_of(time)
+        return self.at_step(-1 if step is None else step, columns)
+
+    def between(self, start, stop, columns=None):
+        """
+        :param   start: double: time
+        :param    stop: double: time
+        :param columns:   list: columns of cars.parquet (all by default)
+        :return states: dataframe: every car at every step with start <= time <= stop
+        """
+        table = self.read('cars', self.groups('cars', 'time', start, stop), columns, (('time', start, stop),))
+        return table.to_pandas()
+
+    def car(self, car, start=-np.inf, stop=np.inf, columns=None):
+        """
+        :param     car:    int: car ID
+        :param   start: double: time
+        :param    stop: double: time
+        :param columns:   list: columns of cars.parquet (all by default)
+        :return states: dataframe: the car's state at every step with start <= time <= stop, in step order
+        """
+        groups = np.intersect1d(self.groups('cars', 'car', car, car), self.groups('cars', 'time', start, stop))
+        # row groups are in step order, and sorted by car and step within
+        table = self.read('cars', groups, columns, (('car', car, car), ('time', start, stop)))
+        return table.to_pandas()
+
+    def path(self, car, step=np.inf):
+        """
+        :param    car:    int: car ID
+        :param   step:    int: the path which was set last at or before this step
+        :return  path: Series: car, step, route, xpath and ypath (None if the car has no path)
+        """
+        table = self.read('paths', self.groups('paths', 'car', car, car), None,
+                          (('car', car, car), ('step', -np.inf, step))).to_pandas()
+        return table.sort_values('step').iloc[-1] if len(table) else None
+
+    def lights_at(self, time):
+        """
+        :param  time: double
+        :return   go: array of bool: every light face's go-value at the last recorded step at or before time
+        """
+        step = self.last_step('lights', time)
+        if step is None:
+            return None
+        table = self.read('lights', self.groups('lights', 'step', step, step), ['go'], (('step', step, step),))
+        return np.asarray(table['go'][0].as_py(), dtype=bool)